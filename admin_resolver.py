@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+import discord
+
+# my_status 頁面的管理員名單解析
+# admin_list 可能同時包含成員 ID 與身分組 ID：身分組直接展開為 gateway 快取中的成員，
+# 不在快取中的 ID 以一次 gateway 成員查詢 (每批最多 100 人) 取得，結果 (含查無此人) 暫存 ttl 秒
+
+QUERY_BATCH = 100
+
+class AdminResolver:
+    def __init__(self, ttl: float = 300, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._remote = {}   # (guild_id, user_id) -> (resolved_at, member 或 None)
+        self.cache_hits = 0
+        self.queries = 0
+        self.queried_ids = 0
+
+    async def resolve(self, guild, admin_list) -> list:
+        """回傳管理員成員清單 (依 admin_list 順序、不含擁有者與機器人、不重複)"""
+        members = {}
+        misses = []
+        now = time.monotonic()
+        for aid in admin_list:
+            member = guild.get_member(aid)
+            if member:
+                members.setdefault(aid, member)
+                continue
+            role = guild.get_role(aid)
+            if role:
+                for m in role.members:
+                    if not m.bot:
+                        members.setdefault(m.id, m)
+                continue
+            cached = self._remote.get((guild.id, aid))
+            if cached and now - cached[0] < self.ttl:
+                self.cache_hits += 1
+                if cached[1]:
+                    members.setdefault(aid, cached[1])
+                continue
+            misses.append(aid)
+
+        for i in range(0, len(misses), QUERY_BATCH):
+            chunk = misses[i:i + QUERY_BATCH]
+            self.queries += 1
+            self.queried_ids += len(chunk)
+            try:
+                found = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=True)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                # 查詢失敗不寫入快取，下次頁面瀏覽再試
+                logging.warning(f"查詢伺服器 {guild.id} 管理員失敗: {e}")
+                continue
+            by_id = {m.id: m for m in found}
+            for uid in chunk:
+                self._remote[(guild.id, uid)] = (now, by_id.get(uid))
+                if uid in by_id:
+                    members.setdefault(uid, by_id[uid])
+        if misses:
+            self._prune(now)
+
+        members.pop(guild.owner_id, None)
+        return list(members.values())
+
+    def _prune(self, now: float):
+        if len(self._remote) <= self.max_entries:
+            return
+        self._remote = {k: v for k, v in self._remote.items() if now - v[0] < self.ttl}
+        # 仍超過上限時移除最舊的項目 (dict 依插入順序)
+        while len(self._remote) > self.max_entries:
+            self._remote.pop(next(iter(self._remote)))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._remote),
+            "cache_hits": self.cache_hits,
+            "gateway_queries": self.queries,
+            "queried_ids": self.queried_ids,
+            "ttl_seconds": self.ttl
+        }
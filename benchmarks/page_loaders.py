@@ -0,0 +1,190 @@
+"""
+成員管理頁面 / 個人信用頁面資料載入基準測試
+
+在本機 PostgreSQL 建立獨立的 bench_tianshu schema，填入不同規模的伺服器後，比較：
+  legacy   原本的逐一查詢 (guilds、auto_actions、member_totals 各一次；成員頁另含全體排序)
+  cold     目前的載入器，設定快取未命中
+  warm     目前的載入器，設定快取命中
+成員管理頁面以 member_table.load_member_page 取第一頁 (依身分 / 依警告排序)
+並輸出每種情境的 p50 / p99 (毫秒)
+
+用法：
+  python benchmarks/page_loaders.py --dsn postgresql://localhost/postgres --iterations 500
+  (未指定 --dsn 時讀取 BENCH_DSN 環境變數)
+結束後會刪除 bench_tianshu schema，可加 --keep 保留資料
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from guild_cache import GuildSettingsCache
+from page_data import load_my_status_data
+from member_table import load_member_page
+
+SCHEMA = "bench_tianshu"
+
+# (伺服器 ID, 成員數)；約兩成成員有獎懲紀錄
+GUILD_SIZES = [(1, 200), (2, 5_000), (3, 50_000)]
+
+async def setup(conn):
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    await conn.execute(f"SET search_path TO {SCHEMA}")
+    await conn.execute("""
+        CREATE TABLE guilds (
+            guild_id BIGINT PRIMARY KEY,
+            admin_list BIGINT[] DEFAULT '{}',
+            offset_enabled BOOLEAN DEFAULT FALSE,
+            log_channel_id BIGINT
+        );
+        CREATE TABLE auto_actions (
+            id SERIAL PRIMARY KEY,
+            guild_id BIGINT,
+            type TEXT,
+            threshold INTEGER,
+            action_type TEXT,
+            timeout_duration INTEGER,
+            role_id BIGINT,
+            window_days INTEGER,
+            half_life_days INTEGER,
+            UNIQUE (guild_id, type, threshold)
+        );
+        CREATE TABLE member_totals (
+            guild_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            warnings INTEGER NOT NULL DEFAULT 0,
+            commends INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        );
+    """)
+
+    rng = random.Random(0)
+    for guild_id, size in GUILD_SIZES:
+        await conn.execute(
+            "INSERT INTO guilds (guild_id, admin_list, offset_enabled, log_channel_id) VALUES ($1, $2, true, 1)",
+            guild_id, [guild_id * 10_000_000 + i for i in range(10)]
+        )
+        await conn.executemany(
+            "INSERT INTO auto_actions (guild_id, type, threshold, action_type, timeout_duration) VALUES ($1, $2, $3, $4, 600)",
+            [(guild_id, t, th, a) for t in ("警告", "嘉獎") for th, a in ((3, "timeout"), (5, "kick"), (10, "ban"))]
+        )
+        members = rng.sample(range(size), size // 5)
+        await conn.copy_records_to_table(
+            "member_totals",
+            records=[(guild_id, guild_id * 10_000_000 + m, rng.randint(0, 12), rng.randint(0, 8)) for m in members],
+            schema_name=SCHEMA
+        )
+    await conn.execute("ANALYZE")
+
+def fake_guild(guild_id, size):
+    """只含 load_member_page 會用到屬性的伺服器 / 成員物件，模擬 discord.py 的成員快取"""
+    avatar = SimpleNamespace(url="")
+    members = {
+        guild_id * 10_000_000 + i: SimpleNamespace(
+            id=guild_id * 10_000_000 + i, name=f"user{i}", display_name=f"成員{i}", display_avatar=avatar
+        )
+        for i in range(size)
+    }
+    return SimpleNamespace(
+        id=guild_id, owner_id=guild_id * 10_000_000,
+        members=list(members.values()), get_member=members.get
+    )
+
+async def legacy_members(conn, guild, guild_id):
+    admin_list = await conn.fetchval("SELECT admin_list FROM guilds WHERE guild_id = $1", guild_id)
+    await conn.fetchrow("SELECT offset_enabled FROM guilds WHERE guild_id = $1", guild_id)
+    await conn.fetch("SELECT type, threshold, action_type FROM auto_actions WHERE guild_id = $1", guild_id)
+    rows = await conn.fetch(
+        "SELECT user_id, warnings as warning_points, commends as commend_points FROM member_totals WHERE guild_id = $1",
+        guild_id
+    )
+    stats = {r['user_id']: r for r in rows}
+    admins = set(admin_list)
+    members = sorted(guild.members, key=lambda m: 0 if m.id == guild.owner_id else 1 if m.id in admins else 2)
+    return members, stats
+
+async def legacy_my_status(conn, guild_id, user_id):
+    await conn.fetchrow(
+        "SELECT warnings as warning_points, commends as commend_points FROM member_totals WHERE guild_id = $1 AND user_id = $2",
+        guild_id, user_id
+    )
+    await conn.fetchrow("SELECT offset_enabled FROM guilds WHERE guild_id = $1", guild_id)
+    await conn.fetch("SELECT threshold, action_type, type FROM auto_actions WHERE guild_id = $1 ORDER BY threshold ASC", guild_id)
+    await conn.fetchrow("SELECT admin_list FROM guilds WHERE guild_id = $1", guild_id)
+
+async def measure(iterations, func):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return p50, p99
+
+async def run(dsn, iterations, keep):
+    conn = await asyncpg.connect(dsn)
+    try:
+        await setup(conn)
+        cache = GuildSettingsCache(db_pool=None)
+
+        print(f"{'頁面':<12}{'成員數':>8}  {'情境':<8}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+        for guild_id, size in GUILD_SIZES:
+            user_id = await conn.fetchval("SELECT user_id FROM member_totals WHERE guild_id = $1 LIMIT 1", guild_id)
+
+            guild = fake_guild(guild_id, size)
+
+            async def members_page(sort="role", cold=False):
+                if cold:
+                    cache.invalidate(guild_id)
+                settings = cache.peek(guild_id)
+                if settings is None:
+                    settings = await cache._load(guild_id, conn)
+                    cache.store(guild_id, settings, cache.version(guild_id))
+                await load_member_page(conn, guild, settings, viewer_is_owner=True, sort=sort)
+
+            async def cold_status():
+                cache.invalidate(guild_id)
+                await load_my_status_data(conn, cache, guild_id, user_id)
+
+            cases = [
+                ("members", "legacy", lambda: legacy_members(conn, guild, guild_id)),
+                ("members", "cold", lambda: members_page(cold=True)),
+                ("members", "warm", lambda: members_page()),
+                ("members", "warnings", lambda: members_page(sort="warnings")),
+                ("my_status", "legacy", lambda: legacy_my_status(conn, guild_id, user_id)),
+                ("my_status", "cold", cold_status),
+                ("my_status", "warm", lambda: load_my_status_data(conn, cache, guild_id, user_id)),
+            ]
+            for page, label, func in cases:
+                # 先暖機，讓 asyncpg 的 prepared statement 快取與 PostgreSQL 緩衝區就緒
+                await measure(min(20, iterations), func)
+                p50, p99 = await measure(iterations, func)
+                print(f"{page:<12}{size:>8}  {label:<8}{p50:>10.3f}{p99:>10.3f}")
+    finally:
+        if not keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN"))
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("請以 --dsn 或 BENCH_DSN 指定 PostgreSQL 連線字串")
+    asyncio.run(run(args.dsn, args.iterations, args.keep))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+獎懲紀錄匯出基準測試
+
+在本機 PostgreSQL 建立獨立的 bench_tianshu_export schema，填入指定筆數的 member_records 後，比較：
+  fetch    一次 conn.fetch 全部紀錄再轉成 CSV (原本直覺的寫法)
+  stream   record_export.stream_records (伺服器端游標逐批輸出)
+並輸出每種格式的耗時、每秒筆數與 Python 端尖峰記憶體 (tracemalloc)
+
+用法：
+  python benchmarks/record_export.py --dsn postgresql://localhost/postgres --rows 1000000
+  (未指定 --dsn 時讀取 BENCH_DSN 環境變數)
+結束後會刪除 bench_tianshu_export schema，可加 --keep 保留資料
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from record_export import build_export_query, stream_records, _csv_chunk
+
+SCHEMA = "bench_tianshu_export"
+GUILD_ID = 1
+
+async def setup(conn, rows: int):
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    await conn.execute(f"SET search_path TO {SCHEMA}")
+    await conn.execute("""
+        CREATE TABLE member_records (
+            guild_id BIGINT,
+            user_id BIGINT,
+            user_name TEXT,
+            type TEXT,
+            count INTEGER,
+            reason TEXT,
+            operator_id BIGINT,
+            operator_name TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    await conn.execute(
+        """
+        INSERT INTO member_records (guild_id, user_id, user_name, type, count, reason, operator_id, operator_name, created_at)
+        SELECT $1, 1000 + i % 20000, '成員' || (i % 20000),
+               CASE WHEN i % 3 = 0 THEN '嘉獎' ELSE '警告' END,
+               1 + i % 3, '違反規則第 ' || (i % 12) || ' 條', 42, '管理員',
+               now() - make_interval(secs => i)
+        FROM generate_series(1, $2) AS i
+        """,
+        GUILD_ID, rows
+    )
+    await conn.execute("CREATE INDEX ON member_records (guild_id, created_at)")
+    await conn.execute("ANALYZE member_records")
+
+async def naive_export(pool, sql, args):
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(sql, *args)
+    return len(_csv_chunk(rows, header=True).encode("utf-8"))
+
+async def streamed_export(pool, fmt, sql, args):
+    size = 0
+    async for chunk in stream_records(pool, fmt, sql, args):
+        size += len(chunk)
+    return size
+
+async def measure(label, rows, func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = await func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<14}{elapsed:>10.2f}{rows / elapsed:>14,.0f}{size / 1048576:>12.1f}{peak / 1048576:>12.1f}")
+
+async def run(dsn, rows, keep):
+    conn = await asyncpg.connect(dsn)
+    pool = None
+    try:
+        await setup(conn, rows)
+        pool = await asyncpg.create_pool(dsn, min_size=1, max_size=2, server_settings={"search_path": SCHEMA})
+        sql, args = build_export_query(GUILD_ID)
+
+        print(f"{'情境':<14}{'秒':>10}{'筆 / 秒':>14}{'輸出 MB':>12}{'尖峰 MB':>12}")
+        await measure("fetch csv", rows, lambda: naive_export(pool, sql, args))
+        await measure("stream csv", rows, lambda: streamed_export(pool, "csv", sql, args))
+        await measure("stream ndjson", rows, lambda: streamed_export(pool, "ndjson", sql, args))
+    finally:
+        if pool:
+            await pool.close()
+        if not keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN"))
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("請以 --dsn 或 BENCH_DSN 指定 PostgreSQL 連線字串")
+    asyncio.run(run(args.dsn, args.rows, args.keep))
+
+if __name__ == "__main__":
+    main()
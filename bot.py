@@ -5,6 +5,17 @@ import asyncio
 import os
 import asyncpg
 from web_main import app
+from guild_cache import GuildSettingsCache
+from db_schema import ensure_schema, mark_backfilled
+from records import rebuild_member_totals
+from reevaluation import baseline_fired
+from scheduler import JobScheduler
+from member_index import MemberNameIndex
+from guild_stats import GuildStatsTracker, GuildDirectory
+from task_queue import SideEffectQueue
+from user_cache import UserCache
+from log_buffer import LogBuffer
+from dispatcher import ActionDispatcher
 
 with open('config.json', 'r', encoding='utf-8') as f:
     config = json.load(f)
@@ -20,7 +31,41 @@ class MyBot(commands.Bot):
     async def setup_hook(self):
         # 1. 建立資料庫連線池
         self.db_pool = await asyncpg.create_pool(dsn=config.get("DATABASE_URL"))
+        pending = await ensure_schema(self.db_pool)
+        if "member_totals" in pending:
+            # 從既有的 member_records 回填累計表；與完成標記同一交易，中斷時下次啟動重新回填
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    count = await rebuild_member_totals(conn)
+                    await mark_backfilled(conn, "member_totals")
+            print(f"✅ 已回填 member_totals：{count} 筆")
+        if "auto_action_fired" in pending:
+            # 目前已達到的規則視為已處置 (需在 member_totals 回填之後)；
+            # 所有伺服器與完成標記在同一交易內，中斷時不會留下部分伺服器沒有起點
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    count = await baseline_fired(conn)
+                    await mark_backfilled(conn, "auto_action_fired")
+            print(f"✅ 已建立自動化觸發紀錄：{count} 個伺服器")
         self.config = config # 讓 Cog 可以讀取 config
+        # 伺服器設定快取 (Cog 與網頁端共用)
+        self.guild_cache = GuildSettingsCache(self.db_pool, ttl=config.get("GUILD_CACHE_TTL", 300))
+        # 持久化排程器 (工作類型由各 Cog 載入時註冊)
+        self.scheduler = JobScheduler(self.db_pool)
+        # 成員名稱搜尋索引 (由 commands/members.py 依 gateway 事件維護)
+        self.member_index = MemberNameIndex()
+        # 伺服器統計快照 (由 commands/stats.py 依 gateway 事件維護)
+        self.guild_stats = GuildStatsTracker()
+        # /server_info 共用的排序伺服器清單
+        self.guild_directory = GuildDirectory(self, ttl=config.get("GUILD_DIRECTORY_TTL", 300))
+        # 網頁端操作的背景副作用佇列 (工作類型由各 Cog 載入時註冊)
+        self.side_effects = SideEffectQueue(self.db_pool, workers=config.get("SIDE_EFFECT_WORKERS", 4))
+        # 使用者 / 私訊頻道快取 (取代直接呼叫 fetch_user)
+        self.user_cache = UserCache(self, ttl=config.get("USER_CACHE_TTL", 3600), max_entries=config.get("USER_CACHE_SIZE", 2000))
+        # Discord 動作的集中排程 (自動處置 > 日誌 > 私訊 > 公告)
+        self.dispatcher = ActionDispatcher(workers=config.get("DISPATCH_WORKERS", 8), rate=config.get("DISPATCH_RATE", 40))
+        # 日誌頻道合併發送
+        self.log_buffer = LogBuffer(self, window=config.get("LOG_BATCH_WINDOW", 1.5))
         
         # 2. 自動載入 commands 資料夾下的所有 Cog
         for filename in os.listdir('./commands'):
@@ -28,12 +73,34 @@ class MyBot(commands.Bot):
                 await self.load_extension(f'commands.{filename[:-3]}')
                 print(f"✅ 已載入模組: {filename}")
 
+        # 3. 所有工作類型註冊完成後，載回尚未執行的排程
+        await self.scheduler.start()
+        self.dispatcher.start()
+        self.side_effects.start()
+
+    async def close(self):
+        if hasattr(self, 'scheduler'):
+            await self.scheduler.stop()
+        if hasattr(self, 'side_effects'):
+            await self.side_effects.stop()
+        # 背景佇列停止後才送出剩餘日誌 (佇列中的工作也會產生日誌)
+        if hasattr(self, 'log_buffer'):
+            await self.log_buffer.close()
+        if hasattr(self, 'dispatcher'):
+            await self.dispatcher.stop()
+        await super().close()
+
     async def on_ready(self):
-        # 3. 將 bot 注入 FastAPI
+        # 4. 將 bot 注入 FastAPI
         app.state.bot = self
-        # 4. 同步斜線指令
+        # 5. 同步斜線指令
         await self.tree.sync()
         print(f"✅ 機器人已就緒: {self.user}，指令已同步")
+        # 6. 預先載入開發者與管理員 (審核通知最常私訊的對象)
+        async with self.db_pool.acquire() as conn:
+            managers = await conn.fetch("SELECT user_id FROM managers")
+        loaded = await self.user_cache.preload([config['DEVELOPER_ID']] + [m['user_id'] for m in managers])
+        print(f"✅ 已預先載入 {loaded} 位使用者")
 
 bot = MyBot()
 
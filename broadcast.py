@@ -0,0 +1,111 @@
+import asyncio
+import time
+import discord
+
+# 全域廣播
+# 每個伺服器的發送都交給 bot.dispatcher 的 broadcast 類別：併發上限 (低優先 worker 名額)、全域速率閘門與 429 / 5xx 退避重試
+# 皆由 dispatcher 統一處理，這裡只負責把最終結果整理成送達報告
+# RateLimiter 為 dispatcher 使用的全域速率閘門
+
+class RateLimiter:
+    """簡易 token bucket：平均每秒最多 rate 次，瞬間最多 burst 次"""
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """收到全域 429 時，讓所有等待中的請求一起暫停"""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class DeliveryReport:
+    """每個伺服器的送達結果"""
+    def __init__(self):
+        self.sent = []
+        self.missing_channel = []
+        self.forbidden = []
+        self.failed = []
+        self.retries = 0
+        self.elapsed = 0.0
+
+    @property
+    def total(self):
+        return len(self.sent) + len(self.missing_channel) + len(self.forbidden) + len(self.failed)
+
+    def summary(self) -> str:
+        return (
+            f"成功 {len(self.sent)} / 找不到頻道 {len(self.missing_channel)} / "
+            f"無權限 {len(self.forbidden)} / 失敗 {len(self.failed)} "
+            f"(重試 {self.retries} 次，耗時 {self.elapsed:.1f} 秒)"
+        )
+
+    def to_embed(self, title: str = "📨 公告送達報告") -> discord.Embed:
+        color = discord.Color.green() if not self.failed else discord.Color.orange()
+        embed = discord.Embed(title=title, color=color)
+        embed.add_field(name="✅ 成功送達", value=f"`{len(self.sent)}`", inline=True)
+        embed.add_field(name="❔ 找不到頻道", value=f"`{len(self.missing_channel)}`", inline=True)
+        embed.add_field(name="🚫 無發送權限", value=f"`{len(self.forbidden)}`", inline=True)
+        embed.add_field(name="❌ 發送失敗", value=f"`{len(self.failed)}`", inline=True)
+        embed.add_field(name="🔁 重試次數", value=f"`{self.retries}`", inline=True)
+        embed.add_field(name="⏱️ 耗時", value=f"`{self.elapsed:.1f} 秒`", inline=True)
+
+        # 只列出前幾個異常伺服器，避免超過 Embed 欄位長度上限
+        problems = [(gid, "無權限") for gid in self.forbidden] + [(gid, err) for gid, err in self.failed]
+        if problems:
+            lines = [f"`{gid}` {reason}" for gid, reason in problems[:10]]
+            if len(problems) > 10:
+                lines.append(f"...以及其他 {len(problems) - 10} 個伺服器")
+            embed.add_field(name="異常伺服器", value="\n".join(lines)[:1024], inline=False)
+        return embed
+
+async def broadcast(bot, targets, embed, max_retries: int = None) -> DeliveryReport:
+    """
+    將 embed 送到 targets [(guild_id, channel_id), ...]
+    max_retries：429 / 5xx 的重試次數上限 (None 為 dispatcher 的預設值)
+    """
+    report = DeliveryReport()
+    started = time.monotonic()
+    counters = bot.dispatcher.counters["broadcast"]
+    retried_before = counters["retried"]
+
+    async def deliver(guild_id, channel_id):
+        guild = bot.get_guild(guild_id)
+        channel = guild.get_channel(channel_id) if guild else None
+        if channel is None:
+            report.missing_channel.append(guild_id)
+            return
+        try:
+            await bot.dispatcher.submit("broadcast", guild_id, lambda: channel.send(embed=embed), max_retries=max_retries)
+            report.sent.append(guild_id)
+        except discord.Forbidden:
+            report.forbidden.append(guild_id)
+        except discord.NotFound:
+            report.missing_channel.append(guild_id)
+        except discord.RateLimited:
+            report.failed.append((guild_id, "HTTP 429 (重試後放棄)"))
+        except discord.HTTPException as e:
+            # 429 / 5xx 已由 dispatcher 重試到上限，其他錯誤不重試
+            retryable = e.status == 429 or e.status >= 500
+            report.failed.append((guild_id, f"HTTP {e.status}" + (" (重試後放棄)" if retryable else "")))
+        except Exception as e:
+            report.failed.append((guild_id, type(e).__name__))
+
+    # 全部排入 dispatcher，實際同時進行的請求數由 dispatcher 的 worker 名額限制
+    await asyncio.gather(*(deliver(guild_id, channel_id) for guild_id, channel_id in targets))
+    # 重試次數取自 dispatcher 的計數 (同時進行的其他公告也會計入)
+    report.retries = counters["retried"] - retried_before
+    report.elapsed = time.monotonic() - started
+    return report
@@ -2,8 +2,10 @@ import discord
 from discord import app_commands, ui
 from discord.ext import commands
 from datetime import datetime
-import math
+import json
 import logging
+from records import rebuild_member_totals
+from broadcast import broadcast
 
 # --- 核心發送邏輯 (用於立即或預約) ---
 async def send_global_announcement(bot, content, is_scheduled=False):
@@ -16,22 +18,14 @@ async def send_global_announcement(bot, content, is_scheduled=False):
     )
     embed.set_footer(text="系統自動發送")
 
-    success_count = 0
     # 從資料庫抓取所有有設定 log 頻道的伺服器
     async with bot.db_pool.acquire() as conn:
         guilds_data = await conn.fetch("SELECT guild_id, log_channel_id FROM guilds WHERE log_channel_id IS NOT NULL")
-        
-    for record in guilds_data:
-        guild = bot.get_guild(record['guild_id'])
-        if guild:
-            channel = guild.get_channel(record['log_channel_id'])
-            if channel:
-                try:
-                    await channel.send(embed=embed)
-                    success_count += 1
-                except:
-                    continue
-    logging.info(f"公告發送完畢，成功送達 {success_count} 個伺服器。")
+
+    # 經由 bot.dispatcher 發送 (含速率限制與 429 / 5xx 重試)，回傳每個伺服器的送達結果
+    report = await broadcast(bot, [(r['guild_id'], r['log_channel_id']) for r in guilds_data], embed)
+    logging.info(f"公告發送完畢：{report.summary()}")
+    return report
 
 # --- /message 用的確認視窗 ---
 class ConfirmSendView(ui.View):
@@ -50,18 +44,15 @@ class ConfirmSendView(ui.View):
         if self.target_time is None:
             # 立即發送
             await interaction.response.defer(ephemeral=True)
-            await send_global_announcement(self.bot, self.content)
-            await interaction.followup.send("✅ 公告已成功立即發送！", ephemeral=True)
+            report = await send_global_announcement(self.bot, self.content)
+            await interaction.followup.send("✅ 公告已發送完畢！", embed=report.to_embed(), ephemeral=True)
         else:
-            # 預約發送
-            self.bot.scheduler.add_job(
-                send_global_announcement,
-                'date',
-                run_date=self.target_time,
-                args=[self.bot, self.content, True]
+            # 預約發送 (寫入資料庫，重啟後仍會執行)
+            job_id = await self.bot.scheduler.schedule(
+                "announcement", self.target_time, {"content": self.content}, created_by=interaction.user.id
             )
             await interaction.response.edit_message(
-                content=f"⏰ 預約成功！訊息將於 `{self.target_time.strftime('%Y-%m-%d %H:%M')}` 自動發布。",
+                content=f"⏰ 預約成功！(排程編號 `{job_id}`) 訊息將於 `{self.target_time.strftime('%Y-%m-%d %H:%M')}` 自動發布。",
                 embed=None, view=None
             )
 
@@ -104,72 +95,104 @@ class MessageModal(ui.Modal, title="全域公告發布系統"):
             except ValueError:
                 await interaction.response.send_message("❌ 格式錯誤！請確保格式為 `2026-02-14 15:30`。", ephemeral=True)
 
+# --- /server_info 搜尋 / 跳頁視窗 ---
+class ServerSearchModal(ui.Modal, title="搜尋伺服器 / 跳至頁碼"):
+    keyword = ui.TextInput(label="名稱或 ID 關鍵字 (留空顯示全部)", required=False, max_length=100)
+    page_no = ui.TextInput(label="頁碼 (留空為第 1 頁)", required=False, max_length=6)
+
+    def __init__(self, view):
+        super().__init__()
+        self.server_view = view
+        self.keyword.default = view.query or None
+
+    async def on_submit(self, interaction: discord.Interaction):
+        page = self.page_no.value.strip()
+        self.server_view.query = self.keyword.value.strip() or None
+        self.server_view.page = int(page) - 1 if page.isdigit() else 0
+        await self.server_view.update_msg(interaction)
+
 # --- /server_info 分頁瀏覽 View ---
 class ServerInfoView(ui.View):
-    def __init__(self, bot, guilds, page=0):
+    """只保存頁碼與搜尋關鍵字，清單本身由 bot.guild_directory 共用"""
+    per_page = 5
+
+    def __init__(self, bot, page=0, query=None):
         super().__init__(timeout=180)
-        self.bot, self.guilds, self.page = bot, guilds, page
-        self.per_page = 5
-        self.total_pages = math.ceil(len(guilds) / self.per_page)
-
-        # 下拉選單 (顯示當前分頁的伺服器)
-        start = self.page * self.per_page
-        end = start + self.per_page
-        options = [discord.SelectOption(label=g.name, value=str(g.id), description=f"成員: {g.member_count}") for g in self.guilds[start:end]]
-        
-        if options:
-            select = ui.Select(placeholder="選擇伺服器查看詳細資訊...", options=options)
-            select.callback = self.select_callback
-            self.add_item(select)
+        self.bot, self.page, self.query = bot, page, query
+        self.select = ui.Select(placeholder="選擇伺服器查看詳細資訊...", options=[discord.SelectOption(label="-")], row=0)
+        self.select.callback = self.select_callback
+        self.add_item(self.select)
+
+    def render(self) -> discord.Embed:
+        """依目前頁碼產生 Embed，並同步更新下拉選單與按鈕狀態"""
+        entries, self.page, total_pages, total = self.bot.guild_directory.page(self.page, self.per_page, self.query)
+        self.select.options = [
+            discord.SelectOption(label=name[:100], value=str(gid), description=f"成員: {count}")
+            for gid, name, count in entries
+        ] or [discord.SelectOption(label="沒有符合的伺服器", value="0")]
+        self.select.disabled = not entries
+        self.prev.disabled = self.page == 0
+        self.next.disabled = self.page >= total_pages - 1
+
+        title = "🌐 機器人所在伺服器清單" if not self.query else f"🔍 搜尋「{self.query}」：{total} 個伺服器"
+        embed = discord.Embed(title=title, color=discord.Color.dark_magenta())
+        for gid, name, count in entries:
+            embed.add_field(name=name, value=f"ID: `{gid}` | 成員: `{count}`", inline=False)
+        embed.set_footer(text=f"第 {self.page + 1} / {total_pages} 頁")
+        return embed
 
     async def select_callback(self, interaction: discord.Interaction):
         guild_id = int(interaction.data['values'][0])
         guild = self.bot.get_guild(guild_id)
         if not guild: return await interaction.response.send_message("找不到該伺服器。", ephemeral=True)
 
+        info = self.bot.guild_stats.snapshot(guild)
         embed = discord.Embed(title=f"🏰 {guild.name} 詳細資料", color=discord.Color.blue())
         embed.add_field(name="ID", value=f"`{guild.id}`", inline=True)
         embed.add_field(name="成員數", value=f"`{guild.member_count}`", inline=True)
+        embed.add_field(name="真人 / 機器人", value=f"`{info['human_count']}` / `{info['bot_count']}`", inline=True)
+        embed.add_field(name="管理員", value=f"`{len(info['admins'])}` 位", inline=True)
+        embed.add_field(name="頻道", value=f"文字 `{len(info['channels']['text'])}` / 語音 `{len(info['channels']['voice'])}`", inline=True)
         embed.add_field(name="擁有者", value=f"{guild.owner.mention} (`{guild.owner_id}`)", inline=False)
         embed.add_field(name="加入日期", value=f"<t:{int(guild.me.joined_at.timestamp())}:F>", inline=False)
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
-    @ui.button(label="上一頁", style=discord.ButtonStyle.gray)
+    @ui.button(label="上一頁", style=discord.ButtonStyle.gray, row=1)
     async def prev(self, interaction: discord.Interaction, button: ui.Button):
-        self.page = max(0, self.page - 1)
+        self.page -= 1
         await self.update_msg(interaction)
 
-    @ui.button(label="下一頁", style=discord.ButtonStyle.gray)
+    @ui.button(label="下一頁", style=discord.ButtonStyle.gray, row=1)
     async def next(self, interaction: discord.Interaction, button: ui.Button):
-        self.page = min(self.total_pages - 1, self.page + 1)
+        self.page += 1
         await self.update_msg(interaction)
 
+    @ui.button(label="搜尋 / 跳頁", style=discord.ButtonStyle.blurple, emoji="🔍", row=1)
+    async def search(self, interaction: discord.Interaction, button: ui.Button):
+        await interaction.response.send_modal(ServerSearchModal(self))
+
     async def update_msg(self, interaction: discord.Interaction):
-        embed = DevCog.generate_list_embed(self.guilds, self.page)
-        await interaction.response.edit_message(embed=embed, view=ServerInfoView(self.bot, self.guilds, self.page))
+        # 沿用同一個 View，只重新產生當頁內容
+        await interaction.response.edit_message(embed=self.render(), view=self)
 
 # --- Cog 主體 ---
 class DevCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        bot.scheduler.register("announcement", self.run_scheduled_announcement)
 
-    @staticmethod
-    def generate_list_embed(guilds, page):
-        per_page = 5
-        start = page * per_page
-        embed = discord.Embed(title="🌐 機器人所在伺服器清單", color=discord.Color.dark_magenta())
-        for g in guilds[start:start+per_page]:
-            embed.add_field(name=g.name, value=f"ID: `{g.id}` | 成員: `{g.member_count}`", inline=False)
-        embed.set_footer(text=f"第 {page+1} / {math.ceil(len(guilds)/per_page)} 頁")
-        return embed
+    async def run_scheduled_announcement(self, payload):
+        """排程器呼叫：發送預約公告"""
+        await self.bot.wait_until_ready()
+        await send_global_announcement(self.bot, payload['content'], is_scheduled=True)
 
     @app_commands.command(name="server_info", description="[開發者限定] 查看所有伺服器資訊")
     async def server_info(self, interaction: discord.Interaction):
         if interaction.user.id != self.bot.config['DEVELOPER_ID']:
             return await interaction.response.send_message("❌ 無權限", ephemeral=True)
-        guilds = sorted(list(self.bot.guilds), key=lambda x: x.member_count, reverse=True)
-        await interaction.response.send_message(embed=self.generate_list_embed(guilds, 0), view=ServerInfoView(self.bot, guilds, 0), ephemeral=True)
+        view = ServerInfoView(self.bot)
+        await interaction.response.send_message(embed=view.render(), view=view, ephemeral=True)
 
     @app_commands.command(name="message", description="[開發者限定] 全域廣播消息")
     async def message(self, interaction: discord.Interaction):
@@ -177,5 +200,54 @@ class DevCog(commands.Cog):
             return await interaction.response.send_message("❌ 無權限", ephemeral=True)
         await interaction.response.send_modal(MessageModal(self.bot))
 
+    @app_commands.command(name="schedule_list", description="[開發者限定] 查看尚未執行的預約工作")
+    async def schedule_list(self, interaction: discord.Interaction):
+        if interaction.user.id != self.bot.config['DEVELOPER_ID']:
+            return await interaction.response.send_message("❌ 無權限", ephemeral=True)
+
+        jobs = await self.bot.scheduler.list_jobs(limit=20)
+        embed = discord.Embed(title="⏰ 預約工作清單", color=discord.Color.blue())
+        if not jobs:
+            embed.description = "目前沒有待執行的預約工作。"
+        for job in jobs:
+            payload = job['payload']
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            preview = (payload.get('content') or '')[:80]
+            embed.add_field(
+                name=f"#{job['id']} | {job['job_type']} | <t:{int(job['run_at'].timestamp())}:f>",
+                value=preview or "(無內容)",
+                inline=False
+            )
+        embed.set_footer(text=f"待執行總數：{await self.bot.scheduler.pending_count()}")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="schedule_cancel", description="[開發者限定] 取消預約工作")
+    @app_commands.describe(job_id="排程編號 (可由 /schedule_list 查詢)")
+    async def schedule_cancel(self, interaction: discord.Interaction, job_id: int):
+        if interaction.user.id != self.bot.config['DEVELOPER_ID']:
+            return await interaction.response.send_message("❌ 無權限", ephemeral=True)
+
+        if await self.bot.scheduler.cancel(job_id):
+            await interaction.response.send_message(f"🗑️ 已取消排程 `#{job_id}`。", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"❌ 找不到待執行的排程 `#{job_id}`。", ephemeral=True)
+
+    @app_commands.command(name="rebuild_totals", description="[開發者限定] 由獎懲紀錄重建累計統計表")
+    @app_commands.describe(guild_id="只重建指定伺服器 (留空則重建全部)")
+    async def rebuild_totals(self, interaction: discord.Interaction, guild_id: str = None):
+        if interaction.user.id != self.bot.config['DEVELOPER_ID']:
+            return await interaction.response.send_message("❌ 無權限", ephemeral=True)
+        try:
+            target_id = int(guild_id) if guild_id else None
+        except ValueError:
+            return await interaction.response.send_message("❌ 伺服器 ID 格式錯誤。", ephemeral=True)
+
+        await interaction.response.defer(ephemeral=True)
+        async with self.bot.db_pool.acquire() as conn:
+            count = await rebuild_member_totals(conn, target_id)
+        scope = f"伺服器 `{target_id}`" if target_id else "全部伺服器"
+        await interaction.followup.send(f"✅ 已重建{scope}的累計統計，共 {count} 位成員。", ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(DevCog(bot))
\ No newline at end of file
@@ -0,0 +1,51 @@
+import asyncio
+import discord
+from discord.ext import commands
+
+class MemberIndexCog(commands.Cog):
+    """依 gateway 事件維護 bot.member_index (成員名稱搜尋索引)"""
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # 重新連線後 on_ready 可能再次觸發，直接重建即可；每個伺服器之間讓出事件迴圈，避免卡住心跳
+        for guild in list(self.bot.guilds):
+            self.bot.member_index.build(guild)
+            await asyncio.sleep(0)
+        print(f"✅ 成員名稱索引已建立：{self.bot.member_index.stats()['indexed_members']} 位成員")
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        self.bot.member_index.build(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.bot.member_index.drop(guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        self.bot.member_index.add(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        self.bot.member_index.remove(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        # 只有暱稱變動才需要更新索引 (身分組、狀態等變動略過)
+        if before.display_name != after.display_name or before.name != after.name:
+            self.bot.member_index.add(after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        # 使用者名稱 / 全域顯示名稱變更會影響所有共同伺服器
+        if before.name == after.name and before.display_name == after.display_name:
+            return
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member:
+                self.bot.member_index.add(member)
+
+async def setup(bot):
+    await bot.add_cog(MemberIndexCog(bot))
@@ -3,7 +3,16 @@ from discord import app_commands, ui
 from discord.ext import commands
 from typing import Union
 from datetime import datetime, timedelta
+import asyncio
 import logging
+import re
+from records import add_member_record, add_member_records_bulk, get_member_totals, load_windowed_totals
+from rule_index import ALL_TIME, most_severe
+from reevaluation import load_reevaluation, plan_reevaluation, mark_fired
+from member_index import member_autocomplete
+
+# 批次獎懲單次最多處理的成員數
+BULK_LIMIT = 100
 
 # --- 1. 管理權限設定 View ---
 class AdminSetupView(ui.View):
@@ -23,6 +32,7 @@ class AdminSetupView(ui.View):
                 """,
                 self.target.id, interaction.guild_id
             )
+        self.cog.bot.guild_cache.invalidate(interaction.guild_id)
         
         type_str = "成員" if isinstance(self.target, discord.Member) else "身分組"
         await interaction.response.edit_message(
@@ -37,6 +47,7 @@ class AdminSetupView(ui.View):
                 "UPDATE guilds SET admin_list = array_remove(admin_list, $1) WHERE guild_id = $2",
                 self.target.id, interaction.guild_id
             )
+        self.cog.bot.guild_cache.invalidate(interaction.guild_id)
         
         type_str = "成員" if isinstance(self.target, discord.Member) else "身分組"
         await interaction.response.edit_message(
@@ -84,13 +95,8 @@ class ModModal(ui.Modal):
         type_cn = "警告" if self.mod_type == "warn" else "嘉獎"
         
         async with self.cog.bot.db_pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO member_records 
-                (guild_id, user_id, user_name, type, count, reason, operator_id, operator_name) 
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                """,
-                interaction.guild_id, self.member.id, self.member.display_name, 
+            totals = await add_member_record(
+                conn, interaction.guild_id, self.member.id, self.member.display_name,
                 type_cn, val, reason_text, interaction.user.id, interaction.user.display_name
             )
 
@@ -107,12 +113,17 @@ class ModModal(ui.Modal):
         await self.cog.log_to_channel(interaction.guild, log_embed)
         await interaction.response.send_message(f"✅ 已成功為 {self.member.display_name} 登記了 {val} 次 {type_cn}。")
         
-        await self.cog.check_auto_actions(interaction.guild, self.member, type_cn)
+        await self.cog.check_auto_actions(interaction.guild, self.member, type_cn, totals, delta=val)
 
 # --- 3. 核心 Cog ---
 class ModerationCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # 網頁端獎懲的 Discord 同步改由背景佇列執行
+        bot.side_effects.register("moderation_log", self.run_queued_log)
+        bot.side_effects.register("auto_action", self.run_queued_auto_action)
+        bot.side_effects.register("auto_action_bulk", self.run_queued_auto_action_bulk)
+        bot.side_effects.register("auto_action_reevaluate", self.run_reevaluation)
         # 中文動作對應字典
         self.action_names_zh = {
             'timeout': '執行禁言 (Timeout)',
@@ -125,87 +136,372 @@ class ModerationCog(commands.Cog):
         if interaction.user.id == interaction.guild.owner_id: return True
         if interaction.user.id == int(self.bot.config['DEVELOPER_ID']): return True
         
-        async with self.bot.db_pool.acquire() as conn:
-            admin_list = await conn.fetchval("SELECT admin_list FROM guilds WHERE guild_id = $1", interaction.guild_id)
-            if admin_list:
-                if interaction.user.id in admin_list: return True
-                user_role_ids = [role.id for role in interaction.user.roles]
-                if any(rid in admin_list for rid in user_role_ids): return True
+        settings = await self.bot.guild_cache.get(interaction.guild_id)
+        admin_list = settings['admin_list']
+        if admin_list:
+            if interaction.user.id in admin_list: return True
+            user_role_ids = [role.id for role in interaction.user.roles]
+            if any(rid in admin_list for rid in user_role_ids): return True
         return False
 
-    async def check_auto_actions(self, guild, member, record_type):
-        """檢查並執行自動化懲處邏輯"""
+    @staticmethod
+    def _current_count(settings, record_type, totals):
+        w_total, r_total = totals
+        if settings['offset_enabled']:
+            return max(0, w_total - r_total) if record_type == "警告" else max(0, r_total - w_total)
+        return w_total if record_type == "警告" else r_total
+
+    @classmethod
+    def _match_rule(cls, settings, record_type, totals, delta=None, windowed=None):
+        """
+        回傳這次變動應觸發的規則
+        delta 為本次登記的次數：只有新跨越的門檻會觸發 (取其中最高者)，之後再登記不會重複處置；
+        delta 為 None 時無法得知變動前數值，退回取目前已達到的最高門檻
+        windowed 為 {計數方式: (警告, 嘉獎)}，期間 / 遞減規則依各自的加總判斷，多種方式同時觸發時取最嚴重的處置
+        """
+        index = settings['rule_index']
+        candidates = []
+        for mode in index.modes(record_type):
+            if mode == ALL_TIME:
+                mode_totals = totals
+            elif windowed and mode in windowed:
+                mode_totals = windowed[mode]
+            else:
+                continue
+            current_count = cls._current_count(settings, record_type, mode_totals)
+            if delta is None:
+                rule = index.highest(record_type, current_count, mode)
+            else:
+                w_total, r_total = mode_totals
+                before = (w_total - delta, r_total) if record_type == "警告" else (w_total, r_total - delta)
+                crossed = index.crossed(record_type, cls._current_count(settings, record_type, before), current_count, mode)
+                rule = crossed[-1] if crossed else None
+            if rule:
+                candidates.append(rule)
+        return most_severe(candidates)
+
+    async def _windowed_totals(self, guild_id, settings, record_type, user_ids):
+        """{user_id: {計數方式: (警告, 嘉獎)}}；沒有期間 / 遞減規則時不查詢資料庫"""
+        modes = settings['rule_index'].windowed_modes(record_type)
+        if not modes:
+            return {}
         async with self.bot.db_pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT type, SUM(count) as total FROM member_records WHERE guild_id = $1 AND user_id = $2 GROUP BY type",
-                guild.id, member.id
-            )
-            stats = {r['type']: r['total'] for r in rows}
-            w_total = stats.get('警告', 0)
-            r_total = stats.get('嘉獎', 0)
-
-            offset_enabled = await conn.fetchval("SELECT offset_enabled FROM guilds WHERE guild_id = $1", guild.id)
-            
-            if offset_enabled:
-                current_count = max(0, w_total - r_total) if record_type == "警告" else max(0, r_total - w_total)
+            loaded = await load_windowed_totals(conn, guild_id, user_ids, modes)
+        return {uid: {mode: loaded[mode][uid] for mode in modes} for uid in user_ids}
+
+    async def _execute_action(self, guild, member, action, record_type):
+        action_type = action['action_type']
+        threshold = action['threshold']
+        if action_type == 'kick':
+            await member.kick(reason=f"自動懲處：{record_type}達標 {threshold} 次")
+        elif action_type == 'ban':
+            await member.ban(reason=f"自動懲處：{record_type}達標 {threshold} 次")
+        elif action_type == 'timeout':
+            duration = action.get('timeout_duration', 60)
+            await member.timeout(timedelta(minutes=duration), reason=f"自動懲處：{record_type}達標 {threshold} 次")
+        elif action_type == 'add_role':
+            role = guild.get_role(action['role_id'])
+            if role: await member.add_roles(role)
+
+    async def _mark_fired(self, guild_id, pairs):
+        """記錄已觸發的規則 [(user_id, rule_id), ...]，重新評估時不再重複處置"""
+        if pairs:
+            async with self.bot.db_pool.acquire() as conn:
+                await mark_fired(conn, guild_id, pairs)
+
+    def _action_detail(self, guild, action):
+        """(欄位名稱, 內容)，timeout 與 add_role 以外的動作沒有額外說明"""
+        if action['action_type'] == 'timeout':
+            return "時長", f"{action.get('timeout_duration', 60)} 分鐘"
+        if action['action_type'] == 'add_role':
+            role = guild.get_role(action['role_id'])
+            return "身分組", f"@{role.name if role else '未知'}"
+        return None
+
+    async def check_auto_actions(self, guild, member, record_type, totals=None, delta=None, raise_errors: bool = False):
+        """
+        檢查並執行自動化懲處邏輯 (totals 為寫入紀錄時回傳的 (警告, 嘉獎) 累計，delta 為本次登記次數)
+        raise_errors=True 時處置失敗會拋出例外 (背景佇列依此重試 / 寫入 dead letter)
+        """
+        if totals is None:
+            async with self.bot.db_pool.acquire() as conn:
+                totals = await get_member_totals(conn, guild.id, member.id)
+
+        # 伺服器設定與規則皆由快取提供；只有期間 / 遞減規則需要查詢該成員的期間加總 (索引範圍掃描)
+        settings = await self.bot.guild_cache.get(guild.id)
+        windowed = await self._windowed_totals(guild.id, settings, record_type, [member.id])
+        action = self._match_rule(settings, record_type, totals, delta, windowed.get(member.id))
+
+        if action:
+            try:
+                threshold = action['threshold']
+                action_text_zh = self.action_names_zh.get(action['action_type'], action['action_type'])
+                
+                # 執行動作 (最高優先，不受公告等大量發送影響)
+                await self.bot.dispatcher.submit("moderation", guild.id, lambda: self._execute_action(guild, member, action, record_type))
+                await self._mark_fired(guild.id, [(member.id, action['id'])])
+
+                # 發送中文 Embed 通知
+                log_embed = discord.Embed(
+                    title="🛡️ 系統自動化處置通知",
+                    description=f"成員 {member.mention} 已達到自動處分門檻。",
+                    color=discord.Color.red() if record_type == "警告" else discord.Color.green(),
+                    timestamp=datetime.now()
+                )
+                log_embed.add_field(name="觸發原因", value=f"累積 {record_type} 達 **{threshold}** 次", inline=True)
+                log_embed.add_field(name="執行動作", value=f"**{action_text_zh}**", inline=True)
+                
+                detail = self._action_detail(guild, action)
+                if detail:
+                    log_embed.add_field(name=detail[0], value=detail[1], inline=True)
+
+                log_embed.set_thumbnail(url=member.display_avatar.url)
+                log_embed.set_footer(text="自動化管理系統 | 兩端同步運作中")
+                
+                await self.log_to_channel(guild, log_embed)
+                
+            except Exception as e:
+                logging.error(f"自動化執行異常: {e}")
+                if raise_errors: raise
+
+    async def check_auto_actions_bulk(self, guild, results, record_type, delta=None, concurrency: int = 5):
+        """
+        批次版自動化處置：results 為 [(member, (警告, 嘉獎)), ...]，delta 為每人登記次數
+        規則只讀取一次，依命中的規則分組後以有限併發執行；回傳 [(規則, 成功成員, 失敗成員), ...]
+        """
+        settings = await self.bot.guild_cache.get(guild.id)
+        windowed = await self._windowed_totals(guild.id, settings, record_type, [m.id for m, _ in results])
+        groups = {}
+        for member, totals in results:
+            action = self._match_rule(settings, record_type, totals, delta, windowed.get(member.id))
+            if action:
+                groups.setdefault(action['id'], (action, []))[1].append(member)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(action, member):
+            async with semaphore:
+                try:
+                    await self.bot.dispatcher.submit("moderation", guild.id, lambda: self._execute_action(guild, member, action, record_type))
+                    return True
+                except Exception as e:
+                    logging.error(f"自動化執行異常 ({member.id}): {e}")
+                    return False
+
+        summary = []
+        for action, members in groups.values():
+            outcomes = await asyncio.gather(*(run(action, m) for m in members))
+            done = [m for m, ok in zip(members, outcomes) if ok]
+            failed = [m for m, ok in zip(members, outcomes) if not ok]
+            await self._mark_fired(guild.id, [(m.id, action['id']) for m in done])
+            summary.append((action, done, failed))
+        return summary
+
+    @staticmethod
+    def _mention_list(members, limit: int = 1024) -> str:
+        """成員提及列表，超過欄位長度時以「等 N 位」結尾"""
+        text = ""
+        for i, m in enumerate(members):
+            part = (", " if text else "") + m.mention
+            rest = f" ...等 {len(members) - i} 位"
+            if len(text) + len(part) + len(rest) > limit:
+                return text + rest
+            text += part
+        return text or "無"
+
+    def is_protected(self, guild, member, admin_list) -> bool:
+        """擁有者與授權管理員 (含身分組授權) 只能由擁有者執行獎懲"""
+        if member.id == guild.owner_id or member.id in admin_list:
+            return True
+        return any(role.id in admin_list for role in member.roles)
+
+    async def record_bulk(self, guild, members, record_type, count, reason, operator, operator_is_owner: bool):
+        """
+        批次獎懲的資料庫部分：過濾對象 → 一次寫入
+        回傳 (已登記成員, 略過成員, {user_id: (警告, 嘉獎)})
+        """
+        admin_list = (await self.bot.guild_cache.get(guild.id))['admin_list']
+        targets, skipped = [], []
+        for m in dict.fromkeys(members):
+            if m.bot or (not operator_is_owner and self.is_protected(guild, m, admin_list)):
+                skipped.append(m)
             else:
-                current_count = w_total if record_type == "警告" else r_total
+                targets.append(m)
+        targets = targets[:BULK_LIMIT]
+        if not targets:
+            return [], skipped, {}
 
-            action = await conn.fetchrow(
-                "SELECT * FROM auto_actions WHERE guild_id = $1 AND type = $2 AND threshold <= $3 ORDER BY threshold DESC LIMIT 1", 
-                guild.id, record_type, current_count
+        async with self.bot.db_pool.acquire() as conn:
+            totals = await add_member_records_bulk(
+                conn, guild.id, [(m.id, m.display_name) for m in targets],
+                record_type, count, reason, operator.id, operator.display_name
             )
-            
-            if action:
+        return targets, skipped, totals
+
+    def bulk_record_embed(self, targets, record_type, count, reason, operator_mention, source):
+        emoji = "⚠️" if record_type == "警告" else "✨"
+        log_embed = discord.Embed(
+            title=f"{emoji} 批次{record_type}紀錄 ({source})",
+            color=discord.Color.red() if record_type == "警告" else discord.Color.gold(),
+            timestamp=datetime.now()
+        )
+        log_embed.add_field(name=f"對象成員 ({len(targets)} 位)", value=self._mention_list(targets), inline=False)
+        log_embed.add_field(name="變動次數", value=f"每人 **{count}** 次", inline=True)
+        log_embed.add_field(name="執行管理員", value=operator_mention, inline=True)
+        log_embed.add_field(name="原因細節", value=reason, inline=False)
+        return log_embed
+
+    def _add_summary_fields(self, log_embed, guild, record_type, summary):
+        """把 check_auto_actions_bulk 的結果加到日誌 Embed (每條規則一個欄位)"""
+        for action, done, failed in summary[:10]:
+            action_text_zh = self.action_names_zh.get(action['action_type'], action['action_type'])
+            value = self._mention_list(done, limit=900)
+            if failed:
+                value += f"\n❌ 執行失敗 {len(failed)} 位"
+            detail = self._action_detail(guild, action)
+            if detail:
+                value += f"\n{detail[0]}：{detail[1]}"
+            log_embed.add_field(
+                name=f"🛡️ 自動處置：累積 {record_type} 達 {action['threshold']} 次 → {action_text_zh}",
+                value=value[:1024], inline=False
+            )
+
+    async def apply_bulk_record(self, guild, members, record_type, count, reason, operator, operator_is_owner: bool, source: str = "指令"):
+        """
+        斜線指令的批次獎懲：一次寫入 → 批次自動化 → 一則彙整日誌
+        operator 需有 id / display_name / mention；回傳 (已登記成員, 略過成員)
+        網頁端只在請求中呼叫 record_bulk，自動化與日誌交給背景佇列
+        """
+        targets, skipped, totals = await self.record_bulk(guild, members, record_type, count, reason, operator, operator_is_owner)
+        if not targets:
+            return [], skipped
+        summary = await self.check_auto_actions_bulk(guild, [(m, totals[m.id]) for m in targets], record_type, delta=count)
+
+        log_embed = self.bulk_record_embed(targets, record_type, count, reason, operator.mention, source)
+        self._add_summary_fields(log_embed, guild, record_type, summary)
+        await self.log_to_channel(guild, log_embed)
+        return targets, skipped
+
+    async def log_to_channel(self, guild, embed, raise_errors: bool = False):
+        """
+        交由 bot.log_buffer 合併發送 (短時間內的日誌併成一則訊息)
+        raise_errors=True 時等待送出，發送失敗會拋出例外 (背景佇列依此重試)
+        """
+        future = self.bot.log_buffer.submit(guild.id, embed, wait=raise_errors)
+        if future is not None:
+            await future
+
+    async def run_queued_log(self, payload):
+        """背景佇列：發送日誌 Embed (payload 為 guild_id 與 embed.to_dict())"""
+        await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(payload['guild_id'])
+        if guild:
+            await self.log_to_channel(guild, discord.Embed.from_dict(payload['embed']), raise_errors=True)
+
+    async def run_queued_auto_action(self, payload):
+        """背景佇列：依寫入後的累計檢查自動化處置 (成員已離開則略過)"""
+        await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(payload['guild_id'])
+        member = guild.get_member(payload['user_id']) if guild else None
+        if member:
+            await self.check_auto_actions(
+                guild, member, payload['record_type'],
+                (payload['warnings'], payload['commends']), delta=payload['delta'], raise_errors=True
+            )
+
+    async def run_queued_auto_action_bulk(self, payload):
+        """
+        背景佇列：網頁端批次獎懲後的自動化處置 (payload['totals'] 為 [[user_id, 警告, 嘉獎], ...])
+        有成員處置失敗時，payload 只保留失敗的成員並拋出例外，佇列重試時不會重複處置已成功的成員
+        """
+        await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(payload['guild_id'])
+        if not guild: return
+        results = [
+            (member, (w, c)) for member, w, c in
+            ((guild.get_member(uid), w, c) for uid, w, c in payload['totals'])
+            if member
+        ]
+        if not results: return
+        record_type = payload['record_type']
+        summary = await self.check_auto_actions_bulk(guild, results, record_type, delta=payload['delta'])
+        if summary:
+            log_embed = discord.Embed(
+                title=f"🛡️ 批次{record_type}後的自動化處置",
+                color=discord.Color.red() if record_type == "警告" else discord.Color.green(),
+                timestamp=datetime.now()
+            )
+            self._add_summary_fields(log_embed, guild, record_type, summary)
+            await self.log_to_channel(guild, log_embed)
+
+        failed_ids = {m.id for _, _, failed in summary for m in failed}
+        if failed_ids:
+            payload['totals'] = [t for t in payload['totals'] if t[0] in failed_ids]
+            raise RuntimeError(f"{len(failed_ids)} 位成員的自動化處置失敗")
+
+    async def run_reevaluation(self, payload):
+        """
+        背景佇列：規則 / 抵銷模式變更後重新評估整個伺服器
+        執行時重新計算一次，只處置管理員確認過的 (成員, 規則) 組合 (payload['targets']) 中仍符合條件者；
+        預覽後才達到門檻的成員或變更後的規則不會在未經確認下執行；處置之間間隔 REEVALUATE_INTERVAL 秒，避免瞬間大量踢出 / 封鎖
+        只處置成員尚未觸發過的規則；執行成功或效果仍存在的規則記為已觸發，失敗的成員留待佇列重試
+        """
+        await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(payload['guild_id'])
+        if not guild: return
+        async with self.bot.db_pool.acquire() as conn:
+            rows = await load_reevaluation(conn, guild.id)
+        interval = self.bot.config.get("REEVALUATE_INTERVAL", 0.5)
+
+        groups, applied = plan_reevaluation(guild, rows)
+        await self._mark_fired(guild.id, applied)
+        confirmed = {(uid, rid) for uid, rid in payload.get('targets', [])}
+
+        summary = []
+        for rule, targets in groups:
+            targets = [t for t in targets if (t[0].id, rule['id']) in confirmed]
+            if not targets:
+                continue
+            done, failed = [], []
+            for member, _, rule_ids in targets:
                 try:
-                    action_type = action['action_type']
-                    threshold = action['threshold']
-                    action_text_zh = self.action_names_zh.get(action_type, action_type)
-                    
-                    # 執行動作
-                    if action_type == 'kick':
-                        await member.kick(reason=f"自動懲處：{record_type}達標 {threshold} 次")
-                    elif action_type == 'ban':
-                        await member.ban(reason=f"自動懲處：{record_type}達標 {threshold} 次")
-                    elif action_type == 'timeout':
-                        duration = action.get('timeout_duration', 60)
-                        await member.timeout(timedelta(minutes=duration), reason=f"自動懲處：{record_type}達標 {threshold} 次")
-                    elif action_type == 'add_role':
-                        role = guild.get_role(action['role_id'])
-                        if role: await member.add_roles(role)
-
-                    # 發送中文 Embed 通知
-                    log_embed = discord.Embed(
-                        title="🛡️ 系統自動化處置通知",
-                        description=f"成員 {member.mention} 已達到自動處分門檻。",
-                        color=discord.Color.red() if record_type == "警告" else discord.Color.green(),
-                        timestamp=datetime.now()
+                    await self.bot.dispatcher.submit(
+                        "moderation", guild.id,
+                        lambda member=member, rule=rule: self._execute_action(guild, member, rule, rule['type'])
                     )
-                    log_embed.add_field(name="觸發原因", value=f"累積 {record_type} 達 **{threshold}** 次", inline=True)
-                    log_embed.add_field(name="執行動作", value=f"**{action_text_zh}**", inline=True)
-                    
-                    if action_type == 'timeout':
-                        log_embed.add_field(name="時長", value=f"{action.get('timeout_duration', 60)} 分鐘", inline=True)
-                    elif action_type == 'add_role':
-                        role = guild.get_role(action['role_id'])
-                        log_embed.add_field(name="身分組", value=f"@{role.name if role else '未知'}", inline=True)
-
-                    log_embed.set_thumbnail(url=member.display_avatar.url)
-                    log_embed.set_footer(text="自動化管理系統 | 兩端同步運作中")
-                    
-                    await self.log_to_channel(guild, log_embed)
-                    
+                    await self._mark_fired(guild.id, [(member.id, rid) for rid in rule_ids])
+                    done.append(member)
                 except Exception as e:
-                    logging.error(f"自動化執行異常: {e}")
+                    logging.error(f"重新評估執行異常 ({member.id}): {e}")
+                    failed.append(member)
+                await asyncio.sleep(interval)
+            summary.append((rule, done, failed))
+        if not summary: return
 
-    async def log_to_channel(self, guild, embed):
-        async with self.bot.db_pool.acquire() as conn:
-            channel_id = await conn.fetchval("SELECT log_channel_id FROM guilds WHERE guild_id = $1", guild.id)
-        if channel_id:
-            channel = guild.get_channel(channel_id)
-            if channel:
-                try: await channel.send(embed=embed)
-                except: pass
+        log_embed = discord.Embed(
+            title="🔄 自動化規則重新評估",
+            description=f"由 {payload['operator_name']} 於規則變更後執行。",
+            color=discord.Color.blurple(),
+            timestamp=datetime.now()
+        )
+        for rule, done, failed in summary[:10]:
+            action_text_zh = self.action_names_zh.get(rule['action_type'], rule['action_type'])
+            value = self._mention_list(done, limit=900)
+            if failed:
+                value += f"\n❌ 執行失敗 {len(failed)} 位"
+            detail = self._action_detail(guild, rule)
+            if detail:
+                value += f"\n{detail[0]}：{detail[1]}"
+            log_embed.add_field(
+                name=f"🛡️ 累積 {rule['type']} 達 {rule['threshold']} 次 → {action_text_zh}",
+                value=value[:1024], inline=False
+            )
+        await self.log_to_channel(guild, log_embed)
+
+        failed_count = sum(len(failed) for _, _, failed in summary)
+        if failed_count:
+            # 已執行的成員已記為觸發，重試時只會再處置失敗的成員
+            raise RuntimeError(f"{failed_count} 位成員的重新評估處置失敗")
 
     # --- 指令區 ---
     @app_commands.command(name="admin", description="授權成員或身分組使用管理指令 (限擁有者使用)")
@@ -214,8 +510,8 @@ class ModerationCog(commands.Cog):
         if interaction.user.id != interaction.guild.owner_id and interaction.user.id != int(self.bot.config['DEVELOPER_ID']):
             return await interaction.response.send_message("❌ 此指令僅限伺服器擁有者使用。", ephemeral=True)
 
-        async with self.bot.db_pool.acquire() as conn:
-            admin_list = await conn.fetchval("SELECT admin_list FROM guilds WHERE guild_id = $1", interaction.guild_id)
+        settings = await self.bot.guild_cache.get(interaction.guild_id)
+        admin_list = settings['admin_list']
         
         is_authorized = admin_list and member_or_role.id in admin_list
         status_text = "🟢 已擁有管理權限" if is_authorized else "⚪ 目前無管理權限"
@@ -240,15 +536,59 @@ class ModerationCog(commands.Cog):
             return await interaction.response.send_message("❌ 您沒有管理權限。", ephemeral=True)
         await interaction.response.send_modal(ModModal(f"登記嘉獎：{member.display_name}", member, 'reward', self))
 
+    @app_commands.command(name="bulk_record", description="一次為多位成員登記警告或嘉獎")
+    @app_commands.describe(
+        action="登記類型",
+        members="以空白分隔的 @成員 或使用者 ID (輸入名稱可搜尋成員)",
+        role="對此身分組的所有成員登記",
+        count="每人變動次數",
+        reason="原因"
+    )
+    @app_commands.choices(action=[
+        app_commands.Choice(name="警告", value="warn"),
+        app_commands.Choice(name="嘉獎", value="reward")
+    ])
+    @app_commands.autocomplete(members=member_autocomplete)
+    async def bulk_record(
+        self,
+        interaction: discord.Interaction,
+        action: app_commands.Choice[str],
+        members: str = None,
+        role: discord.Role = None,
+        count: app_commands.Range[int, 1, 99] = 1,
+        reason: app_commands.Range[str, 1, 200] = None
+    ):
+        if not await self.has_mod_permission(interaction):
+            return await interaction.response.send_message("❌ 您沒有管理權限。", ephemeral=True)
+
+        guild = interaction.guild
+        targets = [m for m in map(guild.get_member, map(int, re.findall(r"\d{15,20}", members or ""))) if m]
+        if role:
+            targets.extend(role.members)
+        if not targets:
+            return await interaction.response.send_message("❌ 找不到任何符合的成員。", ephemeral=True)
+
+        # 批次寫入與自動化處置可能超過 3 秒，先延後回應
+        await interaction.response.defer()
+        type_cn = "警告" if action.value == "warn" else "嘉獎"
+        done, skipped = await self.apply_bulk_record(
+            guild, targets, type_cn, count, reason or "管理員未註明原因",
+            interaction.user, operator_is_owner=interaction.user.id == guild.owner_id
+        )
+
+        message = f"✅ 已為 {len(done)} 位成員各登記 {count} 次 {type_cn}。"
+        if skipped:
+            message += f"\n⚪ 略過 {len(skipped)} 位 (機器人或受保護的管理員)。"
+        if len(dict.fromkeys(targets)) - len(skipped) > BULK_LIMIT:
+            message += f"\n⚠️ 單次最多處理 {BULK_LIMIT} 位，其餘成員未登記。"
+        await interaction.followup.send(message)
+
     @app_commands.command(name="record", description="查詢獎懲累積紀錄")
     async def record(self, interaction: discord.Interaction, member: discord.Member = None):
         target = member or interaction.user
         async with self.bot.db_pool.acquire() as conn:
-            rows = await conn.fetch("SELECT type, SUM(count) as total FROM member_records WHERE guild_id = $1 AND user_id = $2 GROUP BY type", interaction.guild_id, target.id)
-            offset_enabled = await conn.fetchval("SELECT offset_enabled FROM guilds WHERE guild_id = $1", interaction.guild_id)
-        
-        stats = {r['type']: r['total'] for r in rows}
-        w, r = stats.get('警告', 0), stats.get('嘉獎', 0)
+            w, r = await get_member_totals(conn, interaction.guild_id, target.id)
+        offset_enabled = (await self.bot.guild_cache.get(interaction.guild_id))['offset_enabled']
         
         embed = discord.Embed(title=f"📊 成員獎懲統計庫", color=discord.Color.blue(), timestamp=datetime.now())
         embed.set_thumbnail(url=target.display_avatar.url)
@@ -0,0 +1,94 @@
+import asyncio
+import discord
+from discord.ext import commands
+
+class GuildStatsCog(commands.Cog):
+    """依 gateway 事件維護 bot.guild_stats (伺服器成員 / 管理員 / 頻道統計)"""
+    def __init__(self, bot):
+        self.bot = bot
+
+    def _stats(self, guild):
+        # 尚未建立統計的伺服器略過增量事件，稍後 snapshot() 會以當下狀態完整建立
+        return self.bot.guild_stats.peek(guild.id)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild in list(self.bot.guilds):
+            self.bot.guild_stats.build(guild)
+            await asyncio.sleep(0)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        self.bot.guild_stats.build(guild)
+        self.bot.guild_directory.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.bot.guild_stats.drop(guild.id)
+        self.bot.guild_directory.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        if before.name != after.name:
+            self.bot.guild_directory.invalidate()
+        stats = self._stats(after)
+        if stats and before.owner_id != after.owner_id:
+            stats.rebuild_admins(after)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        stats = self._stats(member.guild)
+        if stats:
+            stats.member_added(member.guild, member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        stats = self._stats(member.guild)
+        if stats:
+            stats.member_removed(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        stats = self._stats(after.guild)
+        if stats and before.roles != after.roles:
+            stats.member_updated(after.guild, after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        # 新身分組還沒有成員，只需記下是否具管理員權限
+        stats = self._stats(role.guild)
+        if stats and role.permissions.administrator:
+            stats.admin_role_ids.add(role.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        stats = self._stats(role.guild)
+        if stats and role.permissions.administrator:
+            stats.rebuild_admins(role.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        stats = self._stats(after.guild)
+        if stats and before.permissions.administrator != after.permissions.administrator:
+            stats.rebuild_admins(after.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        stats = self._stats(channel.guild)
+        if stats:
+            stats.rebuild_channels(channel.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        stats = self._stats(channel.guild)
+        if stats:
+            stats.rebuild_channels(channel.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        stats = self._stats(after.guild)
+        if stats and (before.name != after.name or before.position != after.position):
+            stats.rebuild_channels(after.guild)
+
+async def setup(bot):
+    await bot.add_cog(GuildStatsCog(bot))
@@ -4,6 +4,8 @@ from discord.ext import commands
 import logging
 import math
 from datetime import datetime
+from template_search import list_templates_page
+from views import TemplateReviewView as WebReviewView, notify_managers
 
 # 定義分類清單 (需與 web_main.py 保持一致)
 CATEGORIES = ["技術開發", "遊戲社群", "休閒娛樂", "學術教育", "商務辦公", "其他"]
@@ -21,13 +23,12 @@ class RejectReasonModal(ui.Modal, title='請輸入不通過原因'):
         async with self.bot.db_pool.acquire() as conn:
             await conn.execute("UPDATE templates SET status = '未通過' WHERE id = $1", self.template_id)
         
-        user = await self.bot.fetch_user(self.user_id)
-        if user:
-            embed = discord.Embed(title="❌ 模板申請未通過", color=discord.Color.red())
-            embed.add_field(name="模板名稱", value=self.template_name, inline=False)
-            embed.add_field(name="原因", value=self.reason.value, inline=False)
-            try: await user.send(embed=embed)
-            except: pass
+        embed = discord.Embed(title="❌ 模板申請未通過", color=discord.Color.red())
+        embed.add_field(name="模板名稱", value=self.template_name, inline=False)
+        embed.add_field(name="原因", value=self.reason.value, inline=False)
+        try: await self.bot.user_cache.send(self.user_id, embed=embed)
+        except discord.HTTPException as e:
+            logging.warning(f"模板 {self.template_id} 未通過通知私訊失敗 ({self.user_id}): {e}")
         
         await interaction.response.send_message("✅ 已拒絕並通知使用者。", ephemeral=True)
 
@@ -43,14 +44,13 @@ class TemplateReviewView(ui.View):
         async with self.bot.db_pool.acquire() as conn:
             await conn.execute("UPDATE templates SET status = '已通過' WHERE id = $1", self.template_id)
         
-        user = await self.bot.fetch_user(self.user_id)
-        if user:
-            embed = discord.Embed(title="🎉 模板審核通過！", color=discord.Color.green())
-            embed.add_field(name="模板名稱", value=self.template_name, inline=True)
-            embed.add_field(name="分類", value=self.category, inline=True)
-            embed.add_field(name="連結", value=f"[點我查看]({self.link})", inline=False)
-            try: await user.send(embed=embed)
-            except: pass
+        embed = discord.Embed(title="🎉 模板審核通過！", color=discord.Color.green())
+        embed.add_field(name="模板名稱", value=self.template_name, inline=True)
+        embed.add_field(name="分類", value=self.category, inline=True)
+        embed.add_field(name="連結", value=f"[點我查看]({self.link})", inline=False)
+        try: await self.bot.user_cache.send(self.user_id, embed=embed)
+        except discord.HTTPException as e:
+            logging.warning(f"模板 {self.template_id} 通過通知私訊失敗 ({self.user_id}): {e}")
         
         for child in self.children: child.disabled = True
         await interaction.response.edit_message(content=f"✅ **此模板 ({self.category}) 已核准**", view=self)
@@ -68,22 +68,22 @@ class DevReviewView(TemplateReviewView):
     async def delegate(self, interaction: discord.Interaction, button: ui.Button):
         async with self.bot.db_pool.acquire() as conn:
             managers = await conn.fetch("SELECT user_id FROM managers")
+            if not managers: return await interaction.response.send_message("❌ 無管理員。", ephemeral=True)
             await conn.execute("UPDATE templates SET status = '已下放' WHERE id = $1", self.template_id)
-            
-        if not managers: return await interaction.response.send_message("❌ 無管理員。", ephemeral=True)
-
-        for m in managers:
-            m_user = await self.bot.fetch_user(m['user_id'])
-            if m_user:
-                embed = discord.Embed(title="🔔 領取審核任務", color=discord.Color.blue())
-                embed.add_field(name="名稱", value=self.template_name, inline=True)
-                embed.add_field(name="分類", value=self.category, inline=True)
-                try: await m_user.send(embed=embed, view=TemplateReviewView(self.template_id, self.user_id, self.bot, self.template_name, self.link, self.desc, self.category))
-                except: continue
-        
+
+        # 先停用按鈕回應互動，再併發私訊管理員 (逐一發送容易超過 3 秒互動期限)
         button.disabled = True
         await interaction.response.edit_message(view=self)
 
+        embed = discord.Embed(title="🔔 領取審核任務", color=discord.Color.blue())
+        embed.add_field(name="名稱", value=self.template_name, inline=True)
+        embed.add_field(name="分類", value=self.category, inline=True)
+        reached = await notify_managers(self.bot, [m['user_id'] for m in managers], lambda: {
+            "embed": embed,
+            "view": TemplateReviewView(self.template_id, self.user_id, self.bot, self.template_name, self.link, self.desc, self.category)
+        })
+        await interaction.followup.send(f"📢 已下放給管理員，私訊送達 {reached}/{len(managers)} 位。", ephemeral=True)
+
 # --- 4. 分類選擇下拉選單 ---
 class CategorySelectView(ui.View):
     def __init__(self, bot, name, link, desc):
@@ -102,18 +102,33 @@ class CategorySelectView(ui.View):
         await interaction.response.edit_message(content=f"✅ 模板 **{self.name}** ({category}) 已提交審核！", view=None)
         
         # 通知開發者
-        dev = await self.bot.fetch_user(self.bot.config['DEVELOPER_ID'])
-        if dev:
-            embed = discord.Embed(title="🛡️ 新模板待審核 (來自機器人)", color=discord.Color.blue())
-            embed.add_field(name="名稱", value=self.name, inline=True)
-            embed.add_field(name="分類", value=category, inline=True)
-            view = DevReviewView(tid, interaction.user.id, self.bot, self.name, self.link, self.desc, category)
-            try: await dev.send(embed=embed, view=view)
-            except: pass
+        embed = discord.Embed(title="🛡️ 新模板待審核 (來自機器人)", color=discord.Color.blue())
+        embed.add_field(name="名稱", value=self.name, inline=True)
+        embed.add_field(name="分類", value=category, inline=True)
+        view = DevReviewView(tid, interaction.user.id, self.bot, self.name, self.link, self.desc, category)
+        try: await self.bot.user_cache.send(self.bot.config['DEVELOPER_ID'], embed=embed, view=view)
+        except discord.HTTPException as e:
+            logging.warning(f"模板 {tid} 審核通知私訊開發者失敗: {e}")
 
 # --- 5. 主 Cog ---
 class TemplateCog(commands.Cog):
-    def __init__(self, bot): self.bot = bot
+    def __init__(self, bot):
+        self.bot = bot
+        # 網頁端上傳後通知開發者審核 (由背景佇列執行)
+        bot.side_effects.register("template_upload_review", self.notify_web_upload)
+
+    async def notify_web_upload(self, payload):
+        await self.bot.wait_until_ready()
+        embed = discord.Embed(title="🛡️ 新模板審核申請 (網頁端)", color=discord.Color.gold())
+        embed.add_field(name="模板名稱", value=payload['template_name'], inline=True)
+        embed.add_field(name="分類", value=payload['category'], inline=True)
+        embed.add_field(name="上傳者", value=payload['user_name'], inline=False)
+        embed.add_field(name="連結", value=payload['link'], inline=False)
+        embed.description = f"描述：{payload['description']}"
+        
+        # 使用 views.py 裡的 View
+        view = WebReviewView(payload['template_id'], self.bot.db_pool, payload['user_name'], bot=self.bot)
+        await self.bot.user_cache.send(self.bot.config['DEVELOPER_ID'], embed=embed, view=view)
 
     @app_commands.command(name="template", description="上傳模板並選擇分類")
     async def template(self, interaction: discord.Interaction):
@@ -137,21 +152,51 @@ class TemplateCog(commands.Cog):
 
     @app_commands.command(name="my_template", description="管理您的模板")
     async def my_template(self, interaction: discord.Interaction):
-        async with self.bot.db_pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM templates WHERE uploader_id = $1 ORDER BY created_at DESC", interaction.user.id)
-        
+        # 下拉選單最多 25 個選項，以 keyset 分頁逐頁讀取，只取選單需要的欄位
+        async def fetch_page(bot, user_id, cursor):
+            async with bot.db_pool.acquire() as conn:
+                return await list_templates_page(
+                    conn, uploader_id=user_id, cursor=cursor, limit=25,
+                    columns="id, template_name, category, created_at"
+                )
+
+        rows, next_cursor = await fetch_page(self.bot, interaction.user.id, None)
         if not rows: return await interaction.response.send_message("您目前沒有任何模板紀錄。", ephemeral=True)
 
         embed = discord.Embed(title="📂 我的模板清單", color=discord.Color.blue())
-        options = [discord.SelectOption(label=f"[{r['category']}] {r['template_name']}", value=str(r['id'])) for r in rows[:25]]
 
         class MyView(ui.View):
-            def __init__(self, bot, opts):
+            def __init__(self, bot, user_id, rows, cursors, next_cursor):
                 super().__init__(timeout=180)
+                self.bot, self.user_id = bot, user_id
+                # cursors 為已走過各頁的起始游標，用來返回上一頁
+                self.cursors, self.next_cursor = cursors, next_cursor
+                opts = [discord.SelectOption(label=f"[{r['category']}] {r['template_name']}"[:100], value=str(r['id'])) for r in rows]
                 sel = ui.Select(options=opts, placeholder="選擇要管理的模板...")
                 sel.callback = self.sel_cb
                 self.add_item(sel)
-                self.bot = bot
+
+                if len(cursors) > 1:
+                    prev_btn = ui.Button(label="上一頁", style=discord.ButtonStyle.gray)
+                    prev_btn.callback = self.prev_cb
+                    self.add_item(prev_btn)
+                if next_cursor:
+                    next_btn = ui.Button(label="下一頁", style=discord.ButtonStyle.gray)
+                    next_btn.callback = self.next_cb
+                    self.add_item(next_btn)
+
+            async def show_page(self, inter: discord.Interaction, cursors):
+                rows, next_cursor = await fetch_page(self.bot, self.user_id, cursors[-1])
+                if not rows:
+                    return await inter.response.edit_message(content="此頁已沒有模板。", view=None)
+                embed.set_footer(text=f"第 {len(cursors)} 頁")
+                await inter.response.edit_message(embed=embed, view=MyView(self.bot, self.user_id, rows, cursors, next_cursor))
+
+            async def prev_cb(self, inter: discord.Interaction):
+                await self.show_page(inter, self.cursors[:-1])
+
+            async def next_cb(self, inter: discord.Interaction):
+                await self.show_page(inter, self.cursors + [self.next_cursor])
 
             async def sel_cb(self, inter: discord.Interaction):
                 tid = int(inter.data['values'][0])
@@ -166,6 +211,7 @@ class TemplateCog(commands.Cog):
                 # 此處可以加入刪除或修改的按鈕
                 await inter.response.edit_message(embed=emb, view=None)
 
-        await interaction.response.send_message(embed=embed, view=MyView(self.bot, options), ephemeral=True)
+        embed.set_footer(text="第 1 頁")
+        await interaction.response.send_message(embed=embed, view=MyView(self.bot, interaction.user.id, rows, [None], next_cursor), ephemeral=True)
 
 async def setup(bot): await bot.add_cog(TemplateCog(bot))
\ No newline at end of file
@@ -0,0 +1,129 @@
+# 由程式自行維護的資料表 / 索引 (啟動時於 setup_hook 執行，可重複執行)
+SCHEMA_STATEMENTS = [
+    # 啟動時的一次性回填：與回填本身同一交易內寫入，中途失敗或程序被終止時下次啟動會重新執行
+    """
+    CREATE TABLE IF NOT EXISTS schema_backfills (
+        name TEXT PRIMARY KEY,
+        completed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    # 成員獎懲累計 (與 member_records 同一交易內增量維護)
+    """
+    CREATE TABLE IF NOT EXISTS member_totals (
+        guild_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        warnings INTEGER NOT NULL DEFAULT 0,
+        commends INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    )
+    """,
+    # 持久化排程工作 (預約公告等)，重啟後由 JobScheduler.start() 載回
+    """
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+        id BIGSERIAL PRIMARY KEY,
+        job_type TEXT NOT NULL,
+        payload JSONB NOT NULL DEFAULT '{}',
+        run_at TIMESTAMPTZ NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        created_by BIGINT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        finished_at TIMESTAMPTZ,
+        last_error TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS scheduled_jobs_pending_idx ON scheduled_jobs (run_at) WHERE status = 'pending'",
+    # 背景副作用佇列 (task_queue.SideEffectQueue) 重試後仍失敗的工作
+    """
+    CREATE TABLE IF NOT EXISTS side_effect_dead_letters (
+        id BIGSERIAL PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload JSONB NOT NULL DEFAULT '{}',
+        guild_id BIGINT,
+        user_id BIGINT,
+        attempts INTEGER NOT NULL,
+        last_error TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    # 每位成員已觸發過的自動化規則 (reevaluation 只處置尚未觸發過的規則，避免重新套用已失效的禁言或再次踢出)
+    """
+    CREATE TABLE IF NOT EXISTS auto_action_fired (
+        guild_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        rule_id INTEGER NOT NULL,
+        fired_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (guild_id, user_id, rule_id)
+    )
+    """,
+    # 自動化規則的計數方式：只計算最近 window_days 天的紀錄，或依 half_life_days 半衰期遞減 (皆為 NULL 時計算全部)
+    "ALTER TABLE auto_actions ADD COLUMN IF NOT EXISTS window_days INTEGER",
+    "ALTER TABLE auto_actions ADD COLUMN IF NOT EXISTS half_life_days INTEGER",
+    # 不同計數方式的規則可以使用相同門檻：唯一鍵加入計數方式 (NULL 以 0 表示)，
+    # 取代原本的 (guild_id, type, threshold) 唯一限制，否則新增期間規則會覆蓋同門檻的全部紀錄規則
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS auto_actions_rule_key_idx
+    ON auto_actions (guild_id, type, threshold, COALESCE(window_days, 0), COALESCE(half_life_days, 0))
+    """,
+    """
+    DO $$
+    DECLARE old_key TEXT;
+    BEGIN
+        SELECT con.conname INTO old_key
+        FROM pg_constraint con
+        WHERE con.conrelid = 'auto_actions'::regclass AND con.contype = 'u'
+          AND (SELECT array_agg(a.attname::TEXT ORDER BY a.attname) FROM pg_attribute a
+               WHERE a.attrelid = con.conrelid AND a.attnum = ANY(con.conkey)) = ARRAY['guild_id', 'threshold', 'type'];
+        IF old_key IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE auto_actions DROP CONSTRAINT %I', old_key);
+        END IF;
+    END $$
+    """,
+    # 紀錄時間：加入欄位前的舊紀錄時間未知，保留 NULL (不計入任何期間 / 遞減規則)，只有新紀錄預設為寫入時間
+    "ALTER TABLE member_records ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ",
+    "ALTER TABLE member_records ALTER COLUMN created_at SET DEFAULT now()",
+    # 期間內加總 (records.load_windowed_totals) 只掃描單一成員、單一類型的時間範圍，INCLUDE count 可只讀索引
+    "CREATE INDEX IF NOT EXISTS member_records_window_idx ON member_records (guild_id, user_id, type, created_at) INCLUDE (count)",
+    # 獎懲紀錄匯出 (record_export) 依時間順序掃描整個伺服器
+    "CREATE INDEX IF NOT EXISTS member_records_guild_created_idx ON member_records (guild_id, created_at)",
+    # 模板搜尋：中日韓字串拆成單字 + 雙字詞彙 (規則需與 template_search.build_tsquery 一致)
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION cjk_search_tokens(src text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT coalesce(string_agg(v.tok, ' '), '')
+        FROM regexp_matches(lower(coalesce(src, '')), '[\\u3040-\\u30ff\\u3400-\\u4dbf\\u4e00-\\u9fff\\uac00-\\ud7af\\uf900-\\ufaff]+', 'g') AS m(run),
+             generate_series(1, char_length(m.run[1])) AS i,
+             LATERAL (VALUES
+                 (substr(m.run[1], i, 1)),
+                 (CASE WHEN i < char_length(m.run[1]) THEN substr(m.run[1], i, 2) END)
+             ) AS v(tok)
+    $$
+    """,
+    """
+    ALTER TABLE templates ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(template_name, '') || ' ' || cjk_search_tokens(template_name)), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '') || ' ' || cjk_search_tokens(description)), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS templates_search_tsv_idx ON templates USING gin (search_tsv)",
+    "CREATE INDEX IF NOT EXISTS templates_search_trgm_idx ON templates USING gin ((lower(coalesce(template_name, '') || ' ' || coalesce(description, ''))) gin_trgm_ops)",
+    # 模板列表 keyset 分頁 (created_at, id)
+    "CREATE INDEX IF NOT EXISTS templates_status_created_idx ON templates (status, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS templates_status_category_created_idx ON templates (status, category, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS templates_uploader_created_idx ON templates (uploader_id, created_at DESC, id DESC)",
+]
+
+# 需要回填的項目 (依序執行；auto_action_fired 的起點依賴 member_totals)
+BACKFILLS = ("member_totals", "auto_action_fired")
+
+async def ensure_schema(db_pool):
+    """建立缺少的資料表與索引，回傳尚未完成的回填項目"""
+    async with db_pool.acquire() as conn:
+        for stmt in SCHEMA_STATEMENTS:
+            await conn.execute(stmt)
+        done = {r['name'] for r in await conn.fetch("SELECT name FROM schema_backfills")}
+    return [name for name in BACKFILLS if name not in done]
+
+async def mark_backfilled(conn, name: str):
+    """於回填的同一交易內呼叫"""
+    await conn.execute("INSERT INTO schema_backfills (name) VALUES ($1) ON CONFLICT DO NOTHING", name)
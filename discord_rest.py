@@ -0,0 +1,163 @@
+import time
+import httpx
+
+# 網頁端呼叫 Discord REST API (OAuth2 / 使用者資料) 共用的連線池
+# 整個應用程式只建立一個 AsyncClient，保持 keep-alive 連線，避免每個請求都重新做 TCP + TLS 握手
+
+class DiscordHTTP:
+    def __init__(self, base_url: str, max_connections: int = 50, max_keepalive: int = 20,
+                 keepalive_expiry: float = 60, timeout: float = 10, http2: bool = True):
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=5)
+        self.http2 = http2
+        self.client = None
+        # 連線重用統計
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _trace(self, event_name, info):
+        # httpcore 只有在建立新連線時才會送出 connect_tcp 事件，其餘請求都是重用既有連線
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        await self.start()
+        self.requests += 1
+        try:
+            return await self.client.request(method, path, extensions={"trace": self._trace}, **kwargs)
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    def stats(self) -> dict:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0,
+            "errors": self.errors,
+            "http2": self.http2
+        }
+
+class DiscordAuthError(Exception):
+    """使用者的 OAuth2 token 已失效，需要重新登入"""
+
+class DiscordRateLimited(Exception):
+    """被 Discord 限制且沒有舊資料可用"""
+    def __init__(self, retry_after: float):
+        super().__init__(f"請於 {retry_after:.0f} 秒後再試")
+        self.retry_after = retry_after
+
+class UserGuildCache:
+    """
+    /users/@me/guilds 的每位使用者快取
+    - TTL 內直接回傳快取
+    - 遇到 429 時在 retry_after 期間內回傳舊資料 (stale-while-revalidate)，不再打 Discord
+    - Discord 5xx 或連線錯誤時同樣回傳舊資料 (下次請求會再試)，沒有舊資料才拋出例外
+    """
+    def __init__(self, http: DiscordHTTP, ttl: float = 60, max_entries: int = 5000):
+        self.http = http
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}     # user_id -> (fetched_at, guilds)
+        self._retry_at = {}    # user_id -> 可再次請求的時間
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.rate_limited = 0
+        self.upstream_errors = 0
+
+    async def get(self, user_id: int, token: str, refresh: bool = False):
+        """回傳 (guilds, is_stale)"""
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+
+        if entry and not refresh and now - entry[0] < self.ttl:
+            self.hits += 1
+            return entry[1], False
+
+        # 仍在 Discord 要求的等待時間內：有舊資料就用舊資料
+        retry_at = self._retry_at.get(user_id, 0)
+        if retry_at > now:
+            if entry:
+                self.stale_served += 1
+                return entry[1], True
+            raise DiscordRateLimited(retry_at - now)
+
+        self.misses += 1
+        try:
+            res = await self.http.get("/users/@me/guilds", headers={"Authorization": f"Bearer {token}"})
+            if res.status_code >= 500:
+                res.raise_for_status()
+        except httpx.HTTPError:
+            self.upstream_errors += 1
+            if entry:
+                self.stale_served += 1
+                return entry[1], True
+            raise
+
+        if res.status_code == 429:
+            self.rate_limited += 1
+            try:
+                retry_after = float(res.json().get("retry_after", 5))
+            except ValueError:
+                retry_after = float(res.headers.get("Retry-After", 5))
+            self._retry_at[user_id] = now + retry_after
+            if entry:
+                self.stale_served += 1
+                return entry[1], True
+            raise DiscordRateLimited(retry_after)
+        if res.status_code == 401:
+            self.invalidate(user_id)
+            raise DiscordAuthError()
+        res.raise_for_status()
+
+        guilds = res.json()
+        self._retry_at.pop(user_id, None)
+        self._entries.pop(user_id, None)
+        self._entries[user_id] = (now, guilds)
+        # 超過上限時移除最久沒更新的使用者 (dict 依插入順序)
+        while len(self._entries) > self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        return guilds, False
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+        self._retry_at.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_served": self.stale_served,
+            "rate_limited": self.rate_limited,
+            "upstream_errors": self.upstream_errors,
+            "cached_users": len(self._entries)
+        }
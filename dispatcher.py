@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import random
+from collections import OrderedDict, deque
+import discord
+from broadcast import RateLimiter
+
+# 所有對 Discord 的「動作」(自動處置、日誌、私訊、公告) 統一由此排程
+# - 優先順序：moderation > log > dm > broadcast，空閒的 worker 永遠先取高優先的工作
+# - 同一優先順序內依伺服器輪流取出，單一伺服器的大量工作不會卡住其他伺服器
+# - 低優先 (dm / broadcast) 最多只佔用一半 worker；moderation 以外的工作受全域速率閘門限制，
+#   且至少保留一個 worker 給 moderation (log 等在閘門暫停期間佔滿 worker 時，自動處置仍可立即執行)
+# - 429 / 5xx 以退避重試 (次數有上限)，最終結果依類別計數，失敗時把原本的例外拋回呼叫端
+
+PRIORITIES = ("moderation", "log", "dm", "broadcast")
+LOW_PRIORITY = ("dm", "broadcast")
+OUTCOMES = ("ok", "forbidden", "not_found", "failed", "retried")
+
+class ActionDispatcher:
+    def __init__(self, workers: int = 8, rate: float = 40, max_retries: int = 3):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.low_priority_slots = max(1, workers // 2)
+        # moderation 以外的工作最多可用的 worker 數 (保留一個給 moderation)
+        self.shared_slots = max(1, workers - 1)
+        self.limiter = RateLimiter(rate)
+        self._queues = {p: OrderedDict() for p in PRIORITIES}   # 優先順序 -> {guild_id: deque[job]}
+        self._running = {p: 0 for p in PRIORITIES}
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._timers = {}   # 重試計時 task -> job
+        self.counters = {p: {"submitted": 0, **{o: 0 for o in OUTCOMES}} for p in PRIORITIES}
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """停止 worker；尚未執行或等待重試的工作取消，呼叫端不會永遠等待"""
+        pending = list(self._timers.values())
+        for task in self._tasks + list(self._timers):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._timers, return_exceptions=True)
+        self._tasks = []
+        self._timers.clear()
+        for queues in self._queues.values():
+            for jobs in queues.values():
+                pending.extend(jobs)
+            queues.clear()
+        for job in pending:
+            job['future'].cancel()
+
+    async def submit(self, priority: str, guild_id, factory, max_retries: int = None):
+        """
+        排入一個動作並等待結果；factory 為回傳 coroutine 的函式 (重試時會重新呼叫)
+        guild_id 用於公平排程，不屬於任何伺服器的動作 (例如私訊) 傳 None
+        max_retries 為 0 時不重試 (呼叫端自行處理)
+        """
+        if priority not in self._queues:
+            raise ValueError(f"未知的優先類別：{priority}")
+        if not self._tasks:
+            # 尚未啟動 (例如啟動過程中) 直接執行
+            return await factory()
+        job = {
+            "priority": priority,
+            "guild_id": guild_id,
+            "factory": factory,
+            "attempts": 0,
+            "max_retries": self.max_retries if max_retries is None else max_retries,
+            "future": asyncio.get_running_loop().create_future()
+        }
+        self.counters[priority]["submitted"] += 1
+        self._push(job)
+        return await job['future']
+
+    def queue_depth(self) -> dict:
+        return {p: sum(len(jobs) for jobs in q.values()) for p, q in self._queues.items()}
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "running": dict(self._running),
+            "waiting_retry": len(self._timers),
+            "outcomes": self.counters
+        }
+
+    def _push(self, job):
+        self._queues[job['priority']].setdefault(job['guild_id'], deque()).append(job)
+        self._wakeup.set()
+
+    def _pop(self):
+        """取出下一個工作：優先順序高者先，同類別內各伺服器輪流"""
+        shared_running = sum(n for p, n in self._running.items() if p != "moderation")
+        for priority in PRIORITIES:
+            if priority != "moderation" and shared_running >= self.shared_slots:
+                continue
+            if priority in LOW_PRIORITY and sum(self._running[p] for p in LOW_PRIORITY) >= self.low_priority_slots:
+                continue
+            queues = self._queues[priority]
+            if not queues:
+                continue
+            guild_id, jobs = next(iter(queues.items()))
+            job = jobs.popleft()
+            del queues[guild_id]
+            if jobs:
+                queues[guild_id] = jobs   # 還有工作的伺服器排到最後
+            return job
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._pop()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            priority = job['priority']
+            self._running[priority] += 1
+            try:
+                await self._run(job)
+            finally:
+                self._running[priority] -= 1
+                if not job['future'].done() and job not in self._timers.values():
+                    job['future'].cancel()   # worker 被取消 (關機) 時不讓呼叫端永遠等待
+                # 低優先 / 共用名額釋出後，可能有其他 worker 在等待
+                self._wakeup.set()
+
+    async def _run(self, job):
+        priority = job['priority']
+        counters = self.counters[priority]
+        if priority != "moderation":
+            await self.limiter.acquire()
+        job['attempts'] += 1
+        try:
+            result = await job['factory']()
+        except discord.Forbidden as e:
+            counters["forbidden"] += 1
+            return self._fail(job, e)
+        except discord.NotFound as e:
+            counters["not_found"] += 1
+            return self._fail(job, e)
+        except discord.RateLimited as e:
+            if not self._retry(job, e.retry_after):
+                return self._fail(job, e, final=True)
+        except discord.HTTPException as e:
+            if (e.status != 429 and e.status < 500) or not self._retry(job, None):
+                return self._fail(job, e, final=True)
+        except Exception as e:
+            return self._fail(job, e, final=True)
+        else:
+            counters["ok"] += 1
+            if not job['future'].done():
+                job['future'].set_result(result)
+
+    def _retry(self, job, retry_after):
+        if job['attempts'] > job['max_retries']:
+            return False
+        self.counters[job['priority']]["retried"] += 1
+        if retry_after:
+            self.limiter.pause(retry_after)
+        delay = retry_after or min(30, 2 ** job['attempts']) + random.random()
+        timer = asyncio.create_task(self._requeue_later(job, delay))
+        self._timers[timer] = job
+        timer.add_done_callback(lambda t: self._timers.pop(t, None))
+        return True
+
+    async def _requeue_later(self, job, delay):
+        await asyncio.sleep(delay)
+        self._push(job)
+
+    def _fail(self, job, error, final: bool = False):
+        if final:
+            self.counters[job['priority']]["failed"] += 1
+            logging.warning(f"Discord 動作失敗 ({job['priority']}, 伺服器 {job['guild_id']}, 嘗試 {job['attempts']} 次): {error}")
+        if not job['future'].done():
+            job['future'].set_exception(error)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import time
+from rule_index import RuleIndex
+
+# 伺服器設定與自動化規則以單一陳述式取得 (規則彙整成 jsonb 陣列)
+# 其他頁面載入器可在 SETTINGS_FROM 後面再 JOIN 自己需要的資料，維持一次往返
+SETTINGS_COLUMNS = """
+    g.admin_list, g.offset_enabled, g.log_channel_id,
+    COALESCE((
+        SELECT jsonb_agg(jsonb_build_object(
+                   'id', a.id, 'type', a.type, 'threshold', a.threshold, 'action_type', a.action_type,
+                   'timeout_duration', a.timeout_duration, 'role_id', a.role_id,
+                   'window_days', a.window_days, 'half_life_days', a.half_life_days
+               ) ORDER BY a.type, a.threshold)
+        FROM auto_actions a WHERE a.guild_id = k.guild_id
+    ), '[]'::jsonb) AS rules
+"""
+SETTINGS_FROM = "(SELECT $1::BIGINT AS guild_id) k LEFT JOIN guilds g ON g.guild_id = k.guild_id"
+
+def settings_from_row(row) -> dict:
+    """把包含 SETTINGS_COLUMNS 的查詢結果轉成快取使用的設定 dict"""
+    rules = row['rules']
+    if isinstance(rules, str):
+        rules = json.loads(rules)
+    return {
+        "admin_list": list(row['admin_list'] or []),
+        "offset_enabled": bool(row['offset_enabled']),
+        "log_channel_id": row['log_channel_id'],
+        "rules": rules,
+        # 依類型預先排序的門檻索引，供自動化處置以 bisect 查詢
+        "rule_index": RuleIndex(rules)
+    }
+
+class GuildSettingsCache:
+    """
+    伺服器設定快取 (bot 與網頁端共用)
+    快取內容：admin_list、offset_enabled、log_channel_id、auto_actions 規則與編譯後的 rule_index
+    任何寫入路徑都必須呼叫 invalidate()，TTL 只是最後防線
+    """
+    def __init__(self, db_pool, ttl: float = 300):
+        self.db_pool = db_pool
+        self.ttl = ttl
+        self._entries = {}   # guild_id -> (expires_at, settings)
+        self._loading = {}   # guild_id -> Future，避免同一伺服器同時重複查詢
+        self._versions = {}  # guild_id -> 失效次數，防止載入途中被寫入的舊資料回填快取
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, guild_id: int, count: bool = False):
+        """
+        只讀快取，不查詢資料庫 (未命中或過期時回傳 None)
+        count=True 時計入命中率統計，供自行載入資料的頁面載入器使用
+        """
+        entry = self._entries.get(guild_id)
+        if entry and entry[0] > time.monotonic():
+            if count: self.hits += 1
+            return entry[1]
+        if count: self.misses += 1
+        return None
+
+    def version(self, guild_id: int) -> int:
+        """目前的失效版本，於自行查詢前取得，再交給 store()"""
+        return self._versions.get(guild_id, 0)
+
+    def store(self, guild_id: int, settings: dict, version: int):
+        """回填外部查詢到的設定；查詢途中若已被 invalidate() 則捨棄"""
+        if self._versions.get(guild_id, 0) == version:
+            self._entries[guild_id] = (time.monotonic() + self.ttl, settings)
+
+    async def get(self, guild_id: int, conn=None) -> dict:
+        """conn：呼叫端已持有的連線，未命中時直接沿用，不另外向連線池取用"""
+        entry = self._entries.get(guild_id)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        pending = self._loading.get(guild_id)
+        if pending:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # 負責載入的請求被取消 (用戶端中斷 / 逾時)，改由自己重新載入
+                return await self.get(guild_id, conn)
+
+        version = self.version(guild_id)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[guild_id] = future
+        try:
+            settings = await self._load(guild_id, conn)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 避免沒有等待者時出現未取用例外的警告
+            raise
+        except BaseException:
+            # 被取消時也要喚醒等待中的呼叫端，否則它們會永遠等待
+            future.cancel()
+            raise
+        finally:
+            if self._loading.get(guild_id) is future:
+                del self._loading[guild_id]
+
+        self.store(guild_id, settings, version)
+        future.set_result(settings)
+        return settings
+
+    async def _load(self, guild_id: int, conn=None) -> dict:
+        if conn is None:
+            async with self.db_pool.acquire() as conn:
+                return await self._load(guild_id, conn)
+
+        row = await conn.fetchrow(f"SELECT {SETTINGS_COLUMNS} FROM {SETTINGS_FROM}", guild_id)
+        return settings_from_row(row)
+
+    def invalidate(self, guild_id: int):
+        """寫入設定後呼叫，下一次讀取會重新查詢資料庫"""
+        self._entries.pop(guild_id, None)
+        self._loading.pop(guild_id, None)
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "cached_guilds": len(self._entries)
+        }
@@ -0,0 +1,135 @@
+import math
+import time
+
+# 各伺服器統計 (真人 / 機器人數、管理員、頻道) 的增量維護
+# 由 commands/stats.py 在 on_ready 建立，之後只依 gateway 事件調整，
+# 開發者儀表板與 /server_info 直接讀取快照，不必在請求中掃描所有成員
+
+class GuildStats:
+    def __init__(self, guild):
+        self.bot_count = 0
+        self.admin_role_ids = set()   # 具有 administrator 權限的身分組
+        self.admin_ids = set()        # 具有 administrator 權限的真人成員 (含擁有者)
+        self.text_channels = []
+        self.voice_channels = []
+        self.rebuild(guild)
+
+    def rebuild(self, guild):
+        self.bot_count = sum(1 for m in guild.members if m.bot)
+        self.rebuild_admins(guild)
+        self.rebuild_channels(guild)
+
+    def rebuild_admins(self, guild):
+        """身分組權限或擁有者變動時重算 (事件少見，允許掃描成員)"""
+        self.admin_role_ids = {r.id for r in guild.roles if r.permissions.administrator}
+        self.admin_ids = {m.id for m in guild.members if self.is_admin(guild, m)}
+
+    def rebuild_channels(self, guild):
+        self.text_channels = [c.name for c in guild.text_channels]
+        self.voice_channels = [c.name for c in guild.voice_channels]
+
+    def is_admin(self, guild, member) -> bool:
+        if member.bot:
+            return False
+        return member.id == guild.owner_id or any(r.id in self.admin_role_ids for r in member.roles)
+
+    def member_added(self, guild, member):
+        if member.bot:
+            self.bot_count += 1
+        if self.is_admin(guild, member):
+            self.admin_ids.add(member.id)
+
+    def member_removed(self, member):
+        if member.bot:
+            self.bot_count = max(0, self.bot_count - 1)
+        self.admin_ids.discard(member.id)
+
+    def member_updated(self, guild, member):
+        if self.is_admin(guild, member):
+            self.admin_ids.add(member.id)
+        else:
+            self.admin_ids.discard(member.id)
+
+class GuildStatsTracker:
+    def __init__(self):
+        self._guilds = {}   # guild_id -> GuildStats
+
+    def build(self, guild):
+        self._guilds[guild.id] = GuildStats(guild)
+
+    def drop(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def get(self, guild):
+        """取得統計；尚未建立 (例如剛啟動) 時當場建立"""
+        stats = self._guilds.get(guild.id)
+        if stats is None:
+            stats = self._guilds[guild.id] = GuildStats(guild)
+        return stats
+
+    def peek(self, guild_id: int):
+        return self._guilds.get(guild_id)
+
+    def snapshot(self, guild) -> dict:
+        """儀表板使用的伺服器資料 (管理員只解析名稱，不掃描成員)"""
+        stats = self.get(guild)
+        admins = [m.display_name for m in map(guild.get_member, stats.admin_ids) if m]
+        return {
+            "name": guild.name,
+            "id": guild.id,
+            "owner": f"{guild.owner} ({guild.owner_id})",
+            "member_count": guild.member_count,
+            "bot_count": stats.bot_count,
+            "human_count": guild.member_count - stats.bot_count,
+            "admins": admins,
+            "channels": {
+                "text": stats.text_channels,
+                "voice": stats.voice_channels
+            },
+            "created_at": guild.created_at.strftime('%Y-%m-%d')
+        }
+
+class GuildDirectory:
+    """
+    依成員數排序的伺服器清單 (/server_info 分頁共用)
+    清單只存 (id, 名稱, 成員數)，超過 ttl 秒或伺服器加入 / 離開時才重新排序；
+    搜尋結果依關鍵字暫存到下一次重建為止
+    """
+    def __init__(self, bot, ttl: float = 300):
+        self.bot = bot
+        self.ttl = ttl
+        self._entries = []
+        self._searches = {}
+        self._built_at = None
+        self.rebuilds = 0
+
+    def invalidate(self):
+        self._built_at = None
+
+    def entries(self, query: str = None):
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at > self.ttl:
+            self._entries = sorted(
+                ((g.id, g.name, g.member_count or 0) for g in self.bot.guilds),
+                key=lambda e: e[2], reverse=True
+            )
+            self._searches = {}
+            self._built_at = now
+            self.rebuilds += 1
+        if not query:
+            return self._entries
+
+        query = query.casefold().strip()
+        if query not in self._searches:
+            if len(self._searches) > 64:
+                self._searches.clear()
+            self._searches[query] = [e for e in self._entries if query in e[1].casefold() or query in str(e[0])]
+        return self._searches[query]
+
+    def page(self, page: int, per_page: int, query: str = None):
+        """回傳 (該頁項目, 修正後的頁碼, 總頁數, 符合數量)"""
+        entries = self.entries(query)
+        total_pages = max(1, math.ceil(len(entries) / per_page))
+        page = min(max(0, page), total_pages - 1)
+        start = page * per_page
+        return entries[start:start + per_page], page, total_pages, len(entries)
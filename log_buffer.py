@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from collections import deque
+import discord
+
+# 日誌頻道的合併發送
+# 同一伺服器在 window 秒內的日誌 Embed 合併成一則訊息 (每則最多 10 個 Embed、總長 6000 字元)，
+# 每個伺服器只有一個發送 task，依加入順序送出；關機時立即送出剩餘的日誌
+
+MAX_EMBEDS = 10
+MAX_TOTAL_CHARS = 6000
+
+class LogBuffer:
+    def __init__(self, bot, window: float = 1.5):
+        self.bot = bot
+        self.window = window
+        self._pending = {}    # guild_id -> deque[(enqueued_at, embed, future 或 None)]
+        self._flushers = {}   # guild_id -> 發送 task
+        self._closing = False
+        self.messages_sent = 0
+        self.embeds_sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def submit(self, guild_id: int, embed: discord.Embed, wait: bool = False):
+        """
+        加入日誌；wait=True 時回傳 future，送出後完成 (發送失敗則帶有例外)
+        沒有設定日誌頻道或頻道已不存在時直接略過
+        """
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self._pending.setdefault(guild_id, deque()).append((time.monotonic(), embed, future))
+        if guild_id not in self._flushers:
+            self._flushers[guild_id] = asyncio.create_task(self._flush_guild(guild_id))
+        return future
+
+    async def close(self, timeout: float = 10):
+        """關機：不再等待合併視窗，送出所有剩餘日誌"""
+        self._closing = True
+        tasks = list(self._flushers.values())
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logging.warning(f"日誌緩衝關閉逾時，{self.queue_depth()} 則日誌未送出")
+            for task in pending:
+                task.cancel()
+
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    async def _flush_guild(self, guild_id: int):
+        try:
+            while self._pending.get(guild_id):
+                if not self._closing:
+                    await asyncio.sleep(self.window)
+                await self._send_batch(guild_id, self._take_batch(guild_id))
+        finally:
+            self._flushers.pop(guild_id, None)
+            if not self._pending.get(guild_id):
+                self._pending.pop(guild_id, None)
+
+    def _take_batch(self, guild_id: int):
+        queue = self._pending[guild_id]
+        batch, chars = [], 0
+        while queue and len(batch) < MAX_EMBEDS:
+            size = len(queue[0][1])
+            if batch and chars + size > MAX_TOTAL_CHARS:
+                break
+            batch.append(queue.popleft())
+            chars += size
+        return batch
+
+    async def _send_batch(self, guild_id: int, batch):
+        error = None
+        try:
+            channel = await self._channel(guild_id)
+            if channel is None:
+                self.dropped += len(batch)
+            else:
+                embeds = [embed for _, embed, _ in batch]
+                await self.bot.dispatcher.submit("log", guild_id, lambda: channel.send(embeds=embeds))
+                now = time.monotonic()
+                self.messages_sent += 1
+                self.embeds_sent += len(batch)
+                for enqueued_at, _, _ in batch:
+                    self.latency_total += now - enqueued_at
+                    self.latency_max = max(self.latency_max, now - enqueued_at)
+        except discord.Forbidden:
+            # 沒有發送權限視為略過 (與原本的行為一致)
+            self.dropped += len(batch)
+        except Exception as e:
+            error = e
+            self.failed += len(batch)
+            logging.warning(f"伺服器 {guild_id} 日誌發送失敗 ({len(batch)} 則): {e}")
+
+        for _, _, future in batch:
+            if future is None or future.done():
+                continue
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+    async def _channel(self, guild_id: int):
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return None
+        # 每批只讀一次設定 (合併前是每則日誌讀一次)
+        channel_id = (await self.bot.guild_cache.get(guild_id))['log_channel_id']
+        return guild.get_channel(channel_id) if channel_id else None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "active_guilds": len(self._flushers),
+            "messages_sent": self.messages_sent,
+            "embeds_sent": self.embeds_sent,
+            "embeds_per_message": round(self.embeds_sent / self.messages_sent, 2) if self.messages_sent else 0.0,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "avg_flush_latency_ms": round(self.latency_total / self.embeds_sent * 1000, 1) if self.embeds_sent else 0.0,
+            "max_flush_latency_ms": round(self.latency_max * 1000, 1),
+            "window_seconds": self.window
+        }
@@ -0,0 +1,162 @@
+import bisect
+from discord import app_commands
+
+from member_table import match_members
+
+# 各伺服器成員名稱的搜尋索引 (網頁成員列表與斜線指令自動完成共用)
+# 由 commands/members.py 在 on_ready 建立，並依 on_member_join / remove / update 增量維護
+# - 前綴：每個名稱 (顯示名稱、使用者名稱) 存進排序好的 (名稱, user_id) 陣列，以 bisect 查詢
+# - 子字串：名稱的雙字元組 (bigram) 對應到成員集合，查詢時取交集後再驗證
+#   中文名稱多半只有兩三個字，以 bigram 取代 trigram 才能涵蓋兩個字的關鍵字；單一字元則直接掃描名稱表
+
+def _keys(member):
+    return tuple(dict.fromkeys(k.casefold() for k in (member.display_name, member.name) if k))
+
+def _grams(text: str):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+class GuildNameIndex:
+    def __init__(self):
+        self._names = {}     # user_id -> 名稱 key tuple
+        self._sorted = []    # [(name_key, user_id)]
+        self._grams = {}     # bigram -> {user_id}
+
+    def __len__(self):
+        return len(self._names)
+
+    @classmethod
+    def from_members(cls, members):
+        """一次建立整個伺服器的索引 (最後才排序，避免逐筆 insort 的 O(n^2) 搬移)"""
+        index = cls()
+        for member in members:
+            keys = _keys(member)
+            index._names[member.id] = keys
+            for key in keys:
+                index._sorted.append((key, member.id))
+                for gram in _grams(key):
+                    index._grams.setdefault(gram, set()).add(member.id)
+        index._sorted.sort()
+        return index
+
+    def add(self, member):
+        if member.id in self._names:
+            self.remove(member.id)
+        keys = _keys(member)
+        self._names[member.id] = keys
+        for key in keys:
+            bisect.insort(self._sorted, (key, member.id))
+            for gram in _grams(key):
+                self._grams.setdefault(gram, set()).add(member.id)
+
+    def remove(self, user_id: int):
+        keys = self._names.pop(user_id, None)
+        if not keys:
+            return
+        for key in keys:
+            i = bisect.bisect_left(self._sorted, (key, user_id))
+            if i < len(self._sorted) and self._sorted[i] == (key, user_id):
+                del self._sorted[i]
+            for gram in _grams(key):
+                members = self._grams.get(gram)
+                if members:
+                    members.discard(user_id)
+                    if not members:
+                        del self._grams[gram]
+
+    def prefix(self, q: str, limit: int = None):
+        """名稱以 q 開頭的成員 (依名稱排序)"""
+        result = {}
+        i = bisect.bisect_left(self._sorted, (q,))
+        while i < len(self._sorted) and self._sorted[i][0].startswith(q):
+            result.setdefault(self._sorted[i][1])
+            if limit and len(result) >= limit:
+                break
+            i += 1
+        return list(result)
+
+    def search(self, q: str, limit: int = None):
+        """前綴相符的成員排在前面，其次為名稱包含 q 的成員；回傳 user_id 列表"""
+        q = (q or "").casefold().strip()
+        if not q:
+            return []
+        result = dict.fromkeys(self.prefix(q, limit))
+        if q.isdigit() and int(q) in self._names:
+            result.setdefault(int(q))
+        if not (limit and len(result) >= limit):
+            if len(q) >= 2:
+                postings = sorted((self._grams.get(g, set()) for g in _grams(q)), key=len)
+                candidates = sorted(set.intersection(*postings)) if postings[0] else []
+            else:
+                candidates = self._names
+            for uid in candidates:
+                if uid not in result and any(q in key for key in self._names[uid]):
+                    result.setdefault(uid)
+                    if limit and len(result) >= limit:
+                        break
+        ids = list(result)
+        return ids[:limit] if limit else ids
+
+class MemberNameIndex:
+    """所有伺服器的名稱索引；尚未建立索引的伺服器 search() 回傳 None，呼叫端應改用掃描"""
+    def __init__(self):
+        self._guilds = {}   # guild_id -> GuildNameIndex
+        self.queries = 0
+        self.updates = 0
+
+    def build(self, guild):
+        self._guilds[guild.id] = GuildNameIndex.from_members(guild.members)
+
+    def drop(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def add(self, member):
+        index = self._guilds.get(member.guild.id)
+        if index is not None:
+            index.add(member)
+            self.updates += 1
+
+    def remove(self, guild_id: int, user_id: int):
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            index.remove(user_id)
+            self.updates += 1
+
+    def search(self, guild_id: int, q: str, limit: int = None):
+        index = self._guilds.get(guild_id)
+        if index is None:
+            return None
+        self.queries += 1
+        return index.search(q, limit)
+
+    def search_members(self, guild, q: str, limit: int = None):
+        """回傳 discord.Member 列表；沒有索引時退回逐一比對名稱"""
+        ids = self.search(guild.id, q, limit)
+        if ids is None:
+            members = match_members(guild.members, q)
+            return members[:limit] if limit else members
+        return [m for m in map(guild.get_member, ids) if m]
+
+    def stats(self) -> dict:
+        return {
+            "indexed_guilds": len(self._guilds),
+            "indexed_members": sum(len(i) for i in self._guilds.values()),
+            "queries": self.queries,
+            "updates": self.updates
+        }
+
+async def member_autocomplete(interaction, current: str):
+    """
+    斜線指令自動完成：以名稱索引搜尋目前伺服器的成員，選項值為 user_id 字串
+    參數為以空白分隔的成員列表時 (如 /bulk_record members)，只搜尋最後一段，選項值保留前面已輸入的內容
+    選項值超過 100 字元的上限時不提供選項 (仍可直接輸入 @成員 或 ID)
+    """
+    prefix, _, query = current.rpartition(" ")
+    if not interaction.guild or not query:
+        return []
+    members = interaction.client.member_index.search_members(interaction.guild, query, limit=25)
+    prefix = f"{prefix} " if prefix else ""
+    return [
+        app_commands.Choice(name=f"{m.display_name} ({m.name})"[:100], value=f"{prefix}{m.id}")
+        for m in members
+        if len(prefix) + len(str(m.id)) <= 100
+    ]
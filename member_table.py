@@ -0,0 +1,104 @@
+import heapq
+from itertools import chain, islice
+
+# 成員管理頁面的伺服器端分頁 / 排序 / 搜尋
+# 只為目前這一頁的成員查詢獎懲統計，頁面大小固定，與伺服器人數無關
+
+PAGE_SIZE = 50
+SORTS = {
+    "role": "身分",
+    "warnings": "累積警告",
+    "commends": "累積嘉獎",
+    "name": "名稱"
+}
+
+def match_members(members, q: str):
+    """名稱 (顯示名稱 / 使用者名稱) 或 ID 包含關鍵字的成員"""
+    q = q.casefold()
+    return [
+        m for m in members
+        if q in m.display_name.casefold() or q in m.name.casefold() or q in str(m.id)
+    ]
+
+async def _ranked_ids(conn, guild_id: int, column: str):
+    """依點數由高到低排列、點數大於 0 的成員 ID (column 只接受 warnings / commends)"""
+    return await conn.fetchval(
+        f"""
+        SELECT array_agg(user_id ORDER BY {column} DESC, user_id)
+        FROM member_totals WHERE guild_id = $1 AND {column} > 0
+        """,
+        guild_id
+    ) or []
+
+async def load_member_page(conn, guild, settings: dict, *, viewer_is_owner: bool, sort: str = "role", q: str = None, page: int = 1, page_size: int = PAGE_SIZE, members=None) -> dict:
+    """
+    回傳單頁成員資料 dict：rows / page / pages / total / sort / q
+    settings 為 GuildSettingsCache 的設定；有 q 時 members 可傳入 member_index 的搜尋結果，未傳入則逐一比對
+    """
+    sort = sort if sort in SORTS else "role"
+    page = max(1, page)
+    admin_ids = set(settings['admin_list'])
+    offset = (page - 1) * page_size
+
+    if members is None:
+        members = match_members(guild.members, q) if q else guild.members
+    total = len(members)
+
+    def role_order():
+        # 擁有者、管理員置頂，其餘維持快取順序；不需排序整個成員列表
+        if q:
+            pinned = [m for m in members if m.id == guild.owner_id or m.id in admin_ids]
+        else:
+            pinned_ids = dict.fromkeys([guild.owner_id, *settings['admin_list']])
+            pinned = [m for m in (guild.get_member(uid) for uid in pinned_ids) if m]
+        pinned.sort(key=lambda m: m.id != guild.owner_id)
+        pinned_ids = {m.id for m in pinned}
+        return chain(pinned, (m for m in members if m.id not in pinned_ids))
+
+    if sort == "name":
+        page_members = heapq.nsmallest(offset + page_size, members, key=lambda m: m.display_name.casefold())[offset:]
+    elif sort in ("warnings", "commends"):
+        ranked_ids = await _ranked_ids(conn, guild.id, sort)
+        if q:
+            allowed = {m.id for m in members}
+            ranked_ids = [uid for uid in ranked_ids if uid in allowed]
+        ranked = [m for m in (guild.get_member(uid) for uid in ranked_ids) if m]
+        ranked_set = {m.id for m in ranked}
+        ordered = chain(ranked, (m for m in role_order() if m.id not in ranked_set))
+        page_members = list(islice(ordered, offset, offset + page_size))
+    else:
+        page_members = list(islice(role_order(), offset, offset + page_size))
+
+    totals = {}
+    if page_members:
+        rows = await conn.fetch(
+            "SELECT user_id, warnings, commends FROM member_totals WHERE guild_id = $1 AND user_id = ANY($2::BIGINT[])",
+            guild.id, [m.id for m in page_members]
+        )
+        totals = {r['user_id']: r for r in rows}
+
+    result_rows = []
+    for m in page_members:
+        t = totals.get(m.id)
+        is_owner = m.id == guild.owner_id
+        is_admin = m.id in admin_ids
+        result_rows.append({
+            "id": str(m.id),
+            "name": m.display_name,
+            "avatar": m.display_avatar.url,
+            "is_owner": is_owner,
+            "is_admin": is_admin,
+            "warning_points": t['warnings'] if t else 0,
+            "commend_points": t['commends'] if t else 0,
+            # 擁有者可管理所有人，管理員不能對擁有者 / 管理員執行獎懲
+            "can_moderate": viewer_is_owner or not (is_owner or is_admin)
+        })
+
+    return {
+        "rows": result_rows,
+        "page": page,
+        "pages": max(1, -(-total // page_size)),
+        "total": total,
+        "sort": sort,
+        "q": q or ""
+    }
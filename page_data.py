@@ -0,0 +1,40 @@
+from guild_cache import SETTINGS_COLUMNS, SETTINGS_FROM, settings_from_row
+
+# 網頁頁面的資料載入器 (成員管理頁面的分頁資料見 member_table.py)
+# 設定快取命中時只查頁面本身需要的累計資料；未命中時把設定、規則與累計資料合併成一個陳述式，
+# 每個頁面最多一次資料庫往返，並順便回填設定快取
+
+async def _load(conn, guild_cache, guild_id: int, extra_columns: str, extra_join: str, extra_query: str, *args):
+    """回傳 (settings, row)；row 只包含 extra_columns / extra_query 的欄位"""
+    settings = guild_cache.peek(guild_id, count=True)
+    if settings is not None:
+        return settings, await conn.fetchrow(extra_query, guild_id, *args)
+
+    version = guild_cache.version(guild_id)
+    row = await conn.fetchrow(
+        f"SELECT {SETTINGS_COLUMNS}, {extra_columns} FROM {SETTINGS_FROM} {extra_join}",
+        guild_id, *args
+    )
+    settings = settings_from_row(row)
+    guild_cache.store(guild_id, settings, version)
+    return settings, row
+
+MEMBER_TOTALS = "SELECT warnings, commends FROM member_totals WHERE guild_id = $1 AND user_id = $2"
+
+async def load_my_status_data(conn, guild_cache, guild_id: int, user_id: int):
+    """
+    個人信用頁面：回傳 (settings, stats)
+    stats 為 {"warning_points": n, "commend_points": n}，沒有紀錄時為 0
+    """
+    settings, row = await _load(
+        conn, guild_cache, guild_id,
+        "t.warnings, t.commends",
+        f"LEFT JOIN LATERAL ({MEMBER_TOTALS}) t ON true",
+        MEMBER_TOTALS,
+        user_id
+    )
+    stats = {
+        "warning_points": row['warnings'] or 0 if row else 0,
+        "commend_points": row['commends'] or 0 if row else 0
+    }
+    return settings, stats
@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+
+# 獎懲紀錄匯出 (CSV / NDJSON)
+# 以 asyncpg 伺服器端游標逐批讀取，每累積 CHUNK_ROWS 筆就輸出一段，記憶體用量與紀錄總數無關
+# 加入 created_at 欄位前的舊紀錄時間為 NULL：排在最後 (與索引順序一致)，輸出為空白 (CSV) / null (NDJSON)，指定時間範圍時不包含
+
+EXPORT_COLUMNS = ["created_at", "user_id", "user_name", "type", "count", "reason", "operator_id", "operator_name"]
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8"
+}
+CHUNK_ROWS = 500
+# 試算表會把以這些字元開頭的儲存格當成公式 (成員名稱與原因為使用者輸入)，CSV 輸出時加上 ' 前綴
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def build_export_query(guild_id: int, user_id: int = None, record_type: str = None, since=None, until=None):
+    """回傳 (sql, args)；since / until 為 datetime (until 不含)"""
+    conditions = ["guild_id = $1"]
+    args = [guild_id]
+    for column, op, value in (("user_id", "=", user_id), ("type", "=", record_type),
+                              ("created_at", ">=", since), ("created_at", "<", until)):
+        if value is not None:
+            args.append(value)
+            conditions.append(f"{column} {op} ${len(args)}")
+    sql = f"""
+        SELECT {", ".join(EXPORT_COLUMNS)}
+        FROM member_records
+        WHERE {" AND ".join(conditions)}
+        ORDER BY created_at, user_id
+    """
+    return sql, args
+
+def _timestamp(row):
+    return row['created_at'].isoformat() if row['created_at'] else None
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def _csv_chunk(rows, header: bool) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for r in rows:
+        writer.writerow([_timestamp(r) or ""] + [_csv_cell(r[c]) for c in EXPORT_COLUMNS[1:]])
+    return buf.getvalue()
+
+def _ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps({**dict(r), "created_at": _timestamp(r)}, ensure_ascii=False) + "\n"
+        for r in rows
+    )
+
+async def stream_records(db_pool, fmt: str, sql: str, args, prefetch: int = 1000):
+    """
+    非同步產生器：逐段輸出匯出內容 (bytes)，供 StreamingResponse 使用
+    連線在整個匯出期間保留 (游標必須在交易內)，用戶端中斷時產生器被關閉即釋放
+    """
+    if fmt == "csv":
+        # 加上 BOM，Excel 才會以 UTF-8 開啟中文內容
+        yield "\ufeff".encode("utf-8")
+    first = True
+    async with db_pool.acquire() as conn:
+        async with conn.transaction(readonly=True):
+            rows = []
+            async for row in conn.cursor(sql, *args, prefetch=prefetch):
+                rows.append(row)
+                if len(rows) >= CHUNK_ROWS:
+                    yield (_csv_chunk(rows, first) if fmt == "csv" else _ndjson_chunk(rows)).encode("utf-8")
+                    rows, first = [], False
+            if rows or (first and fmt == "csv"):
+                yield (_csv_chunk(rows, first) if fmt == "csv" else _ndjson_chunk(rows)).encode("utf-8")
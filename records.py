@@ -0,0 +1,136 @@
+# 成員獎懲紀錄的寫入與累計查詢
+# member_records 保存完整歷史，member_totals 保存每位成員的累計值供 O(1) 查詢
+
+async def add_member_record(conn, guild_id, user_id, user_name, record_type, count, reason, operator_id, operator_name):
+    """
+    寫入一筆獎懲紀錄並同步累加 member_totals (單一陳述式，兩者同時成功或失敗)
+    回傳更新後的 (warnings, commends)
+    """
+    row = await conn.fetchrow(
+        """
+        WITH rec AS (
+            INSERT INTO member_records
+            (guild_id, user_id, user_name, type, count, reason, operator_id, operator_name)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            RETURNING guild_id, user_id, type, count
+        )
+        INSERT INTO member_totals AS t (guild_id, user_id, warnings, commends)
+        SELECT guild_id, user_id,
+               CASE WHEN type = '警告' THEN count ELSE 0 END,
+               CASE WHEN type = '嘉獎' THEN count ELSE 0 END
+        FROM rec
+        ON CONFLICT (guild_id, user_id) DO UPDATE
+        SET warnings = t.warnings + EXCLUDED.warnings,
+            commends = t.commends + EXCLUDED.commends
+        RETURNING warnings, commends
+        """,
+        guild_id, user_id, user_name, record_type, count, reason, operator_id, operator_name
+    )
+    return row['warnings'], row['commends']
+
+async def add_member_records_bulk(conn, guild_id, members, record_type, count, reason, operator_id, operator_name):
+    """
+    批次寫入同一類型的獎懲紀錄 (members 為 [(user_id, user_name), ...])
+    所有紀錄與累計在同一個陳述式完成，回傳 {user_id: (warnings, commends)}
+    """
+    if not members:
+        return {}
+    rows = await conn.fetch(
+        """
+        WITH rec AS (
+            INSERT INTO member_records
+            (guild_id, user_id, user_name, type, count, reason, operator_id, operator_name)
+            SELECT $1, m.user_id, m.user_name, $4, $5, $6, $7, $8
+            FROM unnest($2::BIGINT[], $3::TEXT[]) AS m(user_id, user_name)
+            RETURNING user_id, type, count
+        )
+        INSERT INTO member_totals AS t (guild_id, user_id, warnings, commends)
+        SELECT $1, user_id,
+               SUM(CASE WHEN type = '警告' THEN count ELSE 0 END),
+               SUM(CASE WHEN type = '嘉獎' THEN count ELSE 0 END)
+        FROM rec
+        GROUP BY user_id
+        ON CONFLICT (guild_id, user_id) DO UPDATE
+        SET warnings = t.warnings + EXCLUDED.warnings,
+            commends = t.commends + EXCLUDED.commends
+        RETURNING user_id, warnings, commends
+        """,
+        guild_id, [m[0] for m in members], [m[1] for m in members],
+        record_type, count, reason, operator_id, operator_name
+    )
+    return {r['user_id']: (r['warnings'], r['commends']) for r in rows}
+
+async def get_member_totals(conn, guild_id, user_id):
+    """回傳 (warnings, commends)，沒有紀錄時為 (0, 0)"""
+    row = await conn.fetchrow(
+        "SELECT warnings, commends FROM member_totals WHERE guild_id = $1 AND user_id = $2",
+        guild_id, user_id
+    )
+    if not row:
+        return 0, 0
+    return row['warnings'], row['commends']
+
+# 只計算期間內紀錄 / 半衰期遞減的規則所用的加總：
+# 每種計數方式只掃描 cutoff 天內的紀錄 (有 window_days 用 window_days，否則取 8 個半衰期，權重已低於 0.4%)，
+# 由 member_records (guild_id, user_id, type, created_at) 索引範圍掃描，與歷史紀錄總量無關
+# created_at 為 NULL 的舊紀錄 (時間未知) 不計入任何期間
+WINDOWED_TOTALS_SQL = """
+    SELECT m.i, r.user_id,
+           COALESCE(SUM(r.count * x.weight) FILTER (WHERE r.type = '警告'), 0) AS warnings,
+           COALESCE(SUM(r.count * x.weight) FILTER (WHERE r.type = '嘉獎'), 0) AS commends
+    FROM unnest($3::INT[], $4::INT[]) WITH ORDINALITY AS m(window_days, half_life_days, i)
+    JOIN member_records r
+      ON r.guild_id = $1 AND r.user_id = ANY($2::BIGINT[]) AND r.type IN ('警告', '嘉獎')
+     AND r.created_at IS NOT NULL AND r.created_at >= now() - make_interval(days => COALESCE(m.window_days, m.half_life_days * 8))
+    CROSS JOIN LATERAL (
+        SELECT CASE WHEN m.half_life_days IS NULL THEN 1.0
+                    ELSE power(0.5, extract(epoch FROM now() - r.created_at) / (m.half_life_days * 86400.0))
+               END AS weight
+    ) x
+    GROUP BY m.i, r.user_id
+"""
+
+async def load_windowed_totals(conn, guild_id, user_ids, modes):
+    """
+    modes 為 [(window_days, half_life_days), ...]
+    回傳 {mode: {user_id: (warnings, commends)}}，期間內沒有紀錄的成員為 (0, 0)；遞減權重的結果為小數
+    """
+    if not modes or not user_ids:
+        return {}
+    rows = await conn.fetch(
+        WINDOWED_TOTALS_SQL, guild_id, list(user_ids),
+        [m[0] for m in modes], [m[1] for m in modes]
+    )
+    result = {mode: {uid: (0, 0) for uid in user_ids} for mode in modes}
+    for r in rows:
+        mode = modes[r['i'] - 1]
+        result[mode][r['user_id']] = (float(r['warnings']), float(r['commends']))
+    return result
+
+async def rebuild_member_totals(conn, guild_id=None):
+    """
+    由 member_records 重新計算 member_totals (回填或修復用)
+    guild_id 為 None 時重建全部伺服器，回傳重建後的成員筆數
+    """
+    async with conn.transaction():
+        # 鎖住累計表，避免重建期間新寫入的紀錄被覆蓋或重複計算
+        await conn.execute("LOCK TABLE member_totals IN EXCLUSIVE MODE")
+        if guild_id is None:
+            await conn.execute("DELETE FROM member_totals")
+        else:
+            await conn.execute("DELETE FROM member_totals WHERE guild_id = $1", guild_id)
+
+        status = await conn.execute(
+            """
+            INSERT INTO member_totals (guild_id, user_id, warnings, commends)
+            SELECT guild_id, user_id,
+                   COALESCE(SUM(CASE WHEN type = '警告' THEN count ELSE 0 END), 0),
+                   COALESCE(SUM(CASE WHEN type = '嘉獎' THEN count ELSE 0 END), 0)
+            FROM member_records
+            WHERE $1::BIGINT IS NULL OR guild_id = $1
+            GROUP BY guild_id, user_id
+            """,
+            guild_id
+        )
+    # asyncpg 回傳 "INSERT 0 <筆數>"
+    return int(status.split()[-1])
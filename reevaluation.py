@@ -0,0 +1,157 @@
+from datetime import datetime, timezone
+from rule_index import most_severe
+
+# 規則或抵銷模式變更後的整體重新評估
+# 一次 SQL 掃過伺服器的 member_totals (期間 / 遞減規則另掃描期間內的 member_records)，找出每位成員目前已達到的規則；
+# auto_action_fired 記錄每位成員已觸發過的規則，只有「新達到」的規則 (同類型、同計數方式中沒有更高或相同門檻觸發過) 才會處置，
+# 與 ModerationCog._match_rule 只在跨越門檻時觸發一次的語意一致；期間 / 遞減規則的觸發紀錄只在該期間內有效
+
+SATISFIED_CTE = """
+    WITH modes AS (
+        SELECT DISTINCT window_days, half_life_days FROM auto_actions
+        WHERE guild_id = $1 AND (window_days IS NOT NULL OR half_life_days IS NOT NULL)
+    ),
+    raw AS (
+        -- 計算全部紀錄的規則直接使用累計表
+        SELECT t.user_id, NULL::INT AS window_days, NULL::INT AS half_life_days,
+               t.warnings::FLOAT8 AS warnings, t.commends::FLOAT8 AS commends
+        FROM member_totals t WHERE t.guild_id = $1
+        UNION ALL
+        -- 期間 / 遞減規則只掃描 cutoff 天內的紀錄 (與 records.WINDOWED_TOTALS_SQL 相同的權重，時間未知的舊紀錄不計入)
+        SELECT r.user_id, m.window_days, m.half_life_days,
+               COALESCE(SUM(r.count * x.weight) FILTER (WHERE r.type = '警告'), 0),
+               COALESCE(SUM(r.count * x.weight) FILTER (WHERE r.type = '嘉獎'), 0)
+        FROM modes m
+        JOIN member_records r
+          ON r.guild_id = $1 AND r.type IN ('警告', '嘉獎')
+         AND r.created_at IS NOT NULL AND r.created_at >= now() - make_interval(days => COALESCE(m.window_days, m.half_life_days * 8))
+        CROSS JOIN LATERAL (
+            SELECT CASE WHEN m.half_life_days IS NULL THEN 1.0
+                        ELSE power(0.5, extract(epoch FROM now() - r.created_at) / (m.half_life_days * 86400.0))
+                   END AS weight
+        ) x
+        GROUP BY r.user_id, m.window_days, m.half_life_days
+    ),
+    counts AS (
+        SELECT raw.user_id, raw.window_days, raw.half_life_days, v.type, v.cnt
+        FROM raw
+        JOIN guilds g ON g.guild_id = $1
+        CROSS JOIN LATERAL (VALUES
+            ('警告', CASE WHEN g.offset_enabled THEN GREATEST(0, raw.warnings - raw.commends) ELSE raw.warnings END),
+            ('嘉獎', CASE WHEN g.offset_enabled THEN GREATEST(0, raw.commends - raw.warnings) ELSE raw.commends END)
+        ) AS v(type, cnt)
+    ),
+    satisfied AS (
+        SELECT c.user_id, c.cnt, a.id, a.type, a.threshold, a.action_type, a.timeout_duration, a.role_id,
+               a.window_days, a.half_life_days
+        FROM counts c
+        JOIN auto_actions a
+          ON a.guild_id = $1 AND a.type = c.type AND a.threshold <= c.cnt
+         AND a.window_days IS NOT DISTINCT FROM c.window_days
+         AND a.half_life_days IS NOT DISTINCT FROM c.half_life_days
+    )
+"""
+
+REEVALUATE_SQL = SATISFIED_CTE + """
+    SELECT DISTINCT ON (s.user_id, s.type, s.window_days, s.half_life_days) s.*
+    FROM satisfied s
+    WHERE NOT EXISTS (
+        -- 同類型、同計數方式已觸發過相同或更高門檻的規則 (仍在有效期間內) 就不再處置
+        SELECT 1 FROM auto_action_fired f
+        JOIN auto_actions fa ON fa.id = f.rule_id
+        WHERE f.guild_id = $1 AND f.user_id = s.user_id
+          AND fa.type = s.type AND fa.threshold >= s.threshold
+          AND fa.window_days IS NOT DISTINCT FROM s.window_days
+          AND fa.half_life_days IS NOT DISTINCT FROM s.half_life_days
+          AND (s.window_days IS NULL AND s.half_life_days IS NULL
+               OR f.fired_at >= now() - make_interval(days => COALESCE(s.window_days, s.half_life_days * 8)))
+    )
+    ORDER BY s.user_id, s.type, s.window_days, s.half_life_days, s.threshold DESC
+"""
+
+# 第一次建立 auto_action_fired 時，把目前已達到的規則視為已處置 (建立前的狀態無從得知，寧可不重複處置)
+BASELINE_SQL = SATISFIED_CTE + """
+    INSERT INTO auto_action_fired (guild_id, user_id, rule_id)
+    SELECT $1, user_id, id FROM satisfied
+    ON CONFLICT DO NOTHING
+"""
+
+# 觸發某條規則時，同類型、同計數方式中門檻較低的規則也一併記為已觸發 (跨越時已經過)
+MARK_FIRED_SQL = """
+    INSERT INTO auto_action_fired (guild_id, user_id, rule_id)
+    SELECT $1, u.user_id, a.id
+    FROM unnest($2::BIGINT[], $3::INT[]) AS u(user_id, rule_id)
+    JOIN auto_actions r ON r.id = u.rule_id AND r.guild_id = $1
+    JOIN auto_actions a
+      ON a.guild_id = $1 AND a.type = r.type AND a.threshold <= r.threshold
+     AND a.window_days IS NOT DISTINCT FROM r.window_days
+     AND a.half_life_days IS NOT DISTINCT FROM r.half_life_days
+    ON CONFLICT (guild_id, user_id, rule_id) DO UPDATE SET fired_at = now()
+"""
+
+async def load_reevaluation(conn, guild_id: int):
+    """[(user_id, 類型, 目前次數, 規則 dict), ...]；只含新達到的規則，同一成員同一類型在不同計數方式下可能各有一筆"""
+    rows = await conn.fetch(REEVALUATE_SQL, guild_id)
+    return [
+        (r['user_id'], r['type'], r['cnt'], {
+            "id": r['id'],
+            "type": r['type'],
+            "threshold": r['threshold'],
+            "action_type": r['action_type'],
+            "timeout_duration": r['timeout_duration'],
+            "role_id": r['role_id'],
+            "window_days": r['window_days'],
+            "half_life_days": r['half_life_days']
+        })
+        for r in rows
+    ]
+
+async def mark_fired(conn, guild_id: int, pairs):
+    """pairs 為 [(user_id, rule_id), ...]"""
+    if pairs:
+        await conn.execute(MARK_FIRED_SQL, guild_id, [p[0] for p in pairs], [p[1] for p in pairs])
+
+async def baseline_fired(conn) -> int:
+    """為所有伺服器建立觸發紀錄的起點 (呼叫端需在交易內執行並寫入完成標記)，回傳處理的伺服器數"""
+    guild_ids = [r['guild_id'] for r in await conn.fetch("SELECT guild_id FROM guilds")]
+    for guild_id in guild_ids:
+        await conn.execute(BASELINE_SQL, guild_id)
+    return len(guild_ids)
+
+def already_applied(guild, member, rule) -> bool:
+    """處置效果仍存在 (已有身分組 / 禁言中) 的成員不重複執行"""
+    if rule['action_type'] == 'add_role':
+        return any(r.id == rule['role_id'] for r in member.roles)
+    if rule['action_type'] == 'timeout':
+        until = member.timed_out_until
+        return until is not None and until > datetime.now(timezone.utc)
+    return False
+
+def plan_reevaluation(guild, rows):
+    """
+    回傳 (groups, applied)
+    groups：依規則分組 [(規則, [(member, 目前次數, 一併記為已觸發的規則 ID), ...]), ...]，依類型與門檻排序
+    applied：處置效果仍存在 (已有身分組 / 禁言中) 的 [(user_id, rule_id), ...]，不執行但記為已觸發
+    略過已離開的成員、機器人與擁有者
+    """
+    # 同一成員同一類型有多種計數方式命中時，與 _match_rule 一樣只執行最嚴重的處置
+    matched = {}
+    for user_id, record_type, count, rule in rows:
+        key = (user_id, record_type)
+        best, _, rule_ids = matched.get(key, (None, None, []))
+        rule_ids.append(rule['id'])
+        if best is None or most_severe([best, rule]) is rule:
+            matched[key] = (rule, count, rule_ids)
+        else:
+            matched[key] = (best, matched[key][1], rule_ids)
+
+    groups, applied = {}, []
+    for (user_id, _), (rule, count, rule_ids) in matched.items():
+        member = guild.get_member(user_id)
+        if member is None or member.bot or member.id == guild.owner_id:
+            continue
+        if already_applied(guild, member, rule):
+            applied.extend((user_id, rid) for rid in rule_ids)
+            continue
+        groups.setdefault(rule['id'], (rule, []))[1].append((member, count, rule_ids))
+    return sorted(groups.values(), key=lambda g: (g[0]['type'], g[0]['threshold'])), applied
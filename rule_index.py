@@ -0,0 +1,56 @@
+import bisect
+
+# 規則的計數方式：(window_days, half_life_days)
+# ALL_TIME 使用 member_totals 的累計值；其他方式只計算 window_days 天內的紀錄，
+# 或依 half_life_days 半衰期遞減權重 (由 records.load_windowed_totals 以索引查詢)
+ALL_TIME = (None, None)
+
+# 同一次變動在不同計數方式下各自跨越門檻時，執行最嚴重的處置
+ACTION_SEVERITY = {"add_role": 0, "timeout": 1, "kick": 2, "ban": 3}
+
+def rule_mode(rule) -> tuple:
+    return (rule.get('window_days'), rule.get('half_life_days'))
+
+def most_severe(rules):
+    return max(rules, key=lambda r: (ACTION_SEVERITY.get(r['action_type'], 0), r['threshold']), default=None)
+
+class RuleIndex:
+    """
+    伺服器自動化規則的預先編譯索引 (每種類型、每種計數方式一個依門檻排序的陣列)
+    隨設定快取一起建立，規則異動時設定快取被 invalidate，下次讀取即重新編譯
+    """
+    def __init__(self, rules):
+        self._thresholds = {}   # (type, mode) -> [threshold, ...] (遞增)
+        self._rules = {}        # (type, mode) -> [rule, ...] (與 _thresholds 對齊)
+        for rule in sorted(rules, key=lambda r: r['threshold']):
+            key = (rule['type'], rule_mode(rule))
+            self._thresholds.setdefault(key, []).append(rule['threshold'])
+            self._rules.setdefault(key, []).append(rule)
+
+    def modes(self, record_type: str):
+        """該類型規則用到的計數方式"""
+        return [mode for (t, mode) in self._rules if t == record_type]
+
+    def windowed_modes(self, record_type: str = None):
+        """需要查詢 member_records 的計數方式 (不含 ALL_TIME)，可只取某一類型"""
+        return sorted(
+            {mode for (t, mode) in self._rules if mode != ALL_TIME and record_type in (None, t)},
+            key=str
+        )
+
+    def highest(self, record_type: str, count, mode: tuple = ALL_TIME):
+        """count 已達到的最高門檻規則，沒有則回傳 None"""
+        thresholds = self._thresholds.get((record_type, mode))
+        if not thresholds:
+            return None
+        i = bisect.bisect_right(thresholds, count)
+        return self._rules[(record_type, mode)][i - 1] if i else None
+
+    def crossed(self, record_type: str, before, after, mode: tuple = ALL_TIME):
+        """這次變動新跨越的規則 (before < 門檻 <= after)，依門檻由小到大排列"""
+        thresholds = self._thresholds.get((record_type, mode))
+        if not thresholds or after <= before:
+            return []
+        lo = bisect.bisect_right(thresholds, before)
+        hi = bisect.bisect_right(thresholds, after)
+        return self._rules[(record_type, mode)][lo:hi]
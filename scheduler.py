@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+class JobScheduler:
+    """
+    以資料庫 scheduled_jobs 表保存的輕量排程器
+    記憶體中只保留 (執行時間, job_id) 的最小堆積，由單一計時迴圈等待最早的工作，
+    不會為每個工作各開一個 task，也不需要定期輪詢資料庫
+    """
+    def __init__(self, db_pool, claim_retry_delay: float = 30):
+        self.db_pool = db_pool
+        self.claim_retry_delay = claim_retry_delay
+        self.handlers = {}       # job_type -> async handler(payload)
+        self._heap = []          # [(run_at_timestamp, job_id)]
+        self._wakeup = asyncio.Event()
+        self._loop_task = None
+        self._running = set()
+
+    def register(self, job_type: str, handler):
+        """註冊工作類型對應的處理函式 (需為 async，參數為 payload dict)"""
+        self.handlers[job_type] = handler
+
+    async def start(self):
+        """啟動時載入所有尚未執行的工作 (包含停機期間已到期的)"""
+        async with self.db_pool.acquire() as conn:
+            # 上次停機時執行到一半的工作無法確定是否已送出，標記為中斷避免重複發送
+            await conn.execute(
+                "UPDATE scheduled_jobs SET status = 'failed', last_error = '執行中被中斷', finished_at = now() WHERE status = 'running'"
+            )
+            rows = await conn.fetch("SELECT id, run_at FROM scheduled_jobs WHERE status = 'pending'")
+
+        self._heap = [(r['run_at'].timestamp(), r['id']) for r in rows]
+        heapq.heapify(self._heap)
+        self._loop_task = asyncio.create_task(self._run())
+        logging.info(f"排程器已啟動，載入 {len(rows)} 個待執行工作")
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def schedule(self, job_type: str, run_at: datetime, payload: dict, created_by: int = None) -> int:
+        """新增排程工作，回傳 job_id (run_at 若沒有時區，視為本機時間)"""
+        if job_type not in self.handlers:
+            raise ValueError(f"未註冊的工作類型：{job_type}")
+        if run_at.tzinfo is None:
+            run_at = run_at.astimezone()
+
+        async with self.db_pool.acquire() as conn:
+            job_id = await conn.fetchval(
+                "INSERT INTO scheduled_jobs (job_type, payload, run_at, created_by) VALUES ($1, $2::jsonb, $3, $4) RETURNING id",
+                job_type, json.dumps(payload, ensure_ascii=False), run_at, created_by
+            )
+
+        heapq.heappush(self._heap, (run_at.timestamp(), job_id))
+        # 新工作比目前等待中的更早時，喚醒計時迴圈重新計算等待時間
+        if self._heap[0][1] == job_id:
+            self._wakeup.set()
+        return job_id
+
+    async def cancel(self, job_id: int) -> bool:
+        """取消尚未執行的工作；堆積中的項目會在到期時因狀態不符而被略過"""
+        async with self.db_pool.acquire() as conn:
+            status = await conn.execute(
+                "UPDATE scheduled_jobs SET status = 'cancelled', finished_at = now() WHERE id = $1 AND status = 'pending'",
+                job_id
+            )
+        return status.endswith(" 1")
+
+    async def list_jobs(self, status: str = 'pending', limit: int = 25):
+        async with self.db_pool.acquire() as conn:
+            return await conn.fetch(
+                "SELECT id, job_type, payload, run_at, status, created_by, last_error FROM scheduled_jobs WHERE status = $1 ORDER BY run_at ASC LIMIT $2",
+                status, limit
+            )
+
+    async def pending_count(self) -> int:
+        """以資料庫狀態計算 (已取消的工作會留在堆積中直到到期，不能直接以堆積大小計算)"""
+        async with self.db_pool.acquire() as conn:
+            return await conn.fetchval("SELECT count(*) FROM scheduled_jobs WHERE status = 'pending'")
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    # 最多睡一小時就重新檢查，避免系統時間調整造成長時間誤差
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, 3600))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, job_id = heapq.heappop(self._heap)
+            task = asyncio.create_task(self._execute(job_id))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, job_id: int):
+        try:
+            async with self.db_pool.acquire() as conn:
+                # 以狀態轉換取得執行權，已取消或已執行的工作會在這裡被略過
+                job = await conn.fetchrow(
+                    "UPDATE scheduled_jobs SET status = 'running' WHERE id = $1 AND status = 'pending' RETURNING job_type, payload",
+                    job_id
+                )
+        except Exception as e:
+            # 資料庫暫時無法使用：工作仍為 pending，稍後重新排入堆積
+            logging.error(f"排程工作 {job_id} 取得執行權失敗，{self.claim_retry_delay:.0f} 秒後重試: {e}")
+            heapq.heappush(self._heap, (time.time() + self.claim_retry_delay, job_id))
+            self._wakeup.set()
+            return
+        if not job:
+            return
+
+        error = None
+        try:
+            handler = self.handlers[job['job_type']]
+            payload = job['payload']
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            await handler(payload)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logging.error(f"排程工作 {job_id} 執行失敗: {error}")
+
+        async with self.db_pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE scheduled_jobs SET status = $2, last_error = $3, finished_at = $4 WHERE id = $1",
+                job_id, 'failed' if error else 'done', error, datetime.now(timezone.utc)
+            )
@@ -0,0 +1,150 @@
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import deque
+
+# 網頁端操作的背景副作用佇列 (Discord 日誌、自動化處置、私訊通知)
+# 路由在資料庫寫入完成後只需 enqueue() 即可回應，由固定數量的 worker 在背景執行；
+# 失敗會以指數退避重試，超過次數的工作寫入 side_effect_dead_letters 供事後檢查
+
+STATUS_TEXT = {
+    "queued": "排隊中",
+    "running": "執行中",
+    "retrying": "等待重試",
+    "done": "已完成",
+    "dead": "失敗"
+}
+
+class SideEffectQueue:
+    def __init__(self, db_pool, workers: int = 4, max_attempts: int = 3, history: int = 500):
+        self.db_pool = db_pool
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.handlers = {}               # kind -> async handler(payload)
+        self._queue = asyncio.Queue()
+        self._ids = itertools.count(1)
+        self._recent = deque(maxlen=history)   # 最近的工作 (供頁面顯示狀態)
+        self._tasks = []
+        self._retry_timers = {}          # 重試計時 task -> job
+        self._stopping = False
+        self.counters = {"enqueued": 0, "done": 0, "retried": 0, "dead": 0}
+
+    def register(self, kind: str, handler):
+        """註冊工作類型對應的處理函式 (需為 async，參數為 payload dict)"""
+        self.handlers[kind] = handler
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """關機時盡量把已排隊的工作做完，逾時後放棄 (此後失敗的工作直接寫入 dead letter)"""
+        self._stopping = True
+        # 等待重試中的工作不再等候，直接排入佇列做最後一次嘗試
+        for timer, job in list(self._retry_timers.items()):
+            timer.cancel()
+            job['status'] = "queued"
+            self._queue.put_nowait(job)
+        self._retry_timers.clear()
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"背景佇列關閉逾時，尚有 {self._queue.qsize()} 個工作未執行")
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+
+    def enqueue(self, kind: str, payload: dict, guild_id: int = None, user_id: int = None, label: str = None) -> dict:
+        """加入工作並立即回傳 (不等待執行)；guild_id / user_id 用於在頁面上篩選顯示"""
+        if kind not in self.handlers:
+            raise ValueError(f"未註冊的工作類型：{kind}")
+        job = {
+            "id": next(self._ids),
+            "kind": kind,
+            "label": label or kind,
+            "payload": payload,
+            "guild_id": guild_id,
+            "user_id": user_id,
+            "status": "queued",
+            "attempts": 0,
+            "error": None,
+            "created_at": time.time()
+        }
+        self._recent.append(job)
+        self._queue.put_nowait(job)
+        self.counters["enqueued"] += 1
+        return job
+
+    def recent(self, guild_id: int = None, user_id: int = None, kind: str = None, limit: int = 10):
+        """最近的工作 (新到舊)，可依伺服器、觸發者或工作類型篩選"""
+        result = []
+        for job in reversed(self._recent):
+            if kind is not None and job['kind'] != kind:
+                continue
+            if guild_id is not None and job['guild_id'] != guild_id:
+                continue
+            if user_id is not None and job['user_id'] != user_id:
+                continue
+            result.append({**job, "status_text": STATUS_TEXT[job['status']]})
+            if len(result) >= limit:
+                break
+        return result
+
+    def stats(self) -> dict:
+        return {**self.counters, "queue_depth": self._queue.qsize(), "waiting_retry": len(self._retry_timers)}
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        job['status'] = "running"
+        job['attempts'] += 1
+        try:
+            await self.handlers[job['kind']](job['payload'])
+        except Exception as e:
+            job['error'] = f"{type(e).__name__}: {e}"
+            if job['attempts'] < self.max_attempts and not self._stopping:
+                job['status'] = "retrying"
+                self.counters["retried"] += 1
+                # 重試計時不佔用 worker
+                timer = asyncio.create_task(self._retry_later(job, min(60, 2 ** job['attempts']) + random.random()))
+                self._retry_timers[timer] = job
+                timer.add_done_callback(lambda t: self._retry_timers.pop(t, None))
+            else:
+                job['status'] = "dead"
+                self.counters["dead"] += 1
+                logging.error(f"背景工作 {job['kind']} #{job['id']} 重試 {job['attempts']} 次後失敗: {job['error']}")
+                await self._dead_letter(job)
+            return
+        job['status'] = "done"
+        job['error'] = None
+        self.counters["done"] += 1
+
+    async def _retry_later(self, job, delay: float):
+        await asyncio.sleep(delay)
+        job['status'] = "queued"
+        self._queue.put_nowait(job)
+
+    async def _dead_letter(self, job):
+        try:
+            async with self.db_pool.acquire() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO side_effect_dead_letters (kind, payload, guild_id, user_id, attempts, last_error)
+                    VALUES ($1, $2::jsonb, $3, $4, $5, $6)
+                    """,
+                    job['kind'], json.dumps(job['payload'], ensure_ascii=False),
+                    job['guild_id'], job['user_id'], job['attempts'], job['error']
+                )
+        except Exception as e:
+            logging.error(f"寫入 dead letter 失敗: {e}")
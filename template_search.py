@@ -0,0 +1,146 @@
+import base64
+import json
+import re
+from datetime import datetime
+
+# 模板目錄搜尋
+# PostgreSQL 內建的斷詞器不會切分中文，pg_trgm 在 C locale 下也會忽略中日韓字元，
+# 因此另外把中日韓字串拆成「單字 + 相鄰雙字」存進 search_tsv，查詢時用同樣規則轉成 tsquery；
+# 英文等拉丁字則保留原本的詞並支援前綴比對，再以 trigram 索引輔助 ILIKE 與相似度排序
+
+CJK_RUN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+WORD = re.compile(r'[0-9a-z]+')
+
+# 顯示在模板卡片上的欄位 (不使用 SELECT *)
+CARD_COLUMNS = "id, template_name, description, category, link, uploader_id, created_at"
+
+# 與 trigram 索引相同的運算式，查詢時必須完全一致才會使用索引
+SEARCH_TEXT = "lower(coalesce(template_name, '') || ' ' || coalesce(description, ''))"
+
+def build_tsquery(text: str):
+    """把使用者輸入轉成 to_tsquery('simple', ...) 字串；沒有可用詞彙時回傳 None"""
+    text = (text or "").lower()
+    terms = []
+    for run in CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    for word in WORD.findall(CJK_RUN.sub(" ", text)):
+        terms.append(f"{word}:*")
+    if not terms:
+        return None
+    # 詞彙只含字母數字與中日韓字元，不需額外跳脫
+    return " & ".join(dict.fromkeys(terms))
+
+def encode_cursor(row, with_rank: bool = False) -> str:
+    """以最後一筆的排序鍵產生下一頁游標 (created_at, id；搜尋模式另含 rank)"""
+    key = {"c": row['created_at'].isoformat(), "i": row['id']}
+    if with_rank:
+        key["r"] = row['rank']
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """解析游標，格式錯誤時回傳 None (視為第一頁)"""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return {"c": datetime.fromisoformat(key["c"]), "i": int(key["i"]), "r": key.get("r")}
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def _split_page(rows, limit, with_rank=False):
+    """多取一筆判斷是否還有下一頁"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1], with_rank)
+    return rows, None
+
+async def list_templates_page(conn, *, status: str = None, uploader_id: int = None, category: str = None, cursor: str = None, limit: int = 24, columns: str = CARD_COLUMNS):
+    """
+    依 (created_at, id) 由新到舊的 keyset 分頁，每頁成本與目錄大小無關
+    columns 必須包含 id 與 created_at；回傳 (templates, next_cursor)
+    """
+    params = []
+    conditions = []
+    if uploader_id is not None:
+        params.append(uploader_id)
+        conditions.append(f"uploader_id = ${len(params)}")
+    if status is not None:
+        params.append(status)
+        conditions.append(f"status = ${len(params)}")
+    if category:
+        params.append(category)
+        conditions.append(f"category = ${len(params)}")
+    key = decode_cursor(cursor)
+    if key:
+        params.extend([key["c"], key["i"]])
+        conditions.append(f"(created_at, id) < (${len(params) - 1}, ${len(params)})")
+    params.append(limit + 1)
+
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    rows = await conn.fetch(
+        f"SELECT {columns} FROM templates{where} ORDER BY created_at DESC, id DESC LIMIT ${len(params)}",
+        *params
+    )
+    return _split_page(rows, limit)
+
+async def search_templates(conn, search: str, *, status: str = None, uploader_id: int = None, category: str = None, cursor: str = None, limit: int = 24):
+    """
+    依相關度搜尋模板，並在同一個查詢中回傳各分類的命中數
+    回傳 (templates, facets, next_cursor)；facets 為 {分類: 數量}，不受 category 篩選影響
+    """
+    # ILIKE 需跳脫使用者輸入中的萬用字元
+    pattern = "%" + re.sub(r'([\\%_])', r'\\\1', search.lower()) + "%"
+    params = [build_tsquery(search), pattern, search.lower()]
+    conditions = [f"(($1::text IS NOT NULL AND search_tsv @@ to_tsquery('simple', $1)) OR {SEARCH_TEXT} ILIKE $2)"]
+    if uploader_id is not None:
+        params.append(uploader_id)
+        conditions.append(f"uploader_id = ${len(params)}")
+    if status is not None:
+        params.append(status)
+        conditions.append(f"status = ${len(params)}")
+
+    page_conditions = []
+    if category:
+        params.append(category)
+        page_conditions.append(f"category = ${len(params)}")
+    key = decode_cursor(cursor)
+    if key and key["r"] is not None:
+        params.extend([key["r"], key["c"], key["i"]])
+        n = len(params)
+        page_conditions.append(f"(rank, created_at, id) < (${n - 2}::real, ${n - 1}, ${n})")
+    params.append(limit + 1)
+    page_where = " WHERE " + " AND ".join(page_conditions) if page_conditions else ""
+
+    rows = await conn.fetch(
+        f"""
+        WITH matched AS (
+            SELECT {CARD_COLUMNS},
+                   (CASE WHEN $1::text IS NULL THEN 0
+                         ELSE ts_rank(search_tsv, to_tsquery('simple', $1)) END
+                    + similarity({SEARCH_TEXT}, $3))::real AS rank
+            FROM templates
+            WHERE {" AND ".join(conditions)}
+        ),
+        page AS (
+            SELECT * FROM matched{page_where}
+            ORDER BY rank DESC, created_at DESC, id DESC
+            LIMIT ${len(params)}
+        ),
+        facets AS (
+            SELECT COALESCE(jsonb_object_agg(category, n), '{{}}'::jsonb) AS facets
+            FROM (SELECT category, count(*) AS n FROM matched GROUP BY category) c
+        )
+        SELECT facets.facets, page.* FROM facets LEFT JOIN page ON true
+        ORDER BY page.rank DESC, page.created_at DESC, page.id DESC
+        """,
+        *params
+    )
+
+    facets = rows[0]['facets'] if rows else {}
+    if isinstance(facets, str):
+        facets = json.loads(facets)
+    templates, next_cursor = _split_page([r for r in rows if r['id'] is not None], limit, with_rank=True)
+    return templates, facets, next_cursor
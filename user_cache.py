@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+class UserCache:
+    """
+    bot.fetch_user 前的使用者 / 私訊頻道快取 (LRU + TTL)
+    - 先查自身快取，再查 gateway 快取 (bot.get_user)，都沒有才打 REST
+    - 私訊頻道與使用者一起保存，重複私訊同一人時不必再 create_dm
+    - 超過 max_entries 時移除最久沒使用的項目
+    """
+    def __init__(self, bot, ttl: float = 3600, max_entries: int = 2000):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # user_id -> [cached_at, user, dm_channel]
+        self._pending = {}              # user_id -> 進行中的 fetch_user (同時請求同一人只打一次)
+        self.hits = 0
+        self.gateway_hits = 0
+        self.misses = 0
+        self.dm_created = 0
+
+    def _entry(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def _store(self, user_id: int, user, dm_channel=None):
+        self._entries[user_id] = [time.monotonic(), user, dm_channel or user.dm_channel]
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return self._entries[user_id]
+
+    async def _load(self, user_id: int):
+        entry = self._entry(user_id)
+        if entry:
+            self.hits += 1
+            return entry
+
+        user = self.bot.get_user(user_id)
+        if user:
+            self.gateway_hits += 1
+            return self._store(user_id, user)
+
+        task = self._pending.get(user_id)
+        if task is None:
+            self.misses += 1
+            task = self._pending[user_id] = asyncio.ensure_future(self.bot.fetch_user(user_id))
+            task.add_done_callback(lambda _: self._pending.pop(user_id, None))
+        user = await asyncio.shield(task)
+        return self._entry(user_id) or self._store(user_id, user)
+
+    async def get(self, user_id: int):
+        """取得使用者 (找不到時與 fetch_user 一樣拋出 discord.NotFound)"""
+        return (await self._load(user_id))[1]
+
+    async def dm_channel(self, user_id: int):
+        entry = await self._load(user_id)
+        if entry[2] is None:
+            entry[2] = await entry[1].create_dm()
+            self.dm_created += 1
+        return entry[2]
+
+    async def send(self, user_id: int, **kwargs):
+        """私訊使用者，參數同 Messageable.send (經由 bot.dispatcher 以私訊優先順序發送)"""
+        channel = await self.dm_channel(user_id)
+        return await self.bot.dispatcher.submit("dm", None, lambda: channel.send(**kwargs))
+
+    async def preload(self, user_ids, concurrency: int = 5):
+        """預先載入常用的使用者 (開發者、管理員)，個別失敗略過；回傳成功數量"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load(user_id):
+            async with semaphore:
+                try:
+                    await self.dm_channel(user_id)
+                    return True
+                except Exception:
+                    return False
+
+        return sum(await asyncio.gather(*(load(uid) for uid in set(user_ids))))
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.gateway_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "gateway_hits": self.gateway_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.gateway_hits) / total, 4) if total else 0.0,
+            "dm_channels_created": self.dm_created,
+            "ttl_seconds": self.ttl
+        }
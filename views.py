@@ -1,6 +1,30 @@
+import asyncio
+import logging
 import discord
 from discord import ui
 
+async def notify_managers(bot, user_ids, make_message, concurrency: int = 5) -> int:
+    """
+    併發私訊多位管理員 (同時最多 concurrency 個請求)，回傳成功送達的人數
+    make_message() 每次回傳新的 send() 參數 dict，讓每個人拿到獨立的 View
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(user_id):
+        async with semaphore:
+            try:
+                # 使用快取的使用者與私訊頻道，避免每人兩次 REST 請求
+                await bot.user_cache.send(user_id, **make_message())
+                return True
+            except (discord.Forbidden, discord.NotFound):
+                return False
+            except discord.HTTPException as e:
+                logging.warning(f"私訊管理員 {user_id} 失敗: {e}")
+                return False
+
+    results = await asyncio.gather(*(send(uid) for uid in user_ids))
+    return sum(results)
+
 class TemplateReviewView(ui.View):
     def __init__(self, t_id, db_pool, u_name, bot=None):
         super().__init__(timeout=None) 
@@ -20,22 +44,21 @@ class TemplateReviewView(ui.View):
 
     @ui.button(label="🔵 下放管理員", style=discord.ButtonStyle.blurple)
     async def delegate(self, interaction: discord.Interaction, button: ui.Button):
+        # 先回應互動 (移除按鈕)，私訊管理員可能超過 3 秒期限
+        await interaction.response.edit_message(content=f"🔵 模板 (ID: {self.t_id}) 下放中...", view=None)
+
         async with self.db_pool.acquire() as conn:
             # 這裡保持 '已下放'，因為 web_main.py 的審核中心是查詢中文狀態
             await conn.execute("UPDATE templates SET status = '已下放' WHERE id = $1", self.t_id)
             
             managers = await conn.fetch("SELECT user_id FROM managers")
         
-        await interaction.response.edit_message(content=f"🔵 模板 (ID: {self.t_id}) 已下放給 {len(managers)} 位管理員審核。", view=None)
-        
+        reached = 0
         if self.bot and managers:
-            for m in managers:
-                try:
-                    m_user = await self.bot.fetch_user(m['user_id'])
-                    if m_user:
-                        await m_user.send(f"🔔 有新的下放審核任務 (模板 ID: {self.t_id})，請至網頁後台或使用指令處理。")
-                except:
-                    continue
+            content = f"🔔 有新的下放審核任務 (模板 ID: {self.t_id})，請至網頁後台或使用指令處理。"
+            reached = await notify_managers(self.bot, [m['user_id'] for m in managers], lambda: {"content": content})
+
+        await interaction.edit_original_response(content=f"🔵 模板 (ID: {self.t_id}) 已下放給管理員審核 (私訊送達 {reached}/{len(managers)} 位)。")
 
     @ui.button(label="❌ 駁回", style=discord.ButtonStyle.red)
     async def reject(self, interaction: discord.Interaction, button: ui.Button):
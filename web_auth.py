@@ -0,0 +1,78 @@
+from fastapi import Request
+
+# 請求範圍的身分 / 權限載入 (FastAPI dependency)
+# 每個請求只解析一次：登入者、全域身分 (開發者 / 模板管理員) 與路徑中 guild_id 的伺服器權限，
+# 需要查資料庫時只取用一條連線，結果存在 request.state 供同一請求內重複使用
+
+ROLE_TEXT = {"developer": "開發者", "manager": "模板管理員", "user": "一般使用者"}
+
+class Identity:
+    def __init__(self, user: dict, developer_id: int):
+        self.user = user
+        self.user_id = int(user['id']) if user else None
+        self.is_developer = self.user_id is not None and self.user_id == developer_id
+        self.is_manager = False
+        self._guild_access = {}   # guild_id -> "none" / "owner" / "admin" / "member"
+
+    @property
+    def role(self) -> str:
+        if self.is_developer: return "developer"
+        if self.is_manager: return "manager"
+        return "user"
+
+    @property
+    def role_text(self) -> str:
+        """頂部導航列顯示的全域身分文字"""
+        return ROLE_TEXT[self.role]
+
+    @property
+    def can_review(self) -> bool:
+        """開發者與模板管理員可審核 / 修改 / 刪除模板"""
+        return self.is_developer or self.is_manager
+
+    def _resolve_access(self, guild, settings) -> str:
+        if guild is None: return "none"
+        if self.user_id is None: return "none"
+        if guild.owner_id == self.user_id: return "owner"
+        if settings and self.user_id in settings['admin_list']: return "admin"
+        return "member"
+
+    async def guild_access(self, bot, guild_id: int) -> str:
+        """伺服器權限等級 (同一請求內快取)：none / owner / admin / member"""
+        if guild_id not in self._guild_access:
+            guild = bot.get_guild(guild_id)
+            settings = await bot.guild_cache.get(guild_id) if guild and self.user_id else None
+            self._guild_access[guild_id] = self._resolve_access(guild, settings)
+        return self._guild_access[guild_id]
+
+async def get_identity(request: Request) -> Identity:
+    identity = getattr(request.state, "identity", None)
+    if identity is not None:
+        return identity
+
+    bot = request.app.state.bot
+    identity = Identity(request.session.get("user"), bot.config['DEVELOPER_ID'])
+
+    guild_id = request.path_params.get("guild_id")
+    if guild_id is not None and not str(guild_id).isdigit():
+        guild_id = None
+    guild = bot.get_guild(int(guild_id)) if guild_id is not None and identity.user_id else None
+    settings = bot.guild_cache.peek(guild.id) if guild else None
+
+    need_manager = identity.user_id is not None and not identity.is_developer
+    need_settings = guild is not None and settings is None and guild.owner_id != identity.user_id
+    if need_manager or need_settings:
+        # 管理員身分與伺服器設定 (快取未命中時) 共用同一條連線
+        async with bot.db_pool.acquire() as conn:
+            if need_manager:
+                identity.is_manager = await conn.fetchval(
+                    "SELECT EXISTS(SELECT 1 FROM managers WHERE user_id = $1)", identity.user_id
+                )
+            if need_settings:
+                settings = await bot.guild_cache.get(guild.id, conn=conn)
+
+    if guild_id is not None:
+        identity._guild_access[int(guild_id)] = identity._resolve_access(guild, settings)
+
+    request.state.identity = identity
+    return identity
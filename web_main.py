@@ -1,15 +1,26 @@
 import json
+import logging
 import httpx
 import discord
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi.responses import RedirectResponse, HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 from discord import Permissions
 from fastapi import Form, HTTPException
 from fastapi.responses import RedirectResponse
-from views import TemplateReviewView
-from datetime import datetime
+from records import add_member_record
+from template_search import search_templates, list_templates_page
+from discord_rest import DiscordHTTP, UserGuildCache, DiscordAuthError, DiscordRateLimited
+from web_auth import Identity, get_identity
+from page_data import load_my_status_data
+from admin_resolver import AdminResolver
+from reevaluation import load_reevaluation, plan_reevaluation
+from record_export import EXPORT_FORMATS, build_export_query, stream_records
+from member_table import load_member_page, SORTS
+from commands.moderation import BULK_LIMIT
+from datetime import datetime, timedelta, timezone
+from typing import List
 
 # 讀取設定
 with open('config.json', 'r', encoding='utf-8') as f:
@@ -17,22 +28,7 @@ with open('config.json', 'r', encoding='utf-8') as f:
 
 app = FastAPI()
 
-# --- 在路由開始之前加入此函式 ---
-async def get_user_role_text(bot, user_id: int):
-    """
-    取得全域身分文字
-    """
-    # 檢查是否為開發者 (從 config 讀取 ID)
-    if user_id == config.get('DEVELOPER_ID'):
-        return "開發者"
-    
-    async with bot.db_pool.acquire() as conn:
-        # 檢查是否為模板管理員 (假設您有 managers 資料表)
-        is_manager = await conn.fetchval("SELECT user_id FROM managers WHERE user_id = $1", user_id)
-        if is_manager:
-            return "模板管理員"
-            
-    return "一般使用者"
+# 登入者身分 (開發者 / 模板管理員) 與伺服器權限統一由 web_auth.get_identity 於每個請求解析一次
 
 # 啟用 Session 功能來儲存登入狀態
 # 這裡的 secret_key 請換成一段隨機的長字串
@@ -44,22 +40,24 @@ templates = Jinja2Templates(directory="templates")
 CLIENT_ID = config['CLIENT_ID']
 CLIENT_SECRET = config['CLIENT_SECRET']
 REDIRECT_URI = "http://localhost:8000/callback"  # 在 Discord Developer Portal 也要設定這個 URL
-DISCORD_API_BASE = "https://discord.com/api/v10"
+DISCORD_API_BASE = config.get("DISCORD_API_BASE", "https://discord.com/api/v10")  # 測試時可指向本機的替身伺服器
 
-async def check_user_access(bot, guild_id: int, user_id: int):
-    guild = bot.get_guild(guild_id)
-    if not guild: return "none"
-    
-    # 判斷是否為擁有者
-    if guild.owner_id == user_id: return "owner"
-    
-    # 判斷是否為資料庫授權的管理員 (admin_list)
-    async with bot.db_pool.acquire() as conn:
-        admin_list = await conn.fetchval("SELECT admin_list FROM guilds WHERE guild_id = $1", guild_id)
-        if admin_list and user_id in admin_list:
-            return "admin"
-            
-    return "member"
+# 全站共用的 Discord REST 連線池 (啟動時建立、關閉時釋放)
+discord_http = DiscordHTTP(DISCORD_API_BASE, http2=config.get("DISCORD_HTTP2", True))
+app.state.discord_http = discord_http
+# 使用者伺服器清單快取 (Discord 對 /users/@me/guilds 的速率限制很嚴格)
+user_guild_cache = UserGuildCache(discord_http, ttl=config.get("USER_GUILDS_TTL", 60))
+app.state.user_guild_cache = user_guild_cache
+# my_status 管理員名單解析 (身分組展開、批次 gateway 查詢與結果快取)
+app.state.admin_resolver = AdminResolver(ttl=config.get("ADMIN_RESOLVE_TTL", 300))
+
+@app.on_event("startup")
+async def start_discord_http():
+    await discord_http.start()
+
+@app.on_event("shutdown")
+async def close_discord_http():
+    await discord_http.close()
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -80,78 +78,85 @@ async def login():
 @app.get("/callback")
 async def callback(request: Request, code: str):
     """處理 Discord 授權回傳"""
-    async with httpx.AsyncClient() as client:
-        # 1. 交換 Token
-        data = {
-            "client_id": CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
-            "grant_type": "authorization_code",
-            "code": code,
-            "redirect_uri": REDIRECT_URI,
-        }
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        token_res = await client.post(f"{DISCORD_API_BASE}/oauth2/token", data=data, headers=headers)
-        token_data = token_res.json()
-        
-        if "access_token" not in token_data:
-            return HTTPException(status_code=400, detail="授權失敗")
+    client = request.app.state.discord_http
+    # 1. 交換 Token
+    data = {
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "grant_type": "authorization_code",
+        "code": code,
+        "redirect_uri": REDIRECT_URI,
+    }
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    token_res = await client.post("/oauth2/token", data=data, headers=headers)
+    token_data = token_res.json()
+    
+    if "access_token" not in token_data:
+        return HTTPException(status_code=400, detail="授權失敗")
 
-        token = token_data["access_token"]
-        
-        # 2. 獲取使用者資料
-        user_headers = {"Authorization": f"Bearer {token}"}
-        user_res = await client.get(f"{DISCORD_API_BASE}/users/@me", headers=user_headers)
-        user_info = user_res.json()
-
-        # 3. 儲存 Session
-        request.session["user"] = {
-            "id": user_info["id"],
-            "username": user_info["username"],
-            "avatar": f"https://cdn.discordapp.com/avatars/{user_info['id']}/{user_info['avatar']}.png",
-            "token": token
-        }
+    token = token_data["access_token"]
+    
+    # 2. 獲取使用者資料
+    user_headers = {"Authorization": f"Bearer {token}"}
+    user_res = await client.get("/users/@me", headers=user_headers)
+    user_info = user_res.json()
+
+    # 3. 儲存 Session
+    request.session["user"] = {
+        "id": user_info["id"],
+        "username": user_info["username"],
+        "avatar": f"https://cdn.discordapp.com/avatars/{user_info['id']}/{user_info['avatar']}.png",
+        "token": token
+    }
 
     return RedirectResponse(url="/")
 
 @app.get("/logout")
 async def logout(request: Request):
+    user = request.session.get("user")
+    if user:
+        request.app.state.user_guild_cache.invalidate(int(user['id']))
     request.session.clear()
     return RedirectResponse(url="/")
 
 @app.get("/guilds", response_class=HTMLResponse)
-async def guild_list(request: Request):
-    user = request.session.get("user")
+async def guild_list(request: Request, refresh: bool = False, identity: Identity = Depends(get_identity)):
+    user = identity.user
     if not user:
         return RedirectResponse(url="/")
 
     bot = request.app.state.bot
-    user_id = int(user['id']) # 這是使用者的 Discord ID，用來比對權限
-
-        # 在你的 guild_list 路由中
-    user_role = "一般使用者" # 預設 [cite: 92]
-    if int(user['id']) == config['DEVELOPER_ID']: # 判定開發者 [cite: 83, 90]
-        user_role = "開發者"
-    else:
-        async with bot.db_pool.acquire() as conn:
-            # 判定是否為模板管理員 [cite: 70, 91]
-            is_manager = await conn.fetchval("SELECT user_id FROM managers WHERE user_id = $1", int(user['id']))
-            if is_manager:
-                user_role = "模板管理員"
-
-    bot = app.state.bot
-    async with httpx.AsyncClient() as client:
-        # 取得使用者所在的 Discord 伺服器清單
-        headers = {"Authorization": f"Bearer {user['token']}"}
-        res = await client.get(f"{DISCORD_API_BASE}/users/@me/guilds", headers=headers)
-        user_guilds = res.json()
+    user_id = identity.user_id # 這是使用者的 Discord ID，用來比對權限
+    user_role = identity.role_text
+
+    # 取得使用者所在的 Discord 伺服器清單 (短時間快取，refresh=true 可手動更新)
+    stale = False
+    retry_after = None
+    unavailable = False
+    try:
+        user_guilds, stale = await request.app.state.user_guild_cache.get(user_id, user['token'], refresh=refresh)
+    except DiscordAuthError:
+        # token 已失效，重新登入
+        request.session.clear()
+        return RedirectResponse(url="/login")
+    except DiscordRateLimited as e:
+        user_guilds = []
+        retry_after = round(e.retry_after)
+    except httpx.HTTPError as e:
+        # Discord 5xx / 連線錯誤且沒有快取可用：顯示空清單與錯誤提示，而不是 500 頁面
+        logging.warning(f"取得使用者 {user_id} 的伺服器清單失敗: {e}")
+        user_guilds = []
+        unavailable = True
 
     # 權限與排序處理
     installed_guilds = []
     not_installed_guilds = []
+    # 機器人所在伺服器的 ID 集合，一次建立後以 O(1) 判斷
+    bot_guild_ids = {g.id for g in bot.guilds}
 
     for g in user_guilds:
         # 檢查機器人是否在該伺服器
-        bot_guild = bot.get_guild(int(g['id']))
+        bot_guild = int(g['id']) in bot_guild_ids
         
         # 檢查使用者是否有 Discord 管理員權限 (ADMINISTRATOR)
         # Discord 的 permissions 是一個 bitmask，0x8 是管理員
@@ -175,49 +180,42 @@ async def guild_list(request: Request):
         "user_role": user_role,  # 傳遞身分文字給前端
         "installed": installed_guilds,
         "not_installed": not_installed_guilds,
-        "config": config
+        "config": config,
+        "stale": stale,
+        "retry_after": retry_after,
+        "unavailable": unavailable
     })
 
+async def load_templates_page(bot, current_user_id, mine: bool, search: str, category: str, cursor: str, limit: int = 24):
+    """
+    模板列表 (HTML 與 JSON API 共用)：keyset 分頁，只取卡片需要的欄位
+    回傳 (templates, facets, next_cursor)；facets 只有搜尋模式才有
+    """
+    # 邏輯 1: 如果是「我的模板」，篩選 uploader_id，否則顯示已審核通過的模板
+    filters = {
+        "uploader_id": current_user_id if mine and current_user_id else None,
+        "status": None if mine and current_user_id else 'approved',
+        # 邏輯 2: 分類篩選
+        "category": category if category and category != "全部" else None
+    }
+    async with bot.db_pool.acquire() as conn:
+        if search and search.strip():
+            # 邏輯 3: 搜尋模式，全文 + trigram 索引，依相關度排序並附帶各分類命中數
+            return await search_templates(conn, search.strip(), cursor=cursor, limit=limit, **filters)
+        templates_data, next_cursor = await list_templates_page(conn, cursor=cursor, limit=limit, **filters)
+        return templates_data, None, next_cursor
+
 @app.get("/templates", response_class=HTMLResponse)
-async def list_templates(request: Request, mine: bool = False, search: str = None, category: str = None):
-    user = request.session.get("user")
-    current_user_id = int(user['id']) if user else None
+async def list_templates(request: Request, mine: bool = False, search: str = None, category: str = None, cursor: str = None, identity: Identity = Depends(get_identity)):
+    user = identity.user
+    current_user_id = identity.user_id
     
     # 🚀 [修正關鍵] 補上這行，定義 bot 變數
     bot = request.app.state.bot  
 
-    async with bot.db_pool.acquire() as conn:
+    templates_data, facets, next_cursor = await load_templates_page(bot, current_user_id, mine, search, category, cursor)
 
-        base_query = "SELECT * FROM templates"
-        conditions = []
-        params = []
-        
-        # 邏輯 1: 如果是「我的模板」，篩選 uploader_id
-        if mine and current_user_id:
-            conditions.append(f"uploader_id = ${len(params) + 1}")
-            params.append(current_user_id)
-        else:
-            # 顯示已審核通過的模板
-            conditions.append("status = 'approved'")
-            
-        # 邏輯 2: 關鍵字搜尋
-        if search:
-            conditions.append(f"(template_name ILIKE ${len(params) + 1} OR description ILIKE ${len(params) + 1})")
-            params.append(f"%{search}%")
-
-        # 邏輯 3: 分類篩選
-        if category and category != "全部":
-            conditions.append(f"category = ${len(params) + 1}")
-            params.append(category)
-            
-        final_query = base_query
-        if conditions:
-            final_query += " WHERE " + " AND ".join(conditions)
-        final_query += " ORDER BY created_at DESC"
-        
-        templates_data = await conn.fetch(final_query, *params)
-
-    user_role = await get_user_role_text(bot, current_user_id) if current_user_id else "一般使用者"
+    user_role = identity.role_text
 
     return templates.TemplateResponse("templates_list.html", {
         "request": request,
@@ -226,15 +224,48 @@ async def list_templates(request: Request, mine: bool = False, search: str = Non
         "current_user_id": current_user_id,
         "show_mine": mine,
         "user_role": user_role,
-        "current_category": category or "全部"
+        "current_category": category or "全部",
+        "search": search or "",
+        "facets": facets,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+        # 自己上傳後的審核通知 (背景佇列) 狀態
+        "jobs": bot.side_effects.recent(user_id=current_user_id, kind="template_upload_review", limit=5) if current_user_id else []
     })
 
-@app.post("/templates/delete/{template_id}")
-async def delete_template(template_id: int, request: Request):
+@app.get("/api/templates")
+async def api_templates(request: Request, mine: bool = False, search: str = None, category: str = None, cursor: str = None, limit: int = 24):
+    """模板列表 JSON API，以 next_cursor 取得下一頁"""
     user = request.session.get("user")
+    current_user_id = int(user['id']) if user else None
+    bot = request.app.state.bot
+
+    templates_data, facets, next_cursor = await load_templates_page(
+        bot, current_user_id, mine, search, category, cursor, limit=max(1, min(limit, 100))
+    )
+    return {
+        "items": [
+            {
+                "id": t['id'],
+                "template_name": t['template_name'],
+                "description": t['description'],
+                "category": t['category'],
+                "link": t['link'],
+                "uploader_id": str(t['uploader_id']),
+                "created_at": t['created_at'].isoformat()
+            }
+            for t in templates_data
+        ],
+        "facets": facets,
+        "next_cursor": next_cursor
+    }
+
+@app.post("/templates/delete/{template_id}")
+async def delete_template(template_id: int, request: Request, identity: Identity = Depends(get_identity)):
+    user = identity.user
     if not user: return RedirectResponse("/login")
     
-    user_id = int(user['id'])
+    user_id = identity.user_id
     bot = request.app.state.bot
     async with bot.db_pool.acquire() as conn:
         # 修正 403 關鍵：確保 uploader_id 比較邏輯正確
@@ -243,7 +274,7 @@ async def delete_template(template_id: int, request: Request):
             raise HTTPException(status_code=404, detail="找不到此模板")
             
         # 權限檢查：必須是本人或開發者
-        if int(template['uploader_id']) != user_id and user_id != config['DEVELOPER_ID']:
+        if int(template['uploader_id']) != user_id and not identity.is_developer:
             raise HTTPException(status_code=403, detail="權限不足：您只能刪除自己的模板")
             
         await conn.execute("DELETE FROM templates WHERE id = $1", template_id)
@@ -276,42 +307,24 @@ async def upload_template(
             template_name, link, category, description, user_id, user_name
         )
 
-    # 發送 Discord 審核訊息
-    dev_id = config['DEVELOPER_ID']
-    dev_user = await bot.fetch_user(dev_id)
-    
-    if dev_user:
-        embed = discord.Embed(title="🛡️ 新模板審核申請 (網頁端)", color=discord.Color.gold())
-        embed.add_field(name="模板名稱", value=template_name, inline=True)
-        embed.add_field(name="分類", value=category, inline=True)
-        embed.add_field(name="上傳者", value=user_name, inline=False)
-        embed.add_field(name="連結", value=link, inline=False)
-        embed.description = f"描述：{description}"
-        
-        # 使用 views.py 裡的 View
-        view = TemplateReviewView(t_id, bot.db_pool, user_name)
-        await dev_user.send(embed=embed, view=view)
+    # 發送 Discord 審核訊息 (背景佇列執行，不等待 fetch_user 與私訊)
+    bot.side_effects.enqueue(
+        "template_upload_review",
+        {"template_id": t_id, "template_name": template_name, "category": category,
+         "user_name": user_name, "link": link, "description": description},
+        user_id=user_id, label=f"通知審核：{template_name}"
+    )
 
     return RedirectResponse(url="/templates", status_code=303)
 
 # 1. 審核專區頁面
 @app.get("/templates/review", response_class=HTMLResponse)
-async def review_page(request: Request):
-    user = request.session.get("user")
+async def review_page(request: Request, identity: Identity = Depends(get_identity)):
+    user = identity.user
     bot = request.app.state.bot
     
     # 權限檢查：只有開發者與管理員能進來
-    user_id = int(user['id']) if user else None
-    is_admin_user = False
-    if user_id == config['DEVELOPER_ID']:
-        is_admin_user = True
-    else:
-        async with bot.db_pool.acquire() as conn:
-            is_manager = await conn.fetchval("SELECT user_id FROM managers WHERE user_id = $1", user_id)
-            if is_manager:
-                is_admin_user = True
-
-    if not is_admin_user:
+    if not identity.can_review:
         return RedirectResponse(url="/templates")
 
     # 撈取待處理的模板
@@ -343,19 +356,14 @@ async def template_action(t_id: int, request: Request, action: str = Form(...)):
 
 # 1. 刪除模板 API
 @app.post("/templates/delete/{t_id}")
-async def delete_template(t_id: int, request: Request):
-    user = request.session.get("user")
+async def delete_template(t_id: int, request: Request, identity: Identity = Depends(get_identity)):
     bot = request.app.state.bot
-    user_id = int(user['id']) if user else None
 
     # 權限檢查：開發者或模板管理員
-    async with bot.db_pool.acquire() as conn:
-        is_manager = await conn.fetchval("SELECT user_id FROM managers WHERE user_id = $1", user_id)
-        is_dev = (user_id == config['DEVELOPER_ID'])
-
-        if is_dev or is_manager:
+    if identity.can_review:
+        async with bot.db_pool.acquire() as conn:
             await conn.execute("DELETE FROM templates WHERE id = $1", t_id)
-            return RedirectResponse(url="/templates", status_code=303)
+        return RedirectResponse(url="/templates", status_code=303)
         
     raise HTTPException(status_code=403, detail="權限不足")
 
@@ -367,17 +375,13 @@ async def edit_template(
     template_name: str = Form(...),
     link: str = Form(...),
     category: str = Form(...),
-    description: str = Form(None)
+    description: str = Form(None),
+    identity: Identity = Depends(get_identity)
 ):
-    user = request.session.get("user")
     bot = request.app.state.bot
-    user_id = int(user['id']) if user else None
-
-    async with bot.db_pool.acquire() as conn:
-        is_manager = await conn.fetchval("SELECT user_id FROM managers WHERE user_id = $1", user_id)
-        is_dev = (user_id == config['DEVELOPER_ID'])
 
-        if is_dev or is_manager:
+    if identity.can_review:
+        async with bot.db_pool.acquire() as conn:
             await conn.execute(
                 """
                 UPDATE templates 
@@ -386,22 +390,20 @@ async def edit_template(
                 """,
                 template_name, link, category, description, t_id
             )
-            return RedirectResponse(url="/templates", status_code=303)
+        return RedirectResponse(url="/templates", status_code=303)
 
     raise HTTPException(status_code=403, detail="權限不足")
 
 # 伺服器成員管理頁面
 @app.get("/guild/{guild_id}") # 建議改為 /guilds 保持路徑風格統一
-async def guild_entry_point(guild_id: int, request: Request):
-    user = request.session.get("user")
-    if not user: 
+async def guild_entry_point(guild_id: int, request: Request, identity: Identity = Depends(get_identity)):
+    if not identity.user: 
         return RedirectResponse("/login")
     
     bot = request.app.state.bot
-    user_id = int(user['id'])
     
     # 取得身份等級 (owner, admin, member, none)
-    access = await check_user_access(bot, guild_id, user_id)
+    access = await identity.guild_access(bot, guild_id)
 
     if access == "none":
         # 機器人不在該伺服器，導回列表
@@ -409,7 +411,7 @@ async def guild_entry_point(guild_id: int, request: Request):
     
     elif access in ["owner", "admin"]:
         # 呼叫下方的管理面板處理函式，並傳入目前的權限等級
-        return await guild_members_page(guild_id, request, access)
+        return await guild_members_page(guild_id, request, access, identity)
     
     else:
         # 一般成員導向個人狀態頁面
@@ -422,7 +424,7 @@ async def guild_entry_point(guild_id: int, request: Request):
 
 # --- web_main.py ---
 
-async def guild_members_page(guild_id: int, request: Request, access_level: str):
+async def guild_members_page(guild_id: int, request: Request, access_level: str, identity: Identity):
     bot = request.app.state.bot
     guild = bot.get_guild(guild_id)
     
@@ -430,45 +432,30 @@ async def guild_members_page(guild_id: int, request: Request, access_level: str)
         return RedirectResponse("/guilds")
 
     # 🚀 [新增 1] 獲取使用者資料與身分，以供頂部導航列使用
-    user = request.session.get("user")
+    user = identity.user
     if not user: return RedirectResponse("/login")
-    user_id = int(user['id'])
-    user_role = await get_user_role_text(bot, user_id)
+    user_role = identity.role_text
     
+    # 伺服器設定 (設定快取) 與目前這一頁的成員、獎懲統計
+    params = request.query_params
+    page = int(params.get("page")) if (params.get("page") or "").isdigit() else 1
+    q = (params.get("q") or "").strip() or None
     async with bot.db_pool.acquire() as conn:
-        # 1. 獲取管理員名單
-        admin_list = await conn.fetchval("SELECT admin_list FROM guilds WHERE guild_id = $1", guild_id) or []
-        
-        # 2. 獲取伺服器設定
-        settings = await conn.fetchrow("SELECT offset_enabled FROM guilds WHERE guild_id = $1", guild_id)
-        
-        # 3. 獲取自動化規則
-        raw_rules = await conn.fetch("SELECT * FROM auto_actions WHERE guild_id = $1 ORDER BY type, threshold ASC", guild_id)
-        rules_list = []
-        for r in raw_rules:
-            rules_list.append({
-                "type": r["type"],
-                "threshold": r["threshold"],
-                "action_type": r["action_type"]
-            })
-            
-        # 4. 獲取獎懲統計
-        stats = await conn.fetch("""
-            SELECT user_id, 
-                   SUM(CASE WHEN type = '警告' THEN count ELSE 0 END) as warning_points,
-                   SUM(CASE WHEN type = '嘉獎' THEN count ELSE 0 END) as commend_points
-            FROM member_records 
-            WHERE guild_id = $1 
-            GROUP BY user_id
-        """, guild_id)
-    
-    # 排序邏輯
-    def sort_key(m):
-        if m.id == guild.owner_id: return 0
-        if m.id in admin_list: return 1
-        return 2
-
-    sorted_members = sorted(guild.members, key=sort_key)
+        guild_settings = await bot.guild_cache.get(guild_id, conn=conn)
+        table = await load_member_page(
+            conn, guild, guild_settings,
+            viewer_is_owner=access_level == "owner",
+            sort=params.get("sort", "role"), q=q, page=page,
+            members=bot.member_index.search_members(guild, q) if q else None
+        )
+    settings = {"offset_enabled": guild_settings['offset_enabled']}
+    rules_list = []
+    for r in guild_settings['rules']:
+        rules_list.append({
+            "type": r["type"],
+            "threshold": r["threshold"],
+            "action_type": r["action_type"]
+        })
     
     return templates.TemplateResponse("member_management.html", {
         "request": request,
@@ -476,78 +463,100 @@ async def guild_members_page(guild_id: int, request: Request, access_level: str)
         "user": user,
         "user_role": user_role,
         "guild": guild,
-        "members": sorted_members,
-        "admin_list": admin_list,
-        "settings": settings or {"offset_enabled": False},
+        "table": table,
+        "sorts": SORTS,
+        "jobs": bot.side_effects.recent(guild_id=guild_id, limit=8),
+        "settings": settings,
         "rules": rules_list,
-        "stats": {s['user_id']: s for s in stats},
         "is_owner": access_level == "owner"
     })
 
-async def get_user_guild_role(bot, guild_id: int, user_id: int):
-    """
-    返回身分等級：0 (成員), 1 (授權管理員), 2 (擁有者)
-    """
+@app.get("/guild/{guild_id}/members/data")
+async def guild_members_data(
+    guild_id: int,
+    request: Request,
+    sort: str = "role",
+    q: str = None,
+    page: int = 1,
+    identity: Identity = Depends(get_identity)
+):
+    """成員列表 JSON API (分頁 / 排序 / 搜尋)，供管理頁面動態載入"""
+    bot = request.app.state.bot
+    access = await identity.guild_access(bot, guild_id)
+    if access not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="權限不足")
+
     guild = bot.get_guild(guild_id)
-    if not guild:
-        return 0
-    
-    # 1. 檢查是否為擁有者
-    if guild.owner_id == user_id:
-        return 2
-        
-    # 2. 檢查是否在資料庫的 admin_list 中
+    q = (q or "").strip() or None
     async with bot.db_pool.acquire() as conn:
-        admin_list = await conn.fetchval(
-            "SELECT admin_list FROM guilds WHERE guild_id = $1", 
-            guild_id
+        guild_settings = await bot.guild_cache.get(guild_id, conn=conn)
+        return await load_member_page(
+            conn, guild, guild_settings,
+            viewer_is_owner=access == "owner",
+            sort=sort, q=q, page=page,
+            members=bot.member_index.search_members(guild, q) if q else None
         )
-        # admin_list 是 BIGINT[]
-        if admin_list and user_id in admin_list:
-            return 1
-            
-    return 0
+
+@app.get("/guild/{guild_id}/records/export")
+async def export_records(
+    guild_id: int,
+    request: Request,
+    format: str = "csv",
+    user_id: int = None,
+    type: str = None,
+    since: str = None,
+    until: str = None,
+    identity: Identity = Depends(get_identity)
+):
+    """匯出獎懲紀錄 (CSV / NDJSON)，可依成員、類型、日期 (YYYY-MM-DD，含當日) 篩選；以串流回應，不一次載入全部紀錄"""
+    bot = request.app.state.bot
+    await require_guild_admin(bot, identity, guild_id)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="格式僅支援 csv 或 ndjson")
+    if type not in (None, "", "警告", "嘉獎"):
+        raise HTTPException(status_code=400, detail="類型僅支援 警告 或 嘉獎")
+    try:
+        since_at = datetime.strptime(since, "%Y-%m-%d").replace(tzinfo=timezone.utc) if since else None
+        until_at = datetime.strptime(until, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1) if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式應為 YYYY-MM-DD")
+
+    sql, args = build_export_query(guild_id, user_id=user_id, record_type=type or None, since=since_at, until=until_at)
+    filename = f"records_{guild_id}_{datetime.now().strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        stream_records(bot.db_pool, format, sql, args),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # --- 更新後的成員列表路由 ---
 @app.get("/guilds/{guild_id}/members")
-async def guild_members(guild_id: int, request: Request):
-    user = request.session.get("user")
-    if not user: return RedirectResponse("/")
+async def guild_members(guild_id: int, request: Request, identity: Identity = Depends(get_identity)):
+    if not identity.user: return RedirectResponse("/")
     
     bot = request.app.state.bot
-    user_id = int(user['id'])
     
-    # 檢查權限
-    role_level = await get_user_guild_role(bot, guild_id, user_id)
+    # 檢查權限：0 (成員), 1 (授權管理員), 2 (擁有者)
+    role_level = {"owner": 2, "admin": 1}.get(await identity.guild_access(bot, guild_id), 0)
     
     if role_level == 0:
         # 一般成員：導向「我的信用頁面」而非管理面板
         return RedirectResponse(f"/guilds/{guild_id}/my-status")
     
-    # 擁有者或管理員：允許進入
-    guild = bot.get_guild(guild_id)
-    # ... 原有的抓取成員與統計資料邏輯 ...
-    return templates.TemplateResponse("member_management.html", {
-        "request": request,
-        "guild": guild,
-        "role_level": role_level, # 2 為擁有者，1 為管理員
-        "is_owner": role_level == 2
-    })
+    # 擁有者或管理員：與 /guild/{guild_id} 共用分頁的成員管理頁面
+    return await guild_members_page(guild_id, request, "owner" if role_level == 2 else "admin", identity)
 
 @app.get("/guilds/{guild_id}")
-async def guild_entry_point(guild_id: int, request: Request):
-    user = request.session.get("user")
-    if not user: return RedirectResponse("/login")
+async def guild_entry_point(guild_id: int, request: Request, identity: Identity = Depends(get_identity)):
+    if not identity.user: return RedirectResponse("/login")
     
     bot = request.app.state.bot
-    user_id = int(user['id'])
     
     # 取得身份等級
-    access_level = await check_user_access(bot, guild_id, user_id)
+    access_level = await identity.guild_access(bot, guild_id)
     
     if access_level in ["owner", "admin"]:
-        # ✨ 注意：這裡要呼叫正確的函式名稱，並傳入 is_owner 判斷
-        return await member_management_page(guild_id, request, is_owner=(access_level == "owner"))
+        return await guild_members_page(guild_id, request, access_level, identity)
     elif access_level == "member":
         return RedirectResponse(url=f"/guilds/{guild_id}/my-status")
     else:
@@ -558,62 +567,40 @@ async def guild_entry_point(guild_id: int, request: Request):
 # --- web_main.py ---
 
 @app.get("/guild/{guild_id}/my-status", response_class=HTMLResponse)
-async def my_status(guild_id: int, request: Request):
+async def my_status(guild_id: int, request: Request, identity: Identity = Depends(get_identity)):
     """成員端：個人信用中心"""
-    user = request.session.get("user")
+    user = identity.user
     if not user: return RedirectResponse("/")
     
     bot = request.app.state.bot
-    user_id = int(user['id'])
+    user_id = identity.user_id
     guild = bot.get_guild(guild_id)
     if not guild: return RedirectResponse("/guilds")
 
     # 🚀 [新增 1] 獲取使用者身分 (供頂部導航列使用)
-    user_role = await get_user_role_text(bot, user_id)
+    user_role = identity.role_text
 
+    # 1~4. 個人獎懲統計、伺服器設定、自動化門檻規則與管理員 ID 列表，最多一次資料庫往返
     async with bot.db_pool.acquire() as conn:
-        # 1. 抓取個人獎懲統計
-        stats = await conn.fetchrow("""
-            SELECT SUM(CASE WHEN type = '警告' THEN count ELSE 0 END) as warning_points,
-                   SUM(CASE WHEN type = '嘉獎' THEN count ELSE 0 END) as commend_points
-            FROM member_records 
-            WHERE guild_id = $1 AND user_id = $2
-        """, guild_id, user_id)
-        
-        # 2. 抓取伺服器設定
-        settings = await conn.fetchrow("SELECT offset_enabled FROM guilds WHERE guild_id = $1", guild_id)
-        
-        # 3. 抓取自動化門檻規則
-        auto_rules = await conn.fetch("SELECT * FROM auto_actions WHERE guild_id = $1 ORDER BY threshold ASC", guild_id)
-        
-        # 4. 抓取管理員 ID 列表
-        admin_ids = await conn.fetchval("SELECT admin_list FROM guilds WHERE guild_id = $1", guild_id) or []
-
-    # 5. 處理管理員顯示資訊
-    processed_admins = []
-    for aid in admin_ids:
-        if aid == guild.owner_id: continue
-        
-        member = guild.get_member(aid)
-        if not member:
-            try:
-                member = await guild.fetch_member(aid)
-            except:
-                continue
-        
-        if member:
-            processed_admins.append({
-                "name": member.display_name,
-                "avatar": member.display_avatar.url
-            })
+        guild_settings, stats = await load_my_status_data(conn, bot.guild_cache, guild_id, user_id)
+    settings = {"offset_enabled": guild_settings['offset_enabled']}
+    auto_rules = sorted(guild_settings['rules'], key=lambda r: r['threshold'])
+    admin_ids = guild_settings['admin_list']
+
+    # 5. 處理管理員顯示資訊 (快取未命中的成員以一次 gateway 查詢取得，不逐一 fetch_member)
+    admins = await request.app.state.admin_resolver.resolve(guild, admin_ids)
+    processed_admins = [
+        {"name": member.display_name, "avatar": member.display_avatar.url}
+        for member in admins
+    ]
 
     return templates.TemplateResponse("my_status.html", {
         "request": request,
         "user": user,
         "user_role": user_role, # 🚀 [新增 2] 傳遞變數給前端
         "guild": guild,
-        "stats": stats or {"warning_points": 0, "commend_points": 0},
-        "settings": settings or {"offset_enabled": False},
+        "stats": stats,
+        "settings": settings,
         "auto_rules": auto_rules,
         "processed_admins": processed_admins
     })
@@ -625,78 +612,128 @@ async def member_action(
     request: Request,
     action_type: str = Form(...), 
     count: int = Form(...),
-    reason: str = Form(None)
+    reason: str = Form(None),
+    identity: Identity = Depends(get_identity)
 ):
-    user = request.session.get("user")
+    user = identity.user
     if not user: return RedirectResponse("/login")
     
     bot = request.app.state.bot
-    operator_id = int(user['id'])
+    operator_id = identity.user_id
     guild = bot.get_guild(guild_id)
-    target_member = guild.get_member(target_id)
+    target_member = guild.get_member(target_id) if guild else None
     
     if not guild or not target_member:
         return {"success": False, "message": "找不到成員"}
 
-    async with bot.db_pool.acquire() as conn:
-        # 1. 權限檢查
-        admin_list = await conn.fetchval("SELECT admin_list FROM guilds WHERE guild_id = $1", guild_id) or []
-        is_owner = (operator_id == guild.owner_id)
-        is_admin = (operator_id in admin_list)
-        target_is_admin = (target_id in admin_list or target_id == guild.owner_id)
-        
-        if is_admin and not is_owner and target_is_admin:
-            return {"success": False, "message": "管理員無法對管理員執行獎懲"}
+    # 1. 權限檢查 (操作者權限已由 get_identity 解析；admin_list 由設定快取提供)
+    access = await identity.guild_access(bot, guild_id)
+    if access not in ["owner", "admin"]:
+        return {"success": False, "message": "權限不足"}
+    admin_list = (await bot.guild_cache.get(guild_id))['admin_list']
+    is_owner = (access == "owner")
+    is_admin = (access == "admin")
+    target_is_admin = (target_id in admin_list or target_id == guild.owner_id)
+    
+    if is_admin and not is_owner and target_is_admin:
+        return {"success": False, "message": "管理員無法對管理員執行獎懲"}
 
-        # 2. 寫入資料庫：統一使用 member_records
-        type_cn = "警告" if action_type == "warn" else "嘉獎"
-        reason_text = reason or "網頁操作未註明原因"
-        
-        await conn.execute(
-            """
-            INSERT INTO member_records 
-            (guild_id, user_id, user_name, type, count, reason, operator_id, operator_name) 
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            """,
-            guild_id, target_id, target_member.display_name, 
+    # 2. 寫入資料庫：統一使用 member_records
+    type_cn = "警告" if action_type == "warn" else "嘉獎"
+    reason_text = reason or "網頁操作未註明原因"
+
+    async with bot.db_pool.acquire() as conn:
+        totals = await add_member_record(
+            conn, guild_id, target_id, target_member.display_name,
             type_cn, count, reason_text, operator_id, user['username']
         )
 
-    # 🚀 3. 同步至 Discord (關鍵連動區)
-    cog = bot.get_cog("ModerationCog")
-    if cog:
-        try:
-            # 建立日誌 Embed
-            color = discord.Color.red() if action_type == "warn" else discord.Color.gold()
-            emoji = "⚠️" if action_type == "warn" else "✨"
-            
-            embed = discord.Embed(
-                title=f"{emoji} {type_cn}異動紀錄 (網頁端)", 
-                color=color, 
-                timestamp=datetime.now()
-            )
-            embed.add_field(name="對象", value=target_member.mention, inline=True)
-            embed.add_field(name="變動次數", value=f"**{count}** 次", inline=True)
-            embed.add_field(name="管理員", value=f"<@{operator_id}>", inline=True)
-            embed.add_field(name="原因", value=reason_text, inline=False)
-            embed.set_footer(text=f"User ID: {target_id}")
-
-            # 呼叫機器人方法
-            await cog.log_to_channel(guild, embed)
-            await cog.check_auto_actions(guild, target_member, type_cn)
-            print(f"✅ 已成功連動 Discord 發送 {type_cn} 日誌")
-
-            print("DEBUG: 發送函式已呼叫")
-        except Exception as e:
-            print(f"DEBUG: 發送過程中發生異常: {e}")
-    else:
-        # 如果沒找到 Cog，會在控制台噴出這行
-        print(f"DEBUG: 找不到 ModerationCog。目前可用的 Cog 有: {list(bot.cogs.keys())}")
+    # 🚀 3. 同步至 Discord (關鍵連動區)：交給背景佇列，資料庫寫入完成即回應
+    color = discord.Color.red() if action_type == "warn" else discord.Color.gold()
+    emoji = "⚠️" if action_type == "warn" else "✨"
+    
+    embed = discord.Embed(
+        title=f"{emoji} {type_cn}異動紀錄 (網頁端)", 
+        color=color, 
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="對象", value=target_member.mention, inline=True)
+    embed.add_field(name="變動次數", value=f"**{count}** 次", inline=True)
+    embed.add_field(name="管理員", value=f"<@{operator_id}>", inline=True)
+    embed.add_field(name="原因", value=reason_text, inline=False)
+    embed.set_footer(text=f"User ID: {target_id}")
+
+    bot.side_effects.enqueue(
+        "moderation_log", {"guild_id": guild_id, "embed": embed.to_dict()},
+        guild_id=guild_id, user_id=operator_id, label=f"{type_cn}日誌：{target_member.display_name}"
+    )
+    bot.side_effects.enqueue(
+        "auto_action",
+        {"guild_id": guild_id, "user_id": target_id, "record_type": type_cn,
+         "warnings": totals[0], "commends": totals[1], "delta": count},
+        guild_id=guild_id, user_id=operator_id, label=f"自動化檢查：{target_member.display_name}"
+    )
+
+    return RedirectResponse(f"/guild/{guild_id}", status_code=303)
 
+@app.post("/guild/{guild_id}/members/bulk_action")
+async def bulk_member_action(
+    guild_id: int,
+    request: Request,
+    action_type: str = Form(...),
+    count: int = Form(...),
+    reason: str = Form(None),
+    target_ids: List[int] = Form(...),
+    identity: Identity = Depends(get_identity)
+):
+    """成員管理頁面勾選多位成員後的批次獎懲"""
+    if not identity.user: return RedirectResponse("/login")
+
+    bot = request.app.state.bot
+    access = await identity.guild_access(bot, guild_id)
+    if access not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="權限不足")
+
+    guild = bot.get_guild(guild_id)
+    operator = guild.get_member(identity.user_id)
+    cog = bot.get_cog("ModerationCog")
+    if not operator or not cog or count <= 0:
+        return {"success": False, "message": "無法執行批次操作"}
+    # 與 /bulk_record 相同的上限 (每人 1~99 次、單次最多 BULK_LIMIT 位)，超過時拒絕而不是默默截斷
+    if count > 99:
+        raise HTTPException(status_code=400, detail="每人變動次數最多 99 次")
+    if len(set(target_ids)) > BULK_LIMIT:
+        raise HTTPException(status_code=400, detail=f"單次最多處理 {BULK_LIMIT} 位成員，請分批操作")
+
+    members = [m for m in map(guild.get_member, target_ids) if m]
+    type_cn = "警告" if action_type == "warn" else "嘉獎"
+    reason_text = reason or "網頁操作未註明原因"
+    # 請求中只完成資料庫寫入；自動化處置與日誌交給背景佇列 (與單人獎懲相同)
+    targets, _, totals = await cog.record_bulk(
+        guild, members, type_cn, count, reason_text,
+        operator, operator_is_owner=access == "owner"
+    )
+    if targets:
+        embed = cog.bulk_record_embed(targets, type_cn, count, reason_text, operator.mention, "網頁端")
+        bot.side_effects.enqueue(
+            "moderation_log", {"guild_id": guild_id, "embed": embed.to_dict()},
+            guild_id=guild_id, user_id=operator.id, label=f"批次{type_cn}日誌：{len(targets)} 位成員"
+        )
+        bot.side_effects.enqueue(
+            "auto_action_bulk",
+            {"guild_id": guild_id, "record_type": type_cn, "delta": count,
+             "totals": [[m.id, *totals[m.id]] for m in targets]},
+            guild_id=guild_id, user_id=operator.id, label=f"批次自動化檢查：{len(targets)} 位成員"
+        )
     return RedirectResponse(f"/guild/{guild_id}", status_code=303)
 
 # --- 伺服器自動化設定頁面 ---
 
+async def require_guild_admin(bot, identity: Identity, guild_id: int):
+    """設定寫入 API 的共用權限檢查：僅限擁有者與授權管理員"""
+    if await identity.guild_access(bot, guild_id) not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="權限不足")
+
 # 2. 儲存/更新規則 API (含衝突提醒邏輯)
 @app.post("/guild/{guild_id}/settings/add_rule")
 async def add_rule(
@@ -706,71 +743,123 @@ async def add_rule(
     threshold: int = Form(...),
     action_type: str = Form(...),
     timeout_duration: int = Form(None),
-    role_id: int = Form(None)
+    role_id: int = Form(None),
+    identity: Identity = Depends(get_identity)
 ):
     bot = request.app.state.bot
+    await require_guild_admin(bot, identity, guild_id)
     async with bot.db_pool.acquire() as conn:
         # 使用 ON CONFLICT 達成「覆蓋舊規則」的效果，並解決衝突問題
         await conn.execute("""
             INSERT INTO auto_actions (guild_id, type, threshold, action_type, timeout_duration, role_id)
             VALUES ($1, $2, $3, $4, $5, $6)
-            ON CONFLICT (guild_id, type, threshold) 
+            ON CONFLICT (guild_id, type, threshold, COALESCE(window_days, 0), COALESCE(half_life_days, 0))
             DO UPDATE SET action_type = $4, timeout_duration = $5, role_id = $6
         """, guild_id, type, threshold, action_type, timeout_duration, role_id)
+    bot.guild_cache.invalidate(guild_id)
         
-    return RedirectResponse(url=f"/guild/{guild_id}/settings", status_code=303)
+    return RedirectResponse(url=f"/guild/{guild_id}/settings?preview=1", status_code=303)
 
 # --- [新增] 自動化設定頁面路由 ---
 @app.get("/guild/{guild_id}/settings", response_class=HTMLResponse)
-async def server_settings(guild_id: int, request: Request):
-    user = request.session.get("user")
+async def server_settings(guild_id: int, request: Request, preview: bool = False, identity: Identity = Depends(get_identity)):
+    user = identity.user
     if not user: return RedirectResponse("/login")
     
     bot = request.app.state.bot
-    user_id = int(user['id']) # 確保轉為 int
     
     # 1. 權限檢查
-    access = await check_user_access(bot, guild_id, user_id)
+    access = await identity.guild_access(bot, guild_id)
     if access not in ["owner", "admin"]:
         return RedirectResponse(f"/guild/{guild_id}")
 
     # 🚀 [新增 1] 獲取使用者身分 (供頂部導航列使用)
-    user_role = await get_user_role_text(bot, user_id)
-
-    async with bot.db_pool.acquire() as conn:
-        settings = await conn.fetchrow("SELECT offset_enabled FROM guilds WHERE guild_id = $1", guild_id)
-        
-        raw_rules = await conn.fetch("SELECT id, type, threshold, action_type, timeout_duration, role_id FROM auto_actions WHERE guild_id = $1", guild_id)
-        rules_list = []
-        for r in raw_rules:
-            rules_list.append({
-                "id": r["id"],
-                "type": r["type"],
-                "threshold": r["threshold"],
-                "action_type": r["action_type"],
-                "timeout_duration": r["timeout_duration"],
-                "role_id": r["role_id"]
-            })
+    user_role = identity.role_text
+
+    guild_settings = await bot.guild_cache.get(guild_id)
+    settings = {"offset_enabled": guild_settings['offset_enabled']}
+    rules_list = []
+    for r in guild_settings['rules']:
+        rules_list.append({
+            "id": r["id"],
+            "type": r["type"],
+            "threshold": r["threshold"],
+            "action_type": r["action_type"],
+            "timeout_duration": r["timeout_duration"],
+            "role_id": r["role_id"],
+            "window_days": r.get("window_days"),
+            "half_life_days": r.get("half_life_days")
+        })
 
     guild = bot.get_guild(guild_id)
+
+    # 以目前規則與抵銷模式重新評估的影響預覽 (掃過整個伺服器的累計表)
+    # 只在規則 / 抵銷模式變更後或按下預覽時計算 (?preview=1)，一般瀏覽設定頁不執行
+    # 預覽中的 (成員, 規則) 隨確認表單送出，背景執行時只處置這些組合
+    reevaluation, reevaluation_targets = None, ""
+    if preview:
+        async with bot.db_pool.acquire() as conn:
+            rows = await load_reevaluation(conn, guild_id)
+        groups = plan_reevaluation(guild, rows)[0]
+        reevaluation = [
+            {
+                "type": rule['type'],
+                "threshold": rule['threshold'],
+                "action_type": rule['action_type'],
+                "count": len(targets),
+                "sample": [m.display_name for m, _, _ in targets[:5]]
+            }
+            for rule, targets in groups
+        ]
+        reevaluation_targets = ",".join(f"{m.id}:{rule['id']}" for rule, targets in groups for m, _, _ in targets)
     
     return templates.TemplateResponse("server_settings.html", {
         "request": request,
         "user": user,           # 🚀 [新增 2] 傳遞使用者資料
         "user_role": user_role, # 🚀 [新增 3] 傳遞身分文字
         "guild": guild,
-        "settings": settings or {"offset_enabled": False},
+        "settings": settings,
         "rules": rules_list,
-        "roles": [r for r in guild.roles if not r.managed and r.name != "@everyone"]
+        "roles": [r for r in guild.roles if not r.managed and r.name != "@everyone"],
+        "reevaluation": reevaluation,
+        "reevaluation_targets": reevaluation_targets,
+        "reevaluate_jobs": bot.side_effects.recent(guild_id=guild_id, kind="auto_action_reevaluate", limit=3)
     })
 
+# --- 規則 / 抵銷模式變更後重新評估全體成員 (背景節流執行) ---
+@app.post("/guild/{guild_id}/settings/reevaluate")
+async def reevaluate_rules(guild_id: int, request: Request, targets: str = Form(""), identity: Identity = Depends(get_identity)):
+    bot = request.app.state.bot
+    await require_guild_admin(bot, identity, guild_id)
+    # targets 為預覽時顯示的 "user_id:rule_id,..."，執行時只處置其中仍符合條件的組合
+    try:
+        pairs = [[int(uid), int(rid)] for uid, rid in (t.split(":") for t in targets.split(",") if t)]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="重新評估對象格式錯誤")
+    if not pairs:
+        return RedirectResponse(f"/guild/{guild_id}/settings", status_code=303)
+    # 同一伺服器已有尚未完成的重新評估時不重複排入
+    running = [
+        job for job in bot.side_effects.recent(guild_id=guild_id, kind="auto_action_reevaluate", limit=3)
+        if job['status'] in ("queued", "running", "retrying")
+    ]
+    if not running:
+        bot.side_effects.enqueue(
+            "auto_action_reevaluate",
+            {"guild_id": guild_id, "operator_name": identity.user['username'], "targets": pairs},
+            guild_id=guild_id, user_id=identity.user_id, label="重新評估自動化規則"
+        )
+    return RedirectResponse(f"/guild/{guild_id}/settings", status_code=303)
+
 # --- [新增] 全局開關切換 API ---
 @app.post("/guild/{guild_id}/settings/toggle-offset")
-async def toggle_offset(guild_id: int, request: Request, enabled: bool = Form(...)):
+async def toggle_offset(guild_id: int, request: Request, enabled: bool = Form(...), identity: Identity = Depends(get_identity)):
     bot = request.app.state.bot
+    await require_guild_admin(bot, identity, guild_id)
     async with bot.db_pool.acquire() as conn:
         await conn.execute("UPDATE guilds SET offset_enabled = $1 WHERE guild_id = $2", enabled, guild_id)
-    return RedirectResponse(f"/guild/{guild_id}/settings", status_code=303)
+    bot.guild_cache.invalidate(guild_id)
+    return RedirectResponse(f"/guild/{guild_id}/settings?preview=1", status_code=303)
 
 # --- [新增] 新增或修改規則 API (處理衝突) ---
 @app.post("/guild/{guild_id}/settings/rule/save")
@@ -781,63 +870,52 @@ async def save_rule(
     threshold: int = Form(...),
     action_type: str = Form(...),
     timeout_duration: int = Form(None),
-    role_id: int = Form(None)
+    role_id: int = Form(None),
+    window_days: str = Form(""),
+    half_life_days: str = Form(""),
+    identity: Identity = Depends(get_identity)
 ):
     bot = request.app.state.bot
+    await require_guild_admin(bot, identity, guild_id)
+    # 計數方式：留空表示計算全部紀錄 / 不遞減
+    try:
+        window_days = min(365, max(1, int(window_days))) if window_days.strip() else None
+        half_life_days = min(365, max(1, int(half_life_days))) if half_life_days.strip() else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="計算天數與半衰期必須是整數")
     async with bot.db_pool.acquire() as conn:
-        # 使用 ON CONFLICT：如果 (guild_id, type, threshold) 重複，則更新現有動作
+        # 使用 ON CONFLICT：同一類型、門檻與計數方式的規則已存在時，更新現有動作 (不同計數方式的規則可以並存)
         await conn.execute("""
-            INSERT INTO auto_actions (guild_id, type, threshold, action_type, timeout_duration, role_id)
-            VALUES ($1, $2, $3, $4, $5, $6)
-            ON CONFLICT (guild_id, type, threshold) 
+            INSERT INTO auto_actions (guild_id, type, threshold, action_type, timeout_duration, role_id, window_days, half_life_days)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            ON CONFLICT (guild_id, type, threshold, COALESCE(window_days, 0), COALESCE(half_life_days, 0))
             DO UPDATE SET action_type = $4, timeout_duration = $5, role_id = $6
-        """, guild_id, rule_type, threshold, action_type, timeout_duration, role_id)
+        """, guild_id, rule_type, threshold, action_type, timeout_duration, role_id, window_days, half_life_days)
+    bot.guild_cache.invalidate(guild_id)
         
-    return RedirectResponse(f"/guild/{guild_id}/settings", status_code=303)
+    return RedirectResponse(f"/guild/{guild_id}/settings?preview=1", status_code=303)
 
 # --- [新增] 刪除規則 API ---
 @app.post("/guild/{guild_id}/settings/rule/delete/{rule_id}")
-async def delete_rule(guild_id: int, rule_id: int, request: Request):
+async def delete_rule(guild_id: int, rule_id: int, request: Request, identity: Identity = Depends(get_identity)):
     bot = request.app.state.bot
+    await require_guild_admin(bot, identity, guild_id)
     async with bot.db_pool.acquire() as conn:
-        await conn.execute("DELETE FROM auto_actions WHERE id = $1 AND guild_id = $2", rule_id, guild_id)
+        async with conn.transaction():
+            await conn.execute("DELETE FROM auto_actions WHERE id = $1 AND guild_id = $2", rule_id, guild_id)
+            await conn.execute("DELETE FROM auto_action_fired WHERE rule_id = $1 AND guild_id = $2", rule_id, guild_id)
+    bot.guild_cache.invalidate(guild_id)
     return RedirectResponse(f"/guild/{guild_id}/settings", status_code=303)
 
 @app.get("/developer/dashboard", response_class=HTMLResponse)
-async def dev_dashboard(request: Request):
+async def dev_dashboard(request: Request, identity: Identity = Depends(get_identity)):
     # 權限檢查 (Discord ID: 882991365351420005)
-    user = request.session.get("user")
-    if not user or int(user['id']) != config['DEVELOPER_ID']:
+    if not identity.is_developer:
         raise HTTPException(status_code=403, detail="存取拒絕：僅限系統開發者")
 
     bot = request.app.state.bot
-    guild_data_list = []
-
-    for guild in bot.guilds:
-        # 計算成員與機器人數量
-        bot_count = sum(1 for m in guild.members if m.bot)
-        human_count = guild.member_count - bot_count
-        
-        # 取得管理員清單 (具有 administrator 權限的成員)
-        admins = [m.display_name for m in guild.members if m.guild_permissions.administrator and not m.bot]
-        
-        # 頻道列表分類
-        channels = {
-            "text": [c.name for c in guild.text_channels],
-            "voice": [c.name for c in guild.voice_channels]
-        }
-
-        guild_data_list.append({
-            "name": guild.name,
-            "id": guild.id,
-            "owner": f"{guild.owner} ({guild.owner_id})",
-            "member_count": guild.member_count,
-            "bot_count": bot_count,
-            "human_count": human_count,
-            "admins": admins,
-            "channels": channels,
-            "created_at": guild.created_at.strftime('%Y-%m-%d')
-        })
+    # 真人 / 機器人數、管理員與頻道列表皆由 gateway 事件增量維護的統計快照提供
+    guild_data_list = [bot.guild_stats.snapshot(guild) for guild in bot.guilds]
 
     return templates.TemplateResponse("dev_dashboard.html", {
         "request": request,
@@ -846,4 +924,23 @@ async def dev_dashboard(request: Request):
             "server_count": len(bot.guilds),
             "total_users": sum(g.member_count for g in bot.guilds)
         }
-    })
\ No newline at end of file
+    })
+
+@app.get("/developer/metrics")
+async def dev_metrics(request: Request, identity: Identity = Depends(get_identity)):
+    """開發者專用：快取等內部運作指標 (JSON)"""
+    if not identity.is_developer:
+        raise HTTPException(status_code=403, detail="存取拒絕：僅限系統開發者")
+
+    bot = request.app.state.bot
+    return {
+        "guild_settings_cache": bot.guild_cache.stats(),
+        "discord_http": request.app.state.discord_http.stats(),
+        "user_guild_cache": request.app.state.user_guild_cache.stats(),
+        "member_index": bot.member_index.stats(),
+        "side_effects": bot.side_effects.stats(),
+        "user_cache": bot.user_cache.stats(),
+        "admin_resolver": request.app.state.admin_resolver.stats(),
+        "log_buffer": bot.log_buffer.stats(),
+        "dispatcher": bot.dispatcher.stats()
+    }